@@ -0,0 +1,70 @@
+"""
+Importación de CSV por bloques (user-017).
+
+Genera un par de CSV OD/OS sintéticos y los carga con
+SQLitePapilaDataset.load_from_csv (lo mismo que import_csv.py) y, si se pide,
+con PapilaDataset.load_from_csv. Los CSV se escriben por bloques para que el
+pico de memoria del informe sea el de la carga y no el de la generación.
+
+    python benchmarks/bench_csv_import.py --patients 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+from typing import List, Optional
+
+from common import synthetic_frames
+
+from core.csv_loader import CSV_CHUNK_SIZE
+
+# Pacientes generados de cada vez al escribir los CSV
+GENERATION_CHUNK = 100_000
+
+
+def write_csv_pair(count: int, od_csv: str, os_csv: str) -> None:
+    """Escribe count pacientes por ojo en los CSV, por bloques de GENERATION_CHUNK."""
+    for start in range(0, count, GENERATION_CHUNK):
+        od_df, os_df = synthetic_frames(min(GENERATION_CHUNK, count - start), seed=start)
+        for df, csv_file in ((od_df, od_csv), (os_df, os_csv)):
+            df['patient_id'] = [f"#{number:07d}" for number in range(start + 1, start + len(df) + 1)]
+            df.to_csv(csv_file, mode='a' if start else 'w', header=not start, index=False)
+
+
+def print_report(label: str, report: dict) -> None:
+    peak = report["peak_memory_bytes"]
+    print(f"  {label:<8} {report['rows']} filas ({report['skipped']} descartadas), {report['patients']} pacientes, "
+          f"{report['seconds']:.1f} s, {report['rows_per_second']:.0f} filas/s, pico "
+          f"{f'{peak / 2 ** 20:.0f} MiB' if peak is not None else 'no disponible'}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la importación de CSV de pacientes por bloques.")
+    parser.add_argument("--patients", type=int, default=1_000_000, help="Pacientes por ojo en los CSV")
+    parser.add_argument("--chunksize", type=int, default=CSV_CHUNK_SIZE, help="Filas leídas por bloque")
+    parser.add_argument("--memory", action="store_true", help="Medir también la carga en un PapilaDataset")
+    args = parser.parse_args(argv)
+
+    from core.models import PapilaDataset
+    from core.sqlite_dataset import SQLitePapilaDataset
+
+    with tempfile.TemporaryDirectory() as workdir:
+        od_csv = os.path.join(workdir, "od.csv")
+        os_csv = os.path.join(workdir, "os.csv")
+        write_csv_pair(args.patients, od_csv, os_csv)
+        print(f"📊 Importación de CSV, {args.patients} pacientes por ojo "
+              f"({os.path.getsize(od_csv) / 2 ** 20:.0f} MiB por archivo) (user-017)")
+
+        dataset = SQLitePapilaDataset(os.path.join(workdir, "patients.sqlite"))
+        try:
+            print_report("SQLite", dataset.load_from_csv(od_csv, os_csv, args.chunksize))
+        finally:
+            dataset.close()
+        if args.memory:
+            print_report("memoria", PapilaDataset().load_from_csv(od_csv, os_csv, args.chunksize))
+    print("  (el pico es el del proceso: ru_maxrss no baja, así que la carga en memoria incluye la de SQLite)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
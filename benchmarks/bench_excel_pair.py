@@ -0,0 +1,60 @@
+"""
+Escritura transaccional del par de Excel OD/OS (user-021).
+
+Compara dos to_excel independientes (lo que hacían las exportaciones antes)
+con write_excel_pair (archivos temporales, copias de seguridad, marcador de
+generación y fsync), y mide la comprobación de recuperación de cada lectura.
+
+    python benchmarks/bench_excel_pair.py --rows 100 1000 10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from common import format_seconds, synthetic_frames
+
+from features.excel_pair import recover_excel_pair, write_excel_pair
+
+
+def median_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la escritura del par de Excel OD/OS.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000], help="Filas por archivo")
+    parser.add_argument("--repeat", type=int, default=7, help="Repeticiones (se informa la mediana)")
+    args = parser.parse_args(argv)
+
+    print("📊 Escritura del par de Excel, mediana (user-021)")
+    with tempfile.TemporaryDirectory() as workdir:
+        od_excel_file = os.path.join(workdir, "patient_data_od.xlsx")
+        os_excel_file = os.path.join(workdir, "patient_data_os.xlsx")
+        for rows in args.rows:
+            od_df, os_df = synthetic_frames(rows)
+
+            def independent():
+                od_df.to_excel(od_excel_file, index=False)
+                os_df.to_excel(os_excel_file, index=False)
+
+            old = median_time(independent, args.repeat)
+            new = median_time(lambda: write_excel_pair(od_df, os_df, od_excel_file, os_excel_file), args.repeat)
+            print(f"  {rows:>6} filas  independientes {format_seconds(old):>10}  write_excel_pair "
+                  f"{format_seconds(new):>10} ({'+' if new >= old else ''}{format_seconds(new - old)}, {(new - old) / old:+.1%})")
+
+        recovery = median_time(lambda: recover_excel_pair(od_excel_file, os_excel_file), 1000)
+        print(f"  comprobación de recuperación en cada lectura: {format_seconds(recovery)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Índices secundarios de PapilaDataset.filter_patients (user-007).
+
+Compara el recorrido completo anterior con filter_patients, que usa los
+índices cuando la consulta es selectiva y el recorrido en otro caso.
+
+    python benchmarks/bench_filter.py --patients 100000
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+from common import best_of, format_seconds, quiet, synthetic_frames
+
+from core.models import DiagnosisStatus, Gender, PapilaDataset
+from features.data_loading import _populate_dataset
+
+QUERIES = [
+    ("edad 30 + mujer + glaucoma", dict(age_min=30, age_max=30, gender=Gender.FEMALE,
+                                        diagnosis=DiagnosisStatus.GLAUCOMA)),
+    ("edad >= 88 + OS sospechoso", dict(age_min=88, os_diagnosis=DiagnosisStatus.SUSPECT)),
+    ("amplia: hombres", dict(gender=Gender.MALE)),
+    ("amplia: edad 40-60", dict(age_min=40, age_max=60)),
+]
+
+
+def reference_filter(dataset: PapilaDataset, **kwargs) -> list:
+    """filter_patients antes de los índices: una lista filtrada por cada criterio."""
+    filtered_patients = list(dataset.patients.values())
+    for key, value in kwargs.items():
+        if key == 'age_min':
+            filtered_patients = [p for p in filtered_patients if p.age >= value]
+        elif key == 'age_max':
+            filtered_patients = [p for p in filtered_patients if p.age <= value]
+        elif key == 'gender':
+            filtered_patients = [p for p in filtered_patients if p.gender == value]
+        elif key == 'diagnosis':
+            filtered_patients = [p for p in filtered_patients
+                                 if (p.right_eye and p.right_eye.diagnosis == value) or
+                                 (p.left_eye and p.left_eye.diagnosis == value)]
+        elif key == 'od_diagnosis':
+            filtered_patients = [p for p in filtered_patients if p.right_eye and p.right_eye.diagnosis == value]
+        elif key == 'os_diagnosis':
+            filtered_patients = [p for p in filtered_patients if p.left_eye and p.left_eye.diagnosis == value]
+    return filtered_patients
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide filter_patients con y sin índices secundarios.")
+    parser.add_argument("--patients", type=int, default=100000, help="Tamaño del dataset sintético")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se informa la mejor)")
+    args = parser.parse_args(argv)
+
+    dataset = PapilaDataset()
+    with quiet():
+        _populate_dataset(dataset, *synthetic_frames(args.patients))
+
+    print(f"📊 filter_patients, {args.patients} pacientes (user-007)")
+    for label, query in QUERIES:
+        expected = reference_filter(dataset, **query)
+        if dataset.filter_patients(**query) != expected:
+            print(f"❌ {label}: el resultado no coincide con el recorrido completo")
+            return 1
+        old = best_of(lambda: reference_filter(dataset, **query), args.repeat)
+        new = best_of(lambda: dataset.filter_patients(**query), args.repeat)
+        print(f"  {label:<28} {len(expected):>7} resultados  recorrido {format_seconds(old):>10}  "
+              f"filter_patients {format_seconds(new):>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Diario de cambios de pacientes frente a reescribir los Excel (user-015).
+
+Mide, sobre un par de Excel sintético, la latencia de guardar una edición:
+- anterior: leer los dos Excel, reemplazar la fila del paciente y escribir
+  los dos archivos completos (update_excel_files);
+- save_patient_record sin base y con base (comprobación de conflictos);
+y el tiempo de compact_journal con las ediciones pendientes.
+
+    python benchmarks/bench_journal.py --patients 10000 --edits 600
+"""
+import argparse
+import os
+import sys
+import tempfile
+import warnings
+from typing import List, Optional
+
+import pandas as pd
+
+from common import best_of, format_seconds, latencies, synthetic_frames
+
+from features.data_loading import _iter_patients, compact_journal, save_patient_record
+from features.patient_journal import patient_fingerprint, patient_to_rows
+
+
+def reference_save(patient, od_excel_file: str, os_excel_file: str) -> None:
+    """Guardado anterior: reescribe los dos Excel completos con la fila del paciente reemplazada."""
+    for excel_file, row in zip((od_excel_file, os_excel_file), patient_to_rows(patient)):
+        df = pd.read_excel(excel_file)
+        df = df[df['patient_id'] != patient.patient_id]
+        if row is not None:
+            with warnings.catch_warnings():
+                # Aviso de pandas por las columnas vacías de la fila nueva
+                warnings.simplefilter("ignore", FutureWarning)
+                df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+        df.to_excel(excel_file, index=False)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide el guardado de ediciones con el diario y sin él.")
+    parser.add_argument("--patients", type=int, default=10000, help="Pacientes del par de Excel sintético")
+    parser.add_argument("--edits", type=int, default=600, help="Ediciones registradas en el diario")
+    parser.add_argument("--rewrites", type=int, default=3, help="Guardados medidos con la reescritura completa")
+    args = parser.parse_args(argv)
+
+    os.environ.pop('PATIENT_JOURNAL_FILE', None)
+    od_df, os_df = synthetic_frames(args.patients)
+    patients = list(_iter_patients(od_df, os_df))
+    edits = [patients[i * len(patients) // args.edits] for i in range(args.edits)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        od_excel_file = os.path.join(workdir, "patient_data_od.xlsx")
+        os_excel_file = os.path.join(workdir, "patient_data_os.xlsx")
+        od_df.to_excel(od_excel_file, index=False)
+        os_df.to_excel(os_excel_file, index=False)
+
+        print(f"📊 Guardado de una edición, {args.patients} pacientes (user-015)")
+        old = best_of(lambda: reference_save(edits[0], od_excel_file, os_excel_file), args.rewrites)
+        print(f"  reescritura completa (anterior)  {format_seconds(old):>10}")
+
+        half = args.edits // 2
+
+        def save(i):
+            patient = edits[i]
+            patient.age += 1
+            save_patient_record(patient, od_excel_file, os_excel_file)
+
+        median, p99 = latencies(save, half)
+        print(f"  diario, sin base                 {format_seconds(median):>10} mediana, "
+              f"{format_seconds(p99)} p99")
+
+        # Con base, la huella se compara con la del diario o, si el paciente no tiene cambios, con los Excel
+        def save_with_base(i):
+            patient = edits[half + i]
+            base = patient_fingerprint(patient)
+            patient.age += 1
+            save_patient_record(patient, od_excel_file, os_excel_file, base)
+
+        median, p99 = latencies(save_with_base, args.edits - half)
+        print(f"  diario, con base                 {format_seconds(median):>10} mediana, "
+              f"{format_seconds(p99)} p99")
+
+        pending = []
+        seconds = best_of(lambda: pending.append(compact_journal(od_excel_file, os_excel_file)), 1)
+        print(f"  compact_journal ({pending[0]} cambios)   {format_seconds(seconds):>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
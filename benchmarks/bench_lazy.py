@@ -0,0 +1,104 @@
+"""
+Tiempo hasta la primera ventana con carga diferida (user-019).
+
+Escribe un par de Excel sintético y un directorio con las dos imágenes de
+cada paciente, y en un proceso nuevo por modo (carga completa y diferida)
+reproduce lo que hace PatientViewer antes de mostrar la ventana: importar la
+interfaz, load_patient_data, ordenar los IDs, calcular las estadísticas de la
+pestaña y crear el primer paciente con sus imágenes. Después mide la
+navegación por los siguientes pacientes.
+
+La caché columnar de los Excel está caliente (se genera antes de medir). Las
+imágenes son archivos vacíos: la carga solo consulta sus nombres. En la carga
+diferida, un paciente creado antes de que termine el índice del directorio
+no tiene aún su imagen asignada (se asigna al volver a pedirlo); la ventana
+la busca por su cuenta con ImagePrefetcher.load.
+
+    python benchmarks/bench_lazy.py --patients 100000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from common import ROOT, format_seconds, quiet, synthetic_frames
+
+from features.data_loading import read_patient_excel
+
+# Pacientes visitados para medir la navegación tras la primera ventana
+NAVIGATION_STEPS = 200
+
+# Se ejecuta en un proceso nuevo; imprime los instantes (desde su inicio) de cada fase
+STARTUP_PROBE = """
+import time
+start = time.perf_counter()
+import contextlib, os, sys
+sys.path.insert(0, sys.argv[1])
+mode, od_excel_file, os_excel_file, steps = sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5])
+
+with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    import ui.app
+    from features.data_loading import load_patient_data
+    imported = time.perf_counter()
+    dataset = load_patient_data(od_excel_file, os_excel_file, lazy=mode == "lazy")
+    loaded = time.perf_counter()
+    patient_ids = sorted(dataset.patients.keys())
+    dataset.get_statistics()
+    patient = dataset.patients[patient_ids[0]]
+    first = time.perf_counter()
+    for patient_id in patient_ids[1:steps + 1]:
+        dataset.patients[patient_id]
+    navigation = (time.perf_counter() - first) / max(1, min(steps, len(patient_ids) - 1))
+print(imported - start, loaded - start, first - start, navigation, len(patient_ids),
+      int(patient.right_eye is not None and patient.right_eye.fundus_image is not None))
+"""
+
+
+def create_images(images_dir: str, patient_ids: List[str]) -> None:
+    """Crea un archivo vacío por ojo y paciente con el nombre estándar (RET<id>OD.jpg)."""
+    for patient_id in patient_ids:
+        for suffix in ("OD", "OS"):
+            open(os.path.join(images_dir, f"RET{patient_id[1:]}{suffix}.jpg"), "wb").close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide el tiempo hasta la primera ventana con y sin carga diferida.")
+    parser.add_argument("--patients", type=int, default=100000, help="Pacientes del par de Excel sintético")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        od_excel_file = os.path.join(workdir, "patient_data_od.xlsx")
+        os_excel_file = os.path.join(workdir, "patient_data_os.xlsx")
+        frames = synthetic_frames(args.patients)
+        for df, excel_file in zip(frames, (od_excel_file, os_excel_file)):
+            df.to_excel(excel_file, index=False)
+            with quiet():
+                read_patient_excel(excel_file)
+        images_dir = os.path.join(workdir, "FundusImages")
+        os.makedirs(images_dir)
+        create_images(images_dir, frames[0]['patient_id'].tolist())
+
+        env = dict(os.environ, FUNDUS_IMAGES_DIR=images_dir)
+        env.pop('PATIENT_JOURNAL_FILE', None)
+        print(f"📊 Primera ventana, {args.patients} pacientes y {2 * args.patients} imágenes (user-019)")
+        for mode, label in (("eager", "completa"), ("lazy", "diferida")):
+            start = time.perf_counter()
+            # cwd en el directorio temporal: la interfaz escribe image_utils.log en el directorio actual
+            result = subprocess.run(
+                [sys.executable, "-c", STARTUP_PROBE, ROOT, mode, od_excel_file, os_excel_file, str(NAVIGATION_STEPS)],
+                capture_output=True, text=True, check=True, env=env, cwd=workdir)
+            process = time.perf_counter() - start
+            imported, loaded, first, navigation, count, image = result.stdout.split()
+            print(f"  {label:<9} importar {format_seconds(float(imported)):>10}  "
+                  f"cargado {format_seconds(float(loaded)):>10}  primer paciente {format_seconds(float(first)):>10}  "
+                  f"navegación {format_seconds(float(navigation))}/paciente  (proceso {format_seconds(process)}, "
+                  f"{count} pacientes, imagen asignada: {'sí' if image == '1' else 'no'})")
+    print("  (tiempos acumulados desde el inicio del proceso)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Carga de pacientes desde los DataFrames OD/OS (user-001 y user-020).
+
+Compara el cargador anterior (un filtrado de los DataFrames por ID y la
+conversión fila a fila de _create_eye_data_from_row) con el motor actual
+(_iter_patients y _build_eye_records). No incluye la lectura de los Excel.
+
+    python benchmarks/bench_loading.py --patients 1000 10000 --reference-limit 5000
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+from common import best_of, format_seconds, quiet, reference_eye, reference_populate, synthetic_frames
+
+from core.models import Eye, PapilaDataset
+from features.data_loading import _build_eye_records, _first_rows, _iter_patients, _populate_dataset
+
+
+def bench_dataset(count: int, reference_limit: int, repeat: int) -> None:
+    od_df, os_df = synthetic_frames(count)
+
+    def load():
+        _populate_dataset(PapilaDataset(), od_df, os_df)
+
+    with quiet():
+        new = best_of(load, repeat)
+        old = best_of(lambda: reference_populate(od_df, os_df), 1) if count <= reference_limit else None
+    line = f"{count:>8}  nuevo {format_seconds(new):>10} ({new / count * 1e6:.0f} us/paciente)"
+    if old is not None:
+        line += f"  anterior {format_seconds(old):>10} ({old / count * 1e6:.0f} us/paciente)"
+    print(line)
+
+
+def bench_eye_records(count: int, repeat: int) -> None:
+    frames = synthetic_frames(count)
+    od_df = _first_rows(frames[0])
+    od_df = od_df[od_df['diagnosis'].notna()]
+    rows = [row for _, row in od_df.iterrows()]
+    dict_rows = od_df.to_dict('records')
+
+    series = best_of(lambda: [reference_eye(row, Eye.RIGHT) for row in rows], 1) / len(rows)
+    dicts = best_of(lambda: [reference_eye(row, Eye.RIGHT) for row in dict_rows], repeat) / len(rows)
+    columns = best_of(lambda: _build_eye_records(od_df, Eye.RIGHT), repeat) / len(rows)
+    patients = best_of(lambda: list(_iter_patients(*frames)), repeat)
+    print(f"{count:>8}  por ojo: fila Series {series * 1e6:.1f} us, fila dict {dicts * 1e6:.1f} us, "
+          f"columnas {columns * 1e6:.1f} us; _iter_patients {format_seconds(patients)}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la carga de pacientes desde los DataFrames OD/OS.")
+    parser.add_argument("--patients", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Tamaños del dataset sintético")
+    parser.add_argument("--reference-limit", type=int, default=5000,
+                        help="Tamaño máximo con el que se mide el cargador anterior (es cuadrático)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se informa la mejor)")
+    args = parser.parse_args(argv)
+
+    print("📊 Carga de pacientes (user-001)")
+    for count in args.patients:
+        bench_dataset(count, args.reference_limit, args.repeat)
+
+    print("📊 Conversión de filas en EyeData (user-020)")
+    for count in args.patients:
+        bench_eye_records(count, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
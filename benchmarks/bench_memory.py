@@ -0,0 +1,115 @@
+"""
+Memoria y tiempos de los modelos de pacientes (user-003 y user-004).
+
+- user-003: PapilaDataset frente a ColumnarPapilaDataset (memoria con
+  tracemalloc, get_statistics, filter_patients y get_patient).
+- user-004: objetos Patient/EyeData/RefractiveError con __slots__ frente a
+  clases equivalentes sin __slots__ (mismos __init__).
+
+    python benchmarks/bench_memory.py --patients 100000
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+from typing import List, Optional
+
+from common import best_of, format_seconds, quiet, synthetic_frames
+
+from core.columnar_dataset import ColumnarPapilaDataset
+from core.models import DiagnosisStatus, EyeData, Gender, PapilaDataset, Patient, RefractiveError
+from features.data_loading import _populate_dataset
+
+# Clases sin __slots__ con los mismos constructores, como antes de user-004
+UnslottedRefractiveError = type("RefractiveError", (), {"__init__": RefractiveError.__init__})
+UnslottedEyeData = type("EyeData", (), {"__init__": EyeData.__init__})
+UnslottedPatient = type("Patient", (), {"__init__": Patient.__init__})
+
+
+def traced_bytes(build) -> tuple:
+    """Ejecuta build() y devuelve (resultado, bytes que siguen asignados al terminar)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current
+
+
+def _fresh(value):
+    """Copia un float en un objeto nuevo, para que cada variante cree todo su grafo de objetos."""
+    return value + 0.0 if value is not None else None
+
+
+def copy_patients(patients: list, patient_class, eye_class, refraction_class) -> list:
+    """Copia los pacientes con las clases indicadas y floats nuevos."""
+    def copy_eye(eye):
+        if eye is None:
+            return None
+        refraction = eye.refractive_error
+        return eye_class(
+            eye.eye_type, eye.diagnosis,
+            refraction_class(_fresh(refraction.sphere), _fresh(refraction.cylinder), _fresh(refraction.axis))
+            if refraction is not None else None,
+            eye.crystalline_status, _fresh(eye.pneumatic_iop), _fresh(eye.perkins_iop), _fresh(eye.pachymetry),
+            _fresh(eye.axial_length), _fresh(eye.mean_defect)
+        )
+
+    return [patient_class(patient.patient_id, patient.age, patient.gender, copy_eye(patient.right_eye),
+                          copy_eye(patient.left_eye)) for patient in patients]
+
+
+def load_dict(od_df, os_df) -> PapilaDataset:
+    dataset = PapilaDataset()
+    with quiet():
+        _populate_dataset(dataset, od_df, os_df)
+    return dataset
+
+
+def bench_slots(count: int) -> None:
+    patients = list(load_dict(*synthetic_frames(count)).patients.values())
+    for label, classes in (("sin __slots__", (UnslottedPatient, UnslottedEyeData, UnslottedRefractiveError)),
+                           ("con __slots__", (Patient, EyeData, RefractiveError))):
+        copies, size = traced_bytes(lambda: copy_patients(patients, *classes))
+        print(f"  {label}: {size / 2 ** 20:.1f} MiB ({size / count:.0f} B/paciente)")
+        del copies
+
+
+def bench_datasets(count: int, repeat: int) -> None:
+    od_df, os_df = synthetic_frames(count)
+
+    dict_dataset, dict_size = traced_bytes(lambda: load_dict(od_df, os_df))
+    columnar, columnar_size = traced_bytes(lambda: ColumnarPapilaDataset.from_dataset(dict_dataset))
+    print(f"  memoria: dict {dict_size / count:.0f} B/paciente, columnar {columnar_size / count:.0f} B/paciente")
+
+    ids = list(dict_dataset.patients)
+    query = dict(age_min=40, age_max=60, gender=Gender.FEMALE, diagnosis=DiagnosisStatus.GLAUCOMA)
+    for label, dataset in (("dict", dict_dataset), ("columnar", columnar)):
+        stats = (best_of(dataset.recompute_statistics, repeat) if isinstance(dataset, PapilaDataset)
+                 else best_of(dataset.get_statistics, repeat))
+        hits = len(dataset.filter_patients(**query))
+        filtered = best_of(lambda: dataset.filter_patients(**query), repeat)
+        lookup = best_of(lambda: [dataset.get_patient(patient_id) for patient_id in ids[:1000]], repeat) / 1000
+        print(f"  {label:>8}: get_statistics {format_seconds(stats)}, filter ({hits} resultados) "
+              f"{format_seconds(filtered)}, get_patient {format_seconds(lookup)}")
+    print("  (get_statistics del dict: recálculo completo; la versión incremental no recorre los pacientes)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la memoria y los tiempos de los modelos de pacientes.")
+    parser.add_argument("--patients", type=int, default=100000, help="Tamaño del dataset sintético")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se informa la mejor)")
+    args = parser.parse_args(argv)
+
+    print(f"📊 __slots__ en los modelos, {args.patients} pacientes (user-004)")
+    bench_slots(args.patients)
+    print(f"📊 PapilaDataset frente a ColumnarPapilaDataset, {args.patients} pacientes (user-003)")
+    bench_datasets(args.patients, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Latencia clic-pintado al navegar entre pacientes (user-012 y user-013).
+
+Reproduce sin pantalla la navegación de PatientViewer con el siguiente
+paciente: cada clic muestra las dos imágenes y un bucle mínimo ejecuta los
+root.after del ImagePrefetcher, hasta el pintado y después durante el tiempo
+de lectura indicado. Se mide desde el clic hasta que los dos labels tienen su
+imagen:
+- sin precarga: find_image_for_patient y load_and_display_image de las dos
+  imágenes en el hilo de la interfaz (update_images antes de user-012);
+- con precarga: el camino de PatientViewer.update_images (imagen preparada
+  o, si aún no lo está, ImagePrefetcher.load en segundo plano).
+
+Cada variante navega por pacientes distintos, así que la caché de miniaturas
+empieza en frío. Sin display no se pueden crear ImageTk.PhotoImage reales: se
+sustituyen por un objeto vacío y su coste no se incluye. Tampoco se incluye
+el resto de display_patient_data (las pestañas), que no cambia.
+
+    python benchmarks/bench_prefetch.py --patients 20 --think 150 50
+"""
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+from common import format_seconds, patient_ids
+
+# La caché de disco de las miniaturas se crea al importar, así que se redirige antes
+_thumbnail_dir = tempfile.TemporaryDirectory(prefix="papila-thumbnails-")
+os.environ['THUMBNAIL_CACHE_DIR'] = _thumbnail_dir.name
+
+from PIL import ImageTk
+
+from bench_thumbnails import synthetic_fundus
+
+from core.models import Eye
+from ui.image_prefetch import ImagePrefetcher
+from utils.image_utils import find_image_for_patient, load_and_display_image
+
+# Espera máxima (s) al pintado de un paciente
+PAINT_TIMEOUT = 10
+
+
+class Photo:
+    """Sustituto de ImageTk.PhotoImage, que necesita un display."""
+
+    def __init__(self, image=None, **kwargs):
+        self.image = image
+
+
+class Label:
+    """Sustituto de tk.Label: solo guarda la imagen mostrada."""
+
+    def __init__(self):
+        self.image = None
+
+    def config(self, image=None, **kwargs):
+        self.image = image
+
+
+class Root:
+    """Bucle de eventos mínimo: ejecuta los callbacks de after cuando vencen."""
+
+    def __init__(self):
+        self._callbacks = []
+
+    def after(self, ms, callback, *args):
+        self._callbacks.append((time.perf_counter() + ms / 1000, callback, args))
+
+    def run(self, seconds: float, until: Optional[Callable[[], bool]] = None) -> None:
+        """Ejecuta el bucle durante seconds o hasta que until() devuelva True."""
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end and not (until is not None and until()):
+            now = time.perf_counter()
+            due = [entry for entry in self._callbacks if entry[0] <= now]
+            self._callbacks = [entry for entry in self._callbacks if entry[0] > now]
+            for _, callback, args in due:
+                callback(*args)
+            time.sleep(0.001)
+
+
+def create_images(images_dir: str, ids: List[str], sources: int) -> None:
+    """Crea las imágenes OD/OS de los pacientes copiando sources JPEG sintéticos."""
+    paths = []
+    for number in range(sources):
+        paths.append(os.path.join(images_dir, f"source{number}.jpg"))
+        synthetic_fundus(paths[-1], noisy=number % 2 == 0, seed=number)
+    for number, patient_id in enumerate(ids):
+        for offset, suffix in enumerate(("OD", "OS")):
+            shutil.copy(paths[(2 * number + offset) % sources],
+                        os.path.join(images_dir, f"RET{patient_id[1:]}{suffix}.jpg"))
+    for path in paths:
+        os.remove(path)
+
+
+def navigate_without_prefetch(ids: List[str], images_dir: str) -> List[float]:
+    labels = {Eye.RIGHT: Label(), Eye.LEFT: Label()}
+    times = []
+    for patient_id in ids:
+        start = time.perf_counter()
+        for eye_type, label in labels.items():
+            load_and_display_image(find_image_for_patient(patient_id, eye_type, images_dir), label, images_dir)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def navigate_with_prefetch(ids: List[str], images_dir: str, think: float) -> List[float]:
+    root = Root()
+    prefetcher = ImagePrefetcher(root, images_dir)
+    labels = {Eye.RIGHT: Label(), Eye.LEFT: Label()}
+    times = []
+    try:
+        for index, patient_id in enumerate(ids):
+            start = time.perf_counter()
+            painted = []
+            for eye_type, label in labels.items():
+                prepared = prefetcher.get(patient_id, eye_type)
+                if prepared is not None:
+                    label.config(image=prepared[2])
+                    painted.append(eye_type)
+                    continue
+                label.config(image='')
+                prefetcher.load(patient_id, eye_type, None,
+                                lambda path, img, photo, label=label, eye_type=eye_type:
+                                (label.config(image=photo), painted.append(eye_type)))
+            prefetcher.schedule(ids, index)
+            root.run(PAINT_TIMEOUT, until=lambda: len(painted) == len(labels))
+            times.append(time.perf_counter() - start)
+            root.run(think)
+    finally:
+        prefetcher.shutdown()
+    return times
+
+
+def report(label: str, times: List[float]) -> None:
+    ordered = sorted(times)
+    print(f"  {label:<34} {format_seconds(statistics.median(times)):>10} mediana, "
+          f"{format_seconds(ordered[int(len(ordered) * 0.9)])} p90, primer clic {format_seconds(times[0])}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la latencia clic-pintado con y sin precarga de imágenes.")
+    parser.add_argument("--patients", type=int, default=20, help="Clics de navegación por variante")
+    parser.add_argument("--think", type=int, nargs="+", default=[150, 50],
+                        help="Tiempos (ms) entre clics con precarga")
+    parser.add_argument("--sources", type=int, default=8, help="JPEG sintéticos distintos (2576x1934)")
+    args = parser.parse_args(argv)
+
+    ImageTk.PhotoImage = Photo
+    # image_utils registra cada búsqueda en DEBUG/INFO; escribirlo falsearía los tiempos
+    logging.disable(logging.INFO)
+    groups = 1 + len(args.think)
+    ids = patient_ids(args.patients * groups)
+    sets = [ids[i * args.patients:(i + 1) * args.patients] for i in range(groups)]
+
+    with tempfile.TemporaryDirectory() as images_dir:
+        create_images(images_dir, ids, args.sources)
+        print(f"📊 Clic-pintado de las dos imágenes, {args.patients} clics (user-012 y user-013)")
+        report("sin precarga (anterior)", navigate_without_prefetch(sets[0], images_dir))
+        for think, group in zip(args.think, sets[1:]):
+            report(f"con precarga, {think} ms entre clics", navigate_with_prefetch(group, images_dir, think / 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Latencia percibida al guardar desde la interfaz (user-022).
+
+Mide, sobre un par de Excel sintético, cuánto bloquea cada guardado el hilo
+de la interfaz:
+- síncrono: save_patient_record en el hilo de Tk (antes de user-022), una
+  transacción con fsync por guardado;
+- BackgroundSaver.save: anota el cambio y vuelve; un hilo lo escribe tras
+  el debounce.
+Para el BackgroundSaver también informa cuánto tarda la ráfaga en quedar
+escrita tras el último guardado y en cuántas transacciones se escribió.
+
+    python benchmarks/bench_saver.py --patients 10000 --saves 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from common import format_seconds, latencies, synthetic_frames
+
+from features.data_loading import _iter_patients, record_patient_changes, save_patient_record
+from features.patient_journal import patient_fingerprint
+from ui.background_saver import BackgroundSaver
+
+# Ediciones de cada paciente en la ráfaga del BackgroundSaver
+BURST_EDITS = 3
+
+
+class Root:
+    """Sustituto de la ventana de Tk: el benchmark no necesita ejecutar los callbacks de after."""
+
+    def after(self, ms, callback, *args):
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la latencia de guardado percibida en la interfaz.")
+    parser.add_argument("--patients", type=int, default=10000, help="Pacientes del par de Excel sintético")
+    parser.add_argument("--saves", type=int, default=200, help="Pacientes editados")
+    parser.add_argument("--debounce", type=int, default=500, help="SAVE_DEBOUNCE_MS del BackgroundSaver")
+    args = parser.parse_args(argv)
+
+    os.environ.pop('PATIENT_JOURNAL_FILE', None)
+    od_df, os_df = synthetic_frames(args.patients)
+    patients = list(_iter_patients(od_df, os_df))
+    edits = [patients[i * len(patients) // args.saves] for i in range(args.saves)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        od_excel_file = os.path.join(workdir, "patient_data_od.xlsx")
+        os_excel_file = os.path.join(workdir, "patient_data_os.xlsx")
+        od_df.to_excel(od_excel_file, index=False)
+        os_df.to_excel(os_excel_file, index=False)
+
+        print(f"📊 Guardado desde la interfaz, {args.saves} pacientes editados (user-022)")
+        median, p99 = latencies(lambda i: save_patient_record(edits[i], od_excel_file, os_excel_file), len(edits))
+        print(f"  síncrono (anterior)      {format_seconds(median):>10} mediana, {format_seconds(p99)} p99")
+
+        writes = []
+
+        def write(changes, bases):
+            rejected = record_patient_changes(changes, od_excel_file, os_excel_file, bases)
+            writes.append(len(changes))
+            return rejected
+
+        errors, conflicts = [], []
+        saver = BackgroundSaver(Root(), write, errors.append, conflicts.extend, debounce_ms=args.debounce)
+        burst = edits * BURST_EDITS
+        # La interfaz toma la huella al abrir el formulario, no al guardar
+        bases = [patient_fingerprint(patient) for patient in burst]
+        median, p99 = latencies(lambda i: saver.save(burst[i], bases[i]), len(burst))
+        last_save = time.perf_counter()
+        while saver.pending() and not errors:
+            time.sleep(0.001)
+        written = time.perf_counter() - last_save
+        saver.close()
+        print(f"  BackgroundSaver.save     {format_seconds(median):>10} mediana, {format_seconds(p99)} p99")
+        print(f"  ráfaga de {len(burst)} guardados escrita {format_seconds(written)} después del último, "
+              f"en {len(writes)} transacciones ({sum(writes)} filas)")
+        if errors:
+            print(f"❌ Error de escritura: {errors[0]}")
+            return 1
+        if conflicts:
+            print(f"❌ Cambios rechazados por conflicto: {conflicts}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Arranque con la caché columnar de los Excel (user-002).
+
+Escribe un par de Excel sintético y mide, cada caso en un proceso nuevo
+(como al abrir la aplicación):
+- pd.read_excel del Excel OD, sin caché (lo que se hacía antes);
+- read_patient_excel en frío (sin caché: lectura del Excel y escritura de
+  la caché), en caliente y en caliente tras cambiar la fecha del Excel;
+- load_patient_data con los dos Excel, en frío y en caliente.
+
+Se informa el tiempo de la operación y el del proceso completo (incluidas
+las importaciones).
+
+    python benchmarks/bench_startup.py --patients 20000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from common import ROOT, format_seconds, synthetic_frames
+
+from features.data_loading import get_cache_path
+
+# Se ejecuta en un proceso nuevo; imprime el tiempo de la operación pedida
+STARTUP_PROBE = """
+import contextlib, os, sys, time
+sys.path.insert(0, sys.argv[1])
+mode, od_excel_file, os_excel_file = sys.argv[2:5]
+import pandas as pd
+from features.data_loading import load_patient_data, read_patient_excel
+
+start = time.perf_counter()
+with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    if mode == "excel":
+        rows = len(pd.read_excel(od_excel_file))
+    elif mode == "read":
+        rows = len(read_patient_excel(od_excel_file))
+    else:
+        rows = len(load_patient_data(od_excel_file, os_excel_file).patients)
+print(time.perf_counter() - start, rows)
+"""
+
+
+def run_probe(mode: str, od_excel_file: str, os_excel_file: str) -> Tuple[float, float, int]:
+    """Ejecuta STARTUP_PROBE en un proceso nuevo y devuelve (operación, proceso, filas o pacientes)."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", STARTUP_PROBE, ROOT, mode, od_excel_file, os_excel_file],
+                            capture_output=True, text=True, check=True)
+    process = time.perf_counter() - start
+    seconds, rows = result.stdout.split()
+    return float(seconds), process, int(rows)
+
+
+def remove_caches(*excel_files: str) -> None:
+    for excel_file in excel_files:
+        if os.path.exists(get_cache_path(excel_file)):
+            os.remove(get_cache_path(excel_file))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide el arranque con la caché de los Excel, en frío y en caliente.")
+    parser.add_argument("--patients", type=int, default=20000, help="Pacientes del par de Excel sintético")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        od_excel_file = os.path.join(workdir, "patient_data_od.xlsx")
+        os_excel_file = os.path.join(workdir, "patient_data_os.xlsx")
+        for df, excel_file in zip(synthetic_frames(args.patients), (od_excel_file, os_excel_file)):
+            df.to_excel(excel_file, index=False)
+
+        def report(label: str, mode: str) -> None:
+            seconds, process, rows = run_probe(mode, od_excel_file, os_excel_file)
+            print(f"  {label:<32} {format_seconds(seconds):>10}  (proceso {format_seconds(process)}, {rows})")
+
+        print(f"📊 Arranque, {args.patients} pacientes por ojo (user-002)")
+        report("pd.read_excel (anterior)", "excel")
+        remove_caches(od_excel_file)
+        report("read_patient_excel en frío", "read")
+        report("read_patient_excel en caliente", "read")
+        os.utime(od_excel_file)
+        report("en caliente tras touch (hash)", "read")
+
+        remove_caches(od_excel_file, os_excel_file)
+        report("load_patient_data en frío", "load")
+        report("load_patient_data en caliente", "load")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Motor de estadísticas vectorizado (user-005).
+
+Compara compute_statistics sobre las columnas de ColumnarPapilaDataset, el
+recálculo del dict (collect_statistics_columns + compute_statistics), las
+estadísticas incrementales de PapilaDataset y el get_statistics anterior
+(solo las estadísticas básicas, recorriendo los pacientes). También mide el
+mantenimiento incremental (user-006): quitar y añadir un paciente y editar
+uno con update_patient seguido de get_statistics.
+
+    python benchmarks/bench_statistics.py --patients 500000
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+from common import best_of, format_seconds, latencies, quiet, synthetic_frames
+
+from core.columnar_dataset import ColumnarPapilaDataset
+from core.models import DiagnosisStatus, Gender, PapilaDataset
+from features.data_loading import _populate_dataset
+
+
+def reference_statistics(patients: dict) -> dict:
+    """get_statistics de PapilaDataset antes del motor vectorizado (solo estadísticas básicas)."""
+    stats = {
+        "total_patients": len(patients),
+        "gender_distribution": {
+            "male": sum(1 for p in patients.values() if p.gender == Gender.MALE),
+            "female": sum(1 for p in patients.values() if p.gender == Gender.FEMALE)
+        },
+        "diagnosis_distribution": {"healthy": 0, "glaucoma": 0, "suspect": 0, "mixed": 0},
+        "age_stats": {"min": float('inf'), "max": float('-inf'), "avg": 0}
+    }
+    total_age = 0
+    for patient in patients.values():
+        total_age += patient.age
+        stats["age_stats"]["min"] = min(stats["age_stats"]["min"], patient.age)
+        stats["age_stats"]["max"] = max(stats["age_stats"]["max"], patient.age)
+
+        right_diagnosis = patient.right_eye.diagnosis if patient.right_eye else None
+        left_diagnosis = patient.left_eye.diagnosis if patient.left_eye else None
+        if right_diagnosis == left_diagnosis:
+            if right_diagnosis == DiagnosisStatus.HEALTHY:
+                stats["diagnosis_distribution"]["healthy"] += 1
+            elif right_diagnosis == DiagnosisStatus.GLAUCOMA:
+                stats["diagnosis_distribution"]["glaucoma"] += 1
+            elif right_diagnosis == DiagnosisStatus.SUSPECT:
+                stats["diagnosis_distribution"]["suspect"] += 1
+        else:
+            stats["diagnosis_distribution"]["mixed"] += 1
+    stats["age_stats"]["avg"] = total_age / len(patients)
+    return stats
+
+
+def bench_incremental(dataset: PapilaDataset, count: int) -> None:
+    sample = list(dataset.patients.values())[:count]
+
+    def remove_add(i):
+        dataset.remove_patient(sample[i].patient_id)
+        dataset.add_patient(sample[i])
+
+    def update(i):
+        sample[i].age += 1
+        dataset.update_patient(sample[i])
+        dataset.get_statistics()
+
+    median, p99 = latencies(remove_add, len(sample))
+    print(f"  remove_patient + add_patient     {format_seconds(median):>10} mediana, {format_seconds(p99)} p99")
+    median, p99 = latencies(update, len(sample))
+    print(f"  update_patient + get_statistics  {format_seconds(median):>10} mediana, {format_seconds(p99)} p99")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide el cálculo de las estadísticas del dataset.")
+    parser.add_argument("--patients", type=int, default=500000, help="Tamaño del dataset sintético")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se informa la mejor)")
+    parser.add_argument("--updates", type=int, default=1000, help="Pacientes editados en la parte incremental")
+    args = parser.parse_args(argv)
+
+    dataset = PapilaDataset()
+    with quiet():
+        _populate_dataset(dataset, *synthetic_frames(args.patients))
+    columnar = ColumnarPapilaDataset.from_dataset(dataset)
+
+    print(f"📊 Estadísticas, {args.patients} pacientes (user-005)")
+    timings = [
+        ("columnar (compute_statistics)", columnar.get_statistics),
+        ("dict, recálculo completo", dataset.recompute_statistics),
+        ("dict, incremental", dataset.get_statistics),
+        ("dict, anterior (solo básicas)", lambda: reference_statistics(dataset.patients)),
+    ]
+    for label, function in timings:
+        print(f"  {label:<32} {format_seconds(best_of(function, args.repeat)):>10}")
+
+    print(f"📊 Estadísticas incrementales, {args.patients} pacientes (user-006)")
+    bench_incremental(dataset, args.updates)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
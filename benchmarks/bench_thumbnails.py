@@ -0,0 +1,139 @@
+"""
+Miniaturas de las imágenes de fondo de ojo (user-010 y user-011).
+
+- user-010: navegación por las imágenes sin caché (Image.open + thumbnail en
+  cada visualización) frente a ThumbnailCache en frío, con el nivel de disco
+  y con el nivel de memoria.
+- user-011: decode_thumbnail con cada calidad de THUMBNAIL_QUALITY_PRESETS,
+  con su PSNR respecto de "high" y el pico de memoria de un proceso nuevo.
+
+Las imágenes son JPEG sintéticos de 2576x1934, con ruido (varios MB, la
+decodificación entrópica domina) o lisos (unos cientos de KB).
+
+    python benchmarks/bench_thumbnails.py --images 24
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+from common import ROOT, best_of, format_seconds
+
+from utils.thumbnail_cache import THUMBNAIL_QUALITY_PRESETS, THUMBNAIL_SIZE, ThumbnailCache, decode_thumbnail
+
+IMAGE_SIZE = (2576, 1934)
+
+# Mide en un proceso nuevo cuánto crece el pico de memoria al decodificar. Se lee VmHWM
+# de /proc (Linux) porque ru_maxrss conserva tras exec el pico del proceso padre.
+RSS_PROBE = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from utils.thumbnail_cache import decode_thumbnail
+
+def peak_kib():
+    with open('/proc/self/status') as status:
+        return int(next(line for line in status if line.startswith('VmHWM')).split()[1])
+
+before = peak_kib()
+decode_thumbnail(sys.argv[2], quality=sys.argv[3])
+print(peak_kib() - before)
+"""
+
+
+def synthetic_fundus(path: str, noisy: bool, seed: int = 0) -> None:
+    """Guarda un JPEG de fondo de ojo sintético: un disco rojizo con degradado y, si noisy, ruido."""
+    width, height = IMAGE_SIZE
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    distance = np.hypot((x - width / 2) / (height / 2), (y - height / 2) / (height / 2))
+    disc = np.clip(1.0 - distance, 0, 1)
+    pixels = np.stack([200 * disc + 30, 90 * disc + 10, 40 * disc], axis=-1)
+    if noisy:
+        pixels += np.random.default_rng(seed).normal(0, 12, pixels.shape)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=92)
+
+
+def reference_thumbnail(path: str) -> Image.Image:
+    """Miniatura de load_and_display_image antes de la caché: decodificar y reducir en cada visualización."""
+    with Image.open(path) as img:
+        img.thumbnail(THUMBNAIL_SIZE)
+        return img
+
+
+def psnr(image: Image.Image, reference: Image.Image) -> float:
+    if image.size != reference.size:
+        image = image.resize(reference.size)
+    error = np.mean((np.asarray(image, dtype=np.float64) - np.asarray(reference, dtype=np.float64)) ** 2)
+    return float('inf') if error == 0 else 10 * np.log10(255 ** 2 / error)
+
+
+def peak_rss_kib(path: str, quality: str) -> Optional[int]:
+    """Crecimiento del pico de memoria de un proceso nuevo al decodificar, o None fuera de Linux."""
+    if not os.path.exists('/proc/self/status'):
+        return None
+    result = subprocess.run([sys.executable, "-c", RSS_PROBE, ROOT, path, quality],
+                            capture_output=True, text=True, check=True)
+    return int(result.stdout.strip())
+
+
+def bench_cache(paths: List[str], workdir: str) -> None:
+    def browse(function):
+        return best_of(lambda: [function(path) for path in paths], 1) / len(paths)
+
+    print(f"📊 Navegación por {len(paths)} imágenes, por imagen (user-010)")
+    print(f"  sin caché (anterior)   {format_seconds(browse(reference_thumbnail)):>10}")
+    cache = ThumbnailCache(cache_dir=os.path.join(workdir, "thumbnails"))
+    print(f"  en frío (decodificar)  {format_seconds(browse(cache.get_thumbnail)):>10}")
+    cache.clear_memory()
+    print(f"  nivel de disco         {format_seconds(browse(cache.get_thumbnail)):>10}")
+    print(f"  nivel de memoria       {format_seconds(browse(cache.get_thumbnail)):>10}")
+    print(f"  {cache.get_stats()}")
+
+
+def bench_quality(samples: dict, repeat: int) -> None:
+    print("📊 decode_thumbnail por calidad (user-011)")
+    print(f"  {'':<10}" + "".join(f"{label:>16}" for label in samples) + f"{'pico RSS':>12}{'PSNR':>10}")
+    for quality in ("reference",) + tuple(THUMBNAIL_QUALITY_PRESETS):
+        decode = reference_thumbnail if quality == "reference" else (
+            lambda path, quality=quality: decode_thumbnail(path, quality=quality))
+        line = f"  {'anterior' if quality == 'reference' else quality:<10}"
+        for path in samples.values():
+            line += f"{format_seconds(best_of(lambda: decode(path), repeat)):>16}"
+        path = samples["con ruido"]
+        rss = peak_rss_kib(path, "balanced" if quality == "reference" else quality)
+        line += f"{rss / 1024:>8.1f} MiB" if rss is not None else f"{'-':>12}"
+        if quality != "high":
+            line += f"{psnr(decode(path), decode_thumbnail(path, quality='high')):>7.1f} dB"
+        print(line)
+    print("  (PSNR respecto de high; el pico de 'anterior' es el de balanced, que usa los mismos parámetros)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide la decodificación y la caché de miniaturas.")
+    parser.add_argument("--images", type=int, default=24, help="Imágenes de la navegación")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se informa la mejor)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        samples = {}
+        for label, noisy in (("con ruido", True), ("lisa", False)):
+            samples[label] = os.path.join(workdir, f"{'noisy' if noisy else 'smooth'}.jpg")
+            synthetic_fundus(samples[label], noisy)
+            print(f"🖼️ Imagen {label}: {os.path.getsize(samples[label]) / 1024:.0f} KiB")
+
+        paths = []
+        for number in range(1, args.images + 1):
+            paths.append(os.path.join(workdir, f"RET{number:03d}OD.jpg"))
+            synthetic_fundus(paths[-1], noisy=number % 2 == 1, seed=number)
+
+        bench_cache(paths, workdir)
+        bench_quality(samples, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Utilidades compartidas por los scripts de benchmarks/: datos sintéticos y medición de tiempos.
+
+Los scripts se ejecutan desde la raíz del repositorio, por ejemplo:
+
+    python benchmarks/bench_loading.py --patients 10000
+"""
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Directorio de imágenes vacío, para que la carga no lea ni cree el FundusImages del repositorio
+_images_dir = tempfile.TemporaryDirectory(prefix="papila-bench-")
+os.environ['FUNDUS_IMAGES_DIR'] = _images_dir.name
+
+from features.patient_journal import EXCEL_COLUMNS  # noqa: E402
+
+# Fracción de mediciones faltantes en los datos sintéticos
+MISSING_FRACTION = 0.05
+
+
+def patient_ids(count: int) -> List[str]:
+    """IDs con el formato de los Excel del repositorio (#000001...)."""
+    return [f"#{number:06d}" for number in range(1, count + 1)]
+
+
+def synthetic_frames(count: int, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Crea DataFrames OD y OS con las columnas de los Excel de pacientes.
+
+    Los valores siguen los rangos clínicos de los datos reales, con
+    MISSING_FRACTION de mediciones faltantes en cada columna numérica.
+
+    Args:
+        count: Número de pacientes (cada uno con los dos ojos)
+        seed: Semilla del generador
+
+    Returns:
+        Tupla (DataFrame OD, DataFrame OS)
+    """
+    rng = np.random.default_rng(seed)
+    ids = patient_ids(count)
+    age = rng.integers(18, 90, count)
+    gender = rng.integers(0, 2, count)
+
+    def eye_frame() -> pd.DataFrame:
+        columns = {
+            'patient_id': ids,
+            'age': age,
+            'gender': gender,
+            'diagnosis': rng.integers(0, 3, count),
+            'sphere': np.round(rng.normal(0, 2.5, count) * 4) / 4,
+            # 0.0 - x en lugar de -x, que daría -0.0 (Excel no lo distingue de 0)
+            'cylinder': 0.0 - np.round(rng.exponential(0.75, count) * 4) / 4,
+            'axis': rng.integers(0, 181, count).astype(float),
+            'crystalline_status': rng.integers(0, 2, count).astype(float),
+            'pneumatic_iop': np.round(rng.normal(17, 4, count)),
+            'perkins_iop': np.round(rng.normal(16, 4, count)),
+            'pachymetry': np.round(rng.normal(540, 35, count)),
+            'axial_length': np.round(rng.normal(23.5, 1.2, count), 2),
+            'mean_defect': np.round(rng.normal(-2, 4, count), 2),
+        }
+        df = pd.DataFrame(columns, columns=EXCEL_COLUMNS)
+        for field in EXCEL_COLUMNS[4:]:
+            df.loc[rng.random(count) < MISSING_FRACTION, field] = np.nan
+        return df
+
+    return eye_frame(), eye_frame()
+
+
+def best_of(function: Callable[[], object], repeat: int = 5) -> float:
+    """Mejor tiempo (s) de varias ejecuciones de una función."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def latencies(function: Callable[[int], object], count: int) -> Tuple[float, float]:
+    """
+    Mide la latencia de count llamadas a function(i).
+
+    Returns:
+        Tupla (mediana, percentil 99) en segundos
+    """
+    times = []
+    for i in range(count):
+        start = time.perf_counter()
+        function(i)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return statistics.median(times), times[min(len(times) - 1, int(len(times) * 0.99))]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Descarta lo que imprime el código medido (mensajes de depuración de la carga)."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def format_seconds(seconds: float) -> str:
+    """Formatea un tiempo (o una diferencia de tiempos) con la unidad más legible."""
+    if abs(seconds) >= 1:
+        return f"{seconds:.2f} s"
+    if abs(seconds) >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def _optional_float(row, field):
+    return float(row[field]) if not pd.isna(row[field]) else None
+
+
+def reference_eye(row, eye_type):
+    """Conversión de una fila en EyeData del cargador anterior (_create_eye_data_from_row)."""
+    from core.models import EyeData, RefractiveError, DiagnosisStatus, CrystallineStatus
+
+    refractive_error = None
+    if not pd.isna(row['sphere']):
+        refractive_error = RefractiveError(sphere=float(row['sphere']), cylinder=_optional_float(row, 'cylinder'),
+                                           axis=_optional_float(row, 'axis'))
+    return EyeData(
+        eye_type=eye_type,
+        diagnosis=DiagnosisStatus(int(row['diagnosis'])),
+        refractive_error=refractive_error,
+        crystalline_status=CrystallineStatus(int(row['crystalline_status']))
+        if not pd.isna(row['crystalline_status']) else None,
+        pneumatic_iop=_optional_float(row, 'pneumatic_iop'),
+        perkins_iop=_optional_float(row, 'perkins_iop'),
+        pachymetry=_optional_float(row, 'pachymetry'),
+        axial_length=_optional_float(row, 'axial_length'),
+        mean_defect=_optional_float(row, 'mean_defect')
+    )
+
+
+def reference_populate(od_df: pd.DataFrame, os_df: pd.DataFrame):
+    """Cargador anterior de load_patient_data: un filtrado de los DataFrames por cada ID."""
+    from core.models import PapilaDataset, Patient, Eye, Gender
+
+    dataset = PapilaDataset()
+    for patient_id in set(od_df['patient_id'].tolist() + os_df['patient_id'].tolist()):
+        od_data = od_df[od_df['patient_id'] == patient_id]
+        os_data = os_df[os_df['patient_id'] == patient_id]
+        patient_row = od_data.iloc[0] if not od_data.empty else os_data.iloc[0]
+        patient = Patient(str(patient_id), int(patient_row['age']), Gender(int(patient_row['gender'])))
+        if not od_data.empty and not pd.isna(od_data.iloc[0]['diagnosis']):
+            patient.set_eye_data(reference_eye(od_data.iloc[0], Eye.RIGHT))
+        if not os_data.empty and not pd.isna(os_data.iloc[0]['diagnosis']):
+            patient.set_eye_data(reference_eye(os_data.iloc[0], Eye.LEFT))
+        dataset.add_patient(patient)
+    return dataset
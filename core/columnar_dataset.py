@@ -0,0 +1,440 @@
+import math
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.models import (
+    PapilaDataset, Patient, EyeData, RefractiveError, Eye, Gender, DiagnosisStatus, CrystallineStatus
+)
+
+# Prefijo de las columnas de cada ojo
+EYE_PREFIXES = {Eye.RIGHT: "od", Eye.LEFT: "os"}
+
+# Campos numéricos de cada ojo (NaN representa un valor faltante)
+REFRACTION_FIELDS = ("sphere", "cylinder", "axis")
+MEASUREMENT_FIELDS = ("pneumatic_iop", "perkins_iop", "pachymetry", "axial_length", "mean_defect")
+EYE_FLOAT_FIELDS = REFRACTION_FIELDS + MEASUREMENT_FIELDS
+
+# Código usado en las columnas enteras para indicar un valor faltante
+MISSING_CODE = -1
+
+# Capacidad inicial de los arreglos
+INITIAL_CAPACITY = 64
+
+# Pacientes materializados que se conservan por defecto en la caché de objetos (0 = sin caché)
+DEFAULT_CACHE_SIZE = 0
+
+
+def _build_column_specs() -> Dict[str, tuple]:
+    """
+    Define el tipo y el valor vacío de cada columna del dataset.
+
+    Returns:
+        Diccionario nombre de columna -> (dtype, valor vacío)
+    """
+    specs = {
+        "age": (np.int16, 0),
+        "gender": (np.int8, 0),
+    }
+    for prefix in EYE_PREFIXES.values():
+        specs[f"{prefix}_present"] = (np.bool_, False)
+        specs[f"{prefix}_diagnosis"] = (np.int8, MISSING_CODE)
+        specs[f"{prefix}_crystalline_status"] = (np.int8, MISSING_CODE)
+        for field in EYE_FLOAT_FIELDS:
+            specs[f"{prefix}_{field}"] = (np.float64, np.nan)
+        specs[f"{prefix}_fundus_image"] = (object, None)
+    return specs
+
+
+COLUMN_SPECS = _build_column_specs()
+
+
+def _optional_float(value: float) -> Optional[float]:
+    """Convierte un valor de un arreglo a float, o None si es NaN."""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class _PatientsView(Mapping):
+    """
+    Vista de solo lectura ID -> Patient sobre un ColumnarPapilaDataset.
+
+    Permite usar dataset.patients igual que con PapilaDataset; los objetos
+    Patient se crean al acceder a cada elemento. keys() no materializa
+    ningún paciente; values() e items() sí (uno por paciente) y por eso no
+    pasan por la caché, para que un recorrido completo no desaloje los
+    pacientes que está mostrando la interfaz.
+    """
+
+    def __init__(self, dataset: "ColumnarPapilaDataset"):
+        self._dataset = dataset
+
+    def __getitem__(self, patient_id: str) -> Patient:
+        patient = self._dataset.get_patient(patient_id)
+        if patient is None:
+            raise KeyError(patient_id)
+        return patient
+
+    def __contains__(self, patient_id: object) -> bool:
+        return patient_id in self._dataset._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._dataset._ids))
+
+    def __len__(self) -> int:
+        return len(self._dataset._ids)
+
+    def keys(self) -> List[str]:
+        return list(self._dataset._ids)
+
+    def values(self) -> Iterator[Patient]:
+        dataset = self._dataset
+        return (dataset._build_patient(row) for row in range(len(dataset._ids)))
+
+    def items(self) -> Iterator[Tuple[str, Patient]]:
+        return ((patient.patient_id, patient) for patient in self.values())
+
+
+class ColumnarPapilaDataset:
+    """
+    Alternativa a PapilaDataset que guarda los datos en arreglos NumPy tipados.
+
+    Cada campo de cada ojo se almacena en un arreglo (una posición por paciente)
+    en lugar de un objeto Patient con dos EyeData. Los valores faltantes se
+    representan con NaN en los campos numéricos y con MISSING_CODE en los
+    enumerados. Los objetos Patient devueltos son vistas creadas al momento: los
+    cambios sobre ellos deben guardarse con update_patient.
+
+    Con cache_size > 0 se conservan los últimos pacientes materializados (LRU),
+    de modo que volver a pedir el paciente actual o sus vecinos no crea objetos
+    nuevos.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.base_dir: Optional[str] = None
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._capacity = max(int(capacity), 1)
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.full(self._capacity, empty, dtype=dtype) for name, (dtype, empty) in COLUMN_SPECS.items()
+        }
+        self._cache_size = max(int(cache_size), 0)
+        self._cache: "OrderedDict[str, Patient]" = OrderedDict()
+        # Directorio donde se buscan las imágenes al materializar cada paciente (defer_images)
+        self._images_dir: Optional[str] = None
+
+    @classmethod
+    def from_dataset(cls, dataset: PapilaDataset) -> "ColumnarPapilaDataset":
+        """
+        Crea un dataset columnar a partir de un PapilaDataset.
+
+        Args:
+            dataset: Dataset con los pacientes como objetos
+
+        Returns:
+            Dataset columnar con los mismos pacientes
+        """
+        columnar = cls(capacity=len(dataset.patients))
+        for patient in dataset.patients.values():
+            columnar.add_patient(patient)
+        return columnar
+
+    @classmethod
+    def from_columns(cls, patient_ids: Sequence[str], columns: Dict[str, np.ndarray],
+                     cache_size: int = DEFAULT_CACHE_SIZE) -> "ColumnarPapilaDataset":
+        """
+        Crea un dataset columnar directamente a partir de arreglos, sin objetos Patient.
+
+        Args:
+            patient_ids: IDs de los pacientes (sin repetir), en orden
+            columns: Arreglos con los nombres de COLUMN_SPECS y un valor por paciente;
+                las columnas que falten quedan vacías
+            cache_size: Tamaño de la caché de pacientes materializados
+
+        Returns:
+            Dataset columnar con los pacientes indicados
+        """
+        columnar = cls(capacity=len(patient_ids), cache_size=cache_size)
+        columnar._ids = list(patient_ids)
+        columnar._rows = {patient_id: row for row, patient_id in enumerate(columnar._ids)}
+        if len(columnar._rows) != len(columnar._ids):
+            raise ValueError("Los IDs de los pacientes deben ser únicos")
+        for name, values in columns.items():
+            columnar._columns[name][:len(columnar._ids)] = values
+        return columnar
+
+    @property
+    def patients(self) -> _PatientsView:
+        return _PatientsView(self)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def set_base_directory(self, directory: str) -> None:
+        if os.path.isdir(directory):
+            self.base_dir = directory
+        else:
+            raise NotADirectoryError(f"El directorio {directory} no existe")
+
+    def load_images(self, directory: str, verify: bool = False, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Asigna a los ojos de todos los pacientes sus imágenes de fondo de ojo.
+
+        El emparejamiento usa los IDs y las columnas de presencia de cada ojo,
+        sin materializar los pacientes.
+
+        Args:
+            directory: Directorio de imágenes de fondo de ojo
+            verify: Si es True, comprueba en paralelo que cada imagen se puede leer y es un JPEG
+            workers: Hilos de la verificación
+
+        Returns:
+            Resumen con imágenes asignadas, ojos sin imagen e imágenes no válidas
+
+        Raises:
+            NotADirectoryError: Si el directorio no existe
+        """
+        from core.image_loader import find_fundus_images
+
+        self.set_base_directory(directory)
+        eyes = [(self._ids[row], eye_type) for eye_type, prefix in EYE_PREFIXES.items()
+                for row in np.flatnonzero(self.column(f"{prefix}_present"))]
+        matches, report = find_fundus_images(eyes, directory, verify, workers)
+
+        for (patient_id, eye_type), image_path in matches.items():
+            self._columns[f"{EYE_PREFIXES[eye_type]}_fundus_image"][self._rows[patient_id]] = image_path
+        self._cache.clear()
+        return report
+
+    def defer_images(self, directory: str) -> None:
+        """
+        Busca las imágenes de fondo de ojo al materializar cada paciente en lugar de todas al cargar.
+
+        Los ojos sin imagen guardada toman la de find_fundus_image (las mismas
+        reglas que load_images), así que la carga no espera a emparejar todo el
+        directorio. Mientras el índice del directorio no está listo (su primera
+        lectura corre en segundo plano), los pacientes se crean sin imagen y no
+        se guardan en la caché, de modo que la imagen aparece la próxima vez
+        que se piden.
+
+        Args:
+            directory: Directorio de imágenes de fondo de ojo
+
+        Raises:
+            NotADirectoryError: Si el directorio no existe
+        """
+        self.set_base_directory(directory)
+        self._images_dir = directory
+        self._cache.clear()
+
+    def _grow(self) -> None:
+        """Duplica la capacidad de todos los arreglos."""
+        new_capacity = self._capacity * 2
+        for name, (dtype, empty) in COLUMN_SPECS.items():
+            column = np.full(new_capacity, empty, dtype=dtype)
+            column[:self._capacity] = self._columns[name]
+            self._columns[name] = column
+        self._capacity = new_capacity
+
+    def _clear_row(self, row: int) -> None:
+        for name, (_, empty) in COLUMN_SPECS.items():
+            self._columns[name][row] = empty
+
+    def _write_row(self, row: int, patient: Patient) -> None:
+        """Escribe los datos de un paciente en la posición indicada."""
+        columns = self._columns
+        self._clear_row(row)
+        columns["age"][row] = patient.age
+        columns["gender"][row] = patient.gender.value
+
+        for eye_type, prefix in EYE_PREFIXES.items():
+            eye_data = patient.right_eye if eye_type == Eye.RIGHT else patient.left_eye
+            if eye_data is None:
+                continue
+
+            columns[f"{prefix}_present"][row] = True
+            columns[f"{prefix}_diagnosis"][row] = eye_data.diagnosis.value
+            if eye_data.crystalline_status is not None:
+                columns[f"{prefix}_crystalline_status"][row] = eye_data.crystalline_status.value
+            if eye_data.refractive_error is not None:
+                columns[f"{prefix}_sphere"][row] = eye_data.refractive_error.sphere
+                if eye_data.refractive_error.cylinder is not None:
+                    columns[f"{prefix}_cylinder"][row] = eye_data.refractive_error.cylinder
+                if eye_data.refractive_error.axis is not None:
+                    columns[f"{prefix}_axis"][row] = eye_data.refractive_error.axis
+            for field in MEASUREMENT_FIELDS:
+                value = getattr(eye_data, field)
+                if value is not None:
+                    columns[f"{prefix}_{field}"][row] = value
+            columns[f"{prefix}_fundus_image"][row] = eye_data.fundus_image
+
+    def _images_ready(self) -> bool:
+        """Indica si las imágenes diferidas se pueden buscar sin esperar a la lectura del directorio."""
+        if self._images_dir is None:
+            return True
+        from utils.image_index import get_image_index
+
+        return get_image_index(self._images_dir).ready
+
+    def _build_eye(self, row: int, eye_type: Eye, find_images: bool) -> Optional[EyeData]:
+        """Crea un objeto EyeData con los datos de un ojo de la posición indicada."""
+        prefix = EYE_PREFIXES[eye_type]
+        columns = self._columns
+        if not columns[f"{prefix}_present"][row]:
+            return None
+
+        sphere, cylinder, axis, pneumatic_iop, perkins_iop, pachymetry, axial_length, mean_defect = (
+            _optional_float(columns[f"{prefix}_{field}"][row]) for field in EYE_FLOAT_FIELDS
+        )
+
+        refractive_error = None
+        if sphere is not None:
+            refractive_error = RefractiveError(sphere=sphere, cylinder=cylinder, axis=axis)
+
+        crystalline_status = int(columns[f"{prefix}_crystalline_status"][row])
+        eye_data = EyeData(
+            eye_type=eye_type,
+            diagnosis=DiagnosisStatus(int(columns[f"{prefix}_diagnosis"][row])),
+            refractive_error=refractive_error,
+            crystalline_status=CrystallineStatus(crystalline_status) if crystalline_status != MISSING_CODE else None,
+            pneumatic_iop=pneumatic_iop,
+            perkins_iop=perkins_iop,
+            pachymetry=pachymetry,
+            axial_length=axial_length,
+            mean_defect=mean_defect
+        )
+        eye_data.fundus_image = columns[f"{prefix}_fundus_image"][row]
+        if eye_data.fundus_image is None and self._images_dir is not None and find_images:
+            from core.image_loader import find_fundus_image
+
+            # Sin releer el directorio: de eso se encargan el hilo de carga y el visor
+            eye_data.fundus_image = find_fundus_image(self._ids[row], eye_type, self._images_dir, refresh=False)
+        return eye_data
+
+    def _patient_at(self, row: int) -> Patient:
+        """Devuelve el paciente de la posición indicada, desde la caché si está."""
+        patient_id = self._ids[row]
+        patient = self._cache.get(patient_id)
+        if patient is not None:
+            self._cache.move_to_end(patient_id)
+            return patient
+
+        find_images = self._images_ready()
+        patient = self._build_patient(row, find_images)
+        if self._cache_size and find_images:
+            self._cache[patient_id] = patient
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return patient
+
+    def _build_patient(self, row: int, find_images: Optional[bool] = None) -> Patient:
+        """
+        Crea la vista Patient de la posición indicada.
+
+        Args:
+            row: Posición del paciente
+            find_images: Si se buscan las imágenes diferidas (por defecto, si el índice está listo)
+
+        Returns:
+            Paciente creado a partir de las columnas
+        """
+        if find_images is None:
+            find_images = self._images_ready()
+        return Patient(
+            patient_id=self._ids[row],
+            age=int(self._columns["age"][row]),
+            gender=Gender(int(self._columns["gender"][row])),
+            right_eye=self._build_eye(row, Eye.RIGHT, find_images),
+            left_eye=self._build_eye(row, Eye.LEFT, find_images)
+        )
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Devuelve los valores de una columna para los pacientes actuales.
+
+        Args:
+            name: Nombre de la columna (por ejemplo "age" u "od_mean_defect")
+
+        Returns:
+            Vista del arreglo limitada al número de pacientes
+        """
+        return self._columns[name][:len(self._ids)]
+
+    def add_patient(self, patient: Patient) -> None:
+        row = self._rows.get(patient.patient_id)
+        if row is None:
+            if len(self._ids) == self._capacity:
+                self._grow()
+            row = len(self._ids)
+            self._ids.append(patient.patient_id)
+            self._rows[patient.patient_id] = row
+        self._write_row(row, patient)
+        self._cache.pop(patient.patient_id, None)
+
+    def get_patient(self, patient_id: str) -> Optional[Patient]:
+        row = self._rows.get(patient_id)
+        if row is None:
+            return None
+        return self._patient_at(row)
+
+    def update_patient(self, patient: Patient) -> None:
+        """Actualiza un paciente existente en el dataset."""
+        if patient.patient_id not in self._rows:
+            raise ValueError(f"El paciente con ID {patient.patient_id} no existe en el dataset")
+        self._write_row(self._rows[patient.patient_id], patient)
+        self._cache.pop(patient.patient_id, None)
+
+    def remove_patient(self, patient_id: str) -> bool:
+        row = self._rows.pop(patient_id, None)
+        if row is None:
+            return False
+        self._cache.pop(patient_id, None)
+
+        # Mover el último paciente al hueco para mantener los arreglos compactos
+        last = len(self._ids) - 1
+        if row != last:
+            for column in self._columns.values():
+                column[row] = column[last]
+            moved_id = self._ids[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._ids.pop()
+        self._clear_row(last)
+        return True
+
+    def filter_patients(self, **kwargs) -> List[Patient]:
+        mask = np.ones(len(self._ids), dtype=bool)
+
+        for key, value in kwargs.items():
+            if key == 'age_min':
+                mask &= self.column("age") >= value
+            elif key == 'age_max':
+                mask &= self.column("age") <= value
+            elif key == 'gender':
+                mask &= self.column("gender") == value.value
+            elif key == 'diagnosis':
+                mask &= (self.column("od_diagnosis") == value.value) | (self.column("os_diagnosis") == value.value)
+            elif key == 'od_diagnosis':
+                mask &= self.column("od_diagnosis") == value.value
+            elif key == 'os_diagnosis':
+                mask &= self.column("os_diagnosis") == value.value
+
+        return [self._patient_at(int(row)) for row in np.flatnonzero(mask)]
+
+    def query_columns(self) -> tuple:
+        """Devuelve los IDs y las columnas de los pacientes para evaluar consultas."""
+        return self._ids, {name: self.column(name) for name in COLUMN_SPECS}
+
+    def query(self, query: Any) -> Any:
+        """Busca pacientes con una consulta (ver core.query.parse_query)."""
+        from core.query import run_query
+
+        return run_query(self, query)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        from core.statistics import compute_statistics
+
+        return compute_statistics({name: self.column(name) for name in COLUMN_SPECS})
@@ -0,0 +1,172 @@
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+from core.models import EyeData, RefractiveError, Eye, Gender, DiagnosisStatus, CrystallineStatus
+
+# Filas que se leen y procesan de cada vez
+CSV_CHUNK_SIZE = 50_000
+
+# Columnas de una fila, en el orden de las tuplas que produce iter_csv_rows
+CSV_COLUMNS = (
+    'patient_id', 'age', 'gender', 'diagnosis', 'sphere', 'cylinder', 'axis', 'crystalline_status',
+    'pneumatic_iop', 'perkins_iop', 'pachymetry', 'axial_length', 'mean_defect'
+)
+REQUIRED_COLUMNS = ('patient_id', 'age', 'gender', 'diagnosis')
+INTEGER_COLUMNS = ('age', 'gender', 'diagnosis')
+OPTIONAL_COLUMNS = CSV_COLUMNS[4:]
+
+VALID_CODES = {
+    'gender': [gender.value for gender in Gender],
+    'diagnosis': [status.value for status in DiagnosisStatus],
+    'crystalline_status': [status.value for status in CrystallineStatus],
+}
+
+
+def _clean_column_names(csv_file: str) -> Dict[str, str]:
+    """
+    Lee solo la cabecera de un CSV y la limpia como los encabezados de los Excel (rename_columns).
+
+    Args:
+        csv_file: Ruta del archivo CSV
+
+    Returns:
+        Diccionario nombre original -> nombre limpio de las columnas de CSV_COLUMNS presentes
+
+    Raises:
+        ValueError: Si falta alguna de las columnas obligatorias
+    """
+    from features.data_loading import rename_columns
+
+    original = pd.read_csv(csv_file, nrows=0).columns
+    cleaned = rename_columns(pd.DataFrame(columns=original.astype(str).str.lower().str.strip())).columns
+    names = {orig: clean for orig, clean in zip(original, cleaned) if clean in CSV_COLUMNS}
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in names.values()]
+    if missing:
+        raise ValueError(f"Faltan columnas en {csv_file}: {', '.join(missing)}")
+    return names
+
+
+def iter_csv_rows(csv_file: str, report: Dict[str, Any], chunksize: int = CSV_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Lee un CSV de pacientes por bloques, sin cargarlo completo en memoria.
+
+    Cada bloque se limpia de forma vectorizada: se descartan las filas sin ID,
+    con edad, género o diagnóstico no numéricos o fuera de rango (por ejemplo,
+    una cabecera repetida) y los valores faltantes se convierten en None.
+
+    Args:
+        csv_file: Ruta del archivo CSV
+        report: Diccionario donde se suman las filas leídas ("rows") y descartadas ("skipped")
+        chunksize: Filas por bloque
+
+    Returns:
+        Iterador de listas de tuplas con los valores de CSV_COLUMNS (enteros en
+        los códigos, float o None en las mediciones)
+    """
+    names = _clean_column_names(csv_file)
+    patient_id_column = next(orig for orig, clean in names.items() if clean == 'patient_id')
+
+    reader = pd.read_csv(csv_file, usecols=list(names), dtype={patient_id_column: str}, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.rename(columns=names)
+        report["rows"] += len(chunk)
+
+        valid = chunk['patient_id'].notna()
+        for column in CSV_COLUMNS[1:]:
+            if column in chunk.columns:
+                chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+        for column in INTEGER_COLUMNS:
+            valid &= chunk[column].notna()
+            if column in VALID_CODES:
+                valid &= chunk[column].isin(VALID_CODES[column])
+        chunk = chunk[valid]
+        report["skipped"] += int((~valid).sum())
+        if chunk.empty:
+            continue
+
+        columns = [chunk['patient_id'].str.strip().tolist()]
+        columns.extend(chunk[column].astype(int).tolist() for column in INTEGER_COLUMNS)
+        for column in OPTIONAL_COLUMNS:
+            if column not in chunk.columns:
+                columns.append([None] * len(chunk))
+                continue
+            values = chunk[column]
+            if column in VALID_CODES:
+                values = values.where(values.isin(VALID_CODES[column]))
+            values = values.astype(object).where(values.notna(), None).tolist()
+            if column in VALID_CODES:
+                values = [None if value is None else int(value) for value in values]
+            columns.append(values)
+
+        yield list(zip(*columns))
+
+
+def eye_data_from_row(eye_type: Eye, row: Sequence) -> EyeData:
+    """
+    Crea un EyeData a partir de una tupla de iter_csv_rows.
+
+    Args:
+        eye_type: Ojo de la fila
+        row: Valores en el orden de CSV_COLUMNS
+
+    Returns:
+        Datos del ojo (sin imagen de fondo de ojo)
+    """
+    (_, _, _, diagnosis, sphere, cylinder, axis, crystalline_status,
+     pneumatic_iop, perkins_iop, pachymetry, axial_length, mean_defect) = row
+    return EyeData(
+        eye_type=eye_type,
+        diagnosis=DiagnosisStatus(diagnosis),
+        refractive_error=RefractiveError(sphere=sphere, cylinder=cylinder, axis=axis) if sphere is not None else None,
+        crystalline_status=CrystallineStatus(crystalline_status) if crystalline_status is not None else None,
+        pneumatic_iop=pneumatic_iop,
+        perkins_iop=perkins_iop,
+        pachymetry=pachymetry,
+        axial_length=axial_length,
+        mean_defect=mean_defect
+    )
+
+
+def peak_memory_bytes() -> Optional[int]:
+    """
+    Devuelve el pico de memoria residente del proceso.
+
+    Returns:
+        Bytes, o None si el sistema no lo informa (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo informa en KiB y macOS en bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def new_load_report() -> Dict[str, Any]:
+    """Crea el informe de una carga de CSV, con el instante de inicio."""
+    return {"rows": 0, "skipped": 0, "patients": 0, "started": time.perf_counter()}
+
+
+def finish_load_report(report: Dict[str, Any], patients: int) -> Dict[str, Any]:
+    """
+    Completa el informe de una carga de CSV.
+
+    Args:
+        report: Informe creado con new_load_report
+        patients: Pacientes añadidos o completados
+
+    Returns:
+        Informe con filas, filas descartadas, pacientes, segundos, filas por
+        segundo y pico de memoria del proceso (bytes)
+    """
+    seconds = time.perf_counter() - report.pop("started")
+    report["patients"] = patients
+    report["seconds"] = seconds
+    report["rows_per_second"] = report["rows"] / seconds if seconds else 0.0
+    report["peak_memory_bytes"] = peak_memory_bytes()
+    return report
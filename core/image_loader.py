@@ -0,0 +1,131 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from core.models import Patient, Eye
+
+# Hilos que comprueban las imágenes (la lectura de cabeceras está limitada por E/S)
+VERIFY_WORKERS = 8
+
+# Primeros bytes de todo archivo JPEG: marcador SOI seguido del primer marcador
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+
+def find_fundus_image(patient_id: str, eye_type: Eye, directory: str, refresh: bool = True) -> Optional[str]:
+    """
+    Busca en el índice del directorio la imagen de un paciente y ojo.
+
+    Es la única búsqueda de imágenes: la usan la carga de los pacientes y el
+    visor (find_image_for_patient). Se prueban los nombres de
+    fundus_image_filenames, primero tal cual y luego sin distinguir mayúsculas
+    (RET001od.JPG), y por último cualquier RET{id}...{OD|OS}.jpg (ver
+    ImageIndex.find).
+
+    Args:
+        patient_id: ID del paciente
+        eye_type: Ojo de la imagen
+        directory: Directorio de imágenes de fondo de ojo
+        refresh: Si es False, no vuelve a leer el directorio aunque haya cambiado
+
+    Returns:
+        Ruta de la imagen o None si no existe
+    """
+    from utils.image_index import get_image_index
+
+    return _lookup_image(get_image_index(directory), patient_id, eye_type, directory, refresh)
+
+
+def _lookup_image(index, patient_id: str, eye_type: Eye, directory: str, refresh: bool = True) -> Optional[str]:
+    """Busca la imagen de un paciente y ojo en un ImageIndex ya obtenido."""
+    filename = index.find(str(patient_id).replace('#', '').strip(), eye_type.value, refresh)
+    return os.path.join(directory, filename) if filename is not None else None
+
+
+def verify_fundus_image(image_path: str) -> bool:
+    """
+    Comprueba que una imagen existe, se puede leer y tiene cabecera JPEG.
+
+    Args:
+        image_path: Ruta de la imagen
+
+    Returns:
+        True si el archivo se abrió y empieza por JPEG_SIGNATURE
+    """
+    try:
+        with open(image_path, 'rb') as image_file:
+            return image_file.read(len(JPEG_SIGNATURE)) == JPEG_SIGNATURE
+    except OSError:
+        return False
+
+
+def find_fundus_images(eyes: Iterable[Tuple[str, Eye]], directory: str, verify: bool = False,
+                       workers: Optional[int] = None) -> Tuple[Dict[Tuple[str, Eye], str], Dict[str, int]]:
+    """
+    Busca las imágenes de fondo de ojo de muchos ojos con una sola lectura del directorio.
+
+    El directorio se lee una vez con el índice compartido de imágenes y el
+    emparejamiento se hace en memoria, con las reglas de find_fundus_image. Si
+    se pide verificación, las imágenes se comprueban en paralelo en un pool de
+    hilos y las que fallan se descartan.
+
+    Args:
+        eyes: Pares (ID del paciente, ojo) a buscar
+        directory: Directorio de imágenes de fondo de ojo
+        verify: Si es True, comprueba que cada imagen se puede leer y es un JPEG
+        workers: Hilos de la verificación (por defecto, VERIFY_WORKERS)
+
+    Returns:
+        Tupla (diccionario (ID, ojo) -> ruta de la imagen, resumen con imágenes
+        encontradas ("attached"), ojos sin imagen ("missing") e imágenes
+        descartadas por la verificación ("invalid"))
+    """
+    from utils.image_index import get_image_index
+
+    # La primera búsqueda lee el directorio; las demás se resuelven en el índice en memoria
+    index = get_image_index(directory)
+    matches: Dict[Tuple[str, Eye], str] = {}
+    missing = 0
+    for patient_id, eye_type in eyes:
+        image_path = _lookup_image(index, patient_id, eye_type, directory)
+        if image_path is None:
+            missing += 1
+        else:
+            matches[(patient_id, eye_type)] = image_path
+
+    invalid = 0
+    if verify and matches:
+        keys = list(matches)
+        with ThreadPoolExecutor(max_workers=workers or VERIFY_WORKERS, thread_name_prefix="image-verify") as executor:
+            valid = list(executor.map(verify_fundus_image, [matches[key] for key in keys]))
+        for key, ok in zip(keys, valid):
+            if not ok:
+                del matches[key]
+                invalid += 1
+
+    return matches, {"attached": len(matches), "missing": missing, "invalid": invalid}
+
+
+def attach_fundus_images(patients: Iterable[Patient], directory: str, verify: bool = False,
+                         workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Asigna a los ojos de los pacientes sus imágenes de fondo de ojo en una sola pasada.
+
+    Los ojos sin imagen en el directorio conservan la que tuvieran.
+
+    Args:
+        patients: Pacientes a los que asignar las imágenes
+        directory: Directorio de imágenes de fondo de ojo
+        verify: Si es True, comprueba en paralelo que cada imagen se puede leer y es un JPEG
+        workers: Hilos de la verificación (por defecto, VERIFY_WORKERS)
+
+    Returns:
+        Resumen de find_fundus_images
+    """
+    eyes = {(patient.patient_id, eye_data.eye_type): eye_data
+            for patient in patients for eye_data in (patient.right_eye, patient.left_eye) if eye_data is not None}
+    matches, report = find_fundus_images(eyes, directory, verify, workers)
+
+    # Las rutas salen del listado del directorio: no hace falta el os.path.exists de add_fundus_image
+    for key, image_path in matches.items():
+        eyes[key].fundus_image = image_path
+    return report
@@ -0,0 +1,174 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import count
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.models import Patient, Gender, DiagnosisStatus
+
+# Se usan los índices solo si el predicado más selectivo deja menos de 1/32 del dataset
+SELECTIVE_FRACTION = 32
+
+
+class PatientIndex:
+    """
+    Índices secundarios de un PapilaDataset para filter_patients.
+
+    - Edad: un conjunto de IDs por edad y la lista ordenada de edades distintas,
+      de modo que un rango se resuelve con bisect sobre pocas edades.
+    - Género y diagnóstico de cada ojo: un conjunto de IDs por valor.
+
+    Se guardan los valores indexados de cada paciente para poder sacarlo de los
+    índices aunque el objeto Patient se haya modificado en el lugar. Las claves
+    son las del momento de add: si se cambia la edad, el género o un
+    diagnóstico de un paciente ya indexado, hay que llamar a
+    PapilaDataset.update_patient (que vuelve a llamar a add); si no, las
+    consultas indexadas de filter_patients devuelven los valores anteriores y
+    no coinciden con las que recorren el dataset.
+    """
+
+    def __init__(self):
+        self._ages: List[int] = []
+        self._by_age: Dict[int, Set[str]] = {}
+        self._by_gender: Dict[Gender, Set[str]] = {gender: set() for gender in Gender}
+        self._by_right_diagnosis: Dict[DiagnosisStatus, Set[str]] = {status: set() for status in DiagnosisStatus}
+        self._by_left_diagnosis: Dict[DiagnosisStatus, Set[str]] = {status: set() for status in DiagnosisStatus}
+        self._keys: Dict[str, Tuple] = {}
+        self._sequence = count()
+
+    def add(self, patient: Patient) -> None:
+        """
+        Indexa un paciente (o lo reindexa si ya estaba).
+
+        Args:
+            patient: Paciente a indexar
+        """
+        previous = self._keys.get(patient.patient_id)
+        if previous is not None:
+            self._discard(patient.patient_id, previous)
+            sequence = previous[0]
+        else:
+            sequence = next(self._sequence)
+
+        right_diagnosis = patient.right_eye.diagnosis if patient.right_eye else None
+        left_diagnosis = patient.left_eye.diagnosis if patient.left_eye else None
+        key = (sequence, patient.age, patient.gender, right_diagnosis, left_diagnosis)
+        self._keys[patient.patient_id] = key
+
+        if patient.age not in self._by_age:
+            self._by_age[patient.age] = set()
+            insort(self._ages, patient.age)
+        self._by_age[patient.age].add(patient.patient_id)
+        self._by_gender[patient.gender].add(patient.patient_id)
+        if right_diagnosis is not None:
+            self._by_right_diagnosis[right_diagnosis].add(patient.patient_id)
+        if left_diagnosis is not None:
+            self._by_left_diagnosis[left_diagnosis].add(patient.patient_id)
+
+    def remove(self, patient_id: str) -> None:
+        """
+        Saca un paciente de los índices.
+
+        Args:
+            patient_id: ID del paciente
+        """
+        key = self._keys.pop(patient_id, None)
+        if key is not None:
+            self._discard(patient_id, key)
+
+    def _discard(self, patient_id: str, key: Tuple) -> None:
+        _, age, gender, right_diagnosis, left_diagnosis = key
+
+        age_ids = self._by_age[age]
+        age_ids.discard(patient_id)
+        if not age_ids:
+            del self._by_age[age]
+            del self._ages[bisect_left(self._ages, age)]
+        self._by_gender[gender].discard(patient_id)
+        if right_diagnosis is not None:
+            self._by_right_diagnosis[right_diagnosis].discard(patient_id)
+        if left_diagnosis is not None:
+            self._by_left_diagnosis[left_diagnosis].discard(patient_id)
+
+    def _age_range(self, age_min: Any, age_max: Any) -> Tuple[int, Callable[[], Iterable[str]], Callable]:
+        """Predicado de rango de edad: tamaño, candidatos y prueba sobre la clave indexada."""
+        start = bisect_left(self._ages, age_min) if age_min is not None else 0
+        end = bisect_right(self._ages, age_max) if age_max is not None else len(self._ages)
+        ages = self._ages[start:end]
+        low = ages[0] if ages else 0
+        high = ages[-1] if ages else -1
+
+        def candidates() -> Iterable[str]:
+            for age in ages:
+                yield from self._by_age[age]
+
+        def matches(key: Tuple) -> bool:
+            return low <= key[1] <= high
+
+        return sum(len(self._by_age[age]) for age in ages), candidates, matches
+
+    def _gender(self, value: Any) -> Tuple[int, Callable[[], Iterable[str]], Callable]:
+        """Predicado de género."""
+        gender_ids = self._by_gender.get(value, set())
+
+        def matches(key: Tuple) -> bool:
+            return key[2] == value
+
+        return len(gender_ids), lambda: gender_ids, matches
+
+    def _diagnosis(self, value: Any, right: bool, left: bool) -> Tuple[int, Callable[[], Iterable[str]], Callable]:
+        """Predicado de diagnóstico en el ojo derecho, en el izquierdo o en cualquiera."""
+        right_ids = self._by_right_diagnosis.get(value, set()) if right else set()
+        left_ids = self._by_left_diagnosis.get(value, set()) if left else set()
+
+        def candidates() -> Iterable[str]:
+            return right_ids | left_ids
+
+        def matches(key: Tuple) -> bool:
+            return (right and key[3] == value) or (left and key[4] == value)
+
+        return len(right_ids) + len(left_ids), candidates, matches
+
+    def query(self, **kwargs) -> Optional[List[str]]:
+        """
+        Obtiene los IDs de los pacientes que cumplen los filtros.
+
+        Los predicados se ordenan por número estimado de candidatos: se recorre
+        solo el conjunto más pequeño y los demás predicados se comprueban sobre
+        la clave indexada de cada candidato. Si ni siquiera el más selectivo deja
+        pocos candidatos, un recorrido secuencial del dataset es más barato.
+
+        Args:
+            **kwargs: Filtros de filter_patients (age_min, age_max, gender, diagnosis,
+                od_diagnosis, os_diagnosis)
+
+        Returns:
+            IDs en orden de inserción, o None si no hay filtros indexados o si
+            conviene recorrer el dataset completo
+        """
+        predicates = []
+        if 'age_min' in kwargs or 'age_max' in kwargs:
+            predicates.append(self._age_range(kwargs.get('age_min'), kwargs.get('age_max')))
+        if 'gender' in kwargs:
+            predicates.append(self._gender(kwargs['gender']))
+        if 'diagnosis' in kwargs:
+            predicates.append(self._diagnosis(kwargs['diagnosis'], right=True, left=True))
+        if 'od_diagnosis' in kwargs:
+            predicates.append(self._diagnosis(kwargs['od_diagnosis'], right=True, left=False))
+        if 'os_diagnosis' in kwargs:
+            predicates.append(self._diagnosis(kwargs['os_diagnosis'], right=False, left=True))
+
+        if not predicates:
+            return None
+
+        predicates.sort(key=lambda predicate: predicate[0])
+        size, candidates, _ = predicates[0]
+
+        if size * SELECTIVE_FRACTION > len(self._keys):
+            return None
+
+        keys = self._keys
+        checks = [matches for _, _, matches in predicates[1:]]
+        result = [patient_id for patient_id in candidates() if all(check(keys[patient_id]) for check in checks)]
+
+        # Mantener el orden de inserción del dataset (la clave empieza por la secuencia)
+        result.sort(key=keys.__getitem__)
+        return result
@@ -25,6 +25,8 @@ class CrystallineStatus(Enum):
 
 
 class RefractiveError:
+    __slots__ = ("sphere", "cylinder", "axis")
+
     def __init__(self, sphere: float, cylinder: Optional[float] = None, axis: Optional[float] = None):
         self.sphere = sphere
         self.cylinder = cylinder
@@ -37,6 +39,9 @@ class RefractiveError:
 
 
 class EyeData:
+    __slots__ = ("eye_type", "diagnosis", "refractive_error", "crystalline_status", "pneumatic_iop",
+                 "perkins_iop", "pachymetry", "axial_length", "mean_defect", "fundus_image")
+
     def __init__(
             self,
             eye_type: Eye,
@@ -82,6 +87,8 @@ class EyeData:
 
 
 class Patient:
+    __slots__ = ("patient_id", "age", "gender", "right_eye", "left_eye")
+
     def __init__(
             self,
             patient_id: str,
@@ -120,9 +127,28 @@ class Patient:
 
 
 class PapilaDataset:
-    def __init__(self):
+    def __init__(self, check_statistics: bool = False):
+        """
+        Args:
+            check_statistics: Si es True, get_statistics compara las estadísticas
+                incrementales con un recálculo completo y falla si no coinciden
+        """
+        from core.indexes import PatientIndex
+        from core.statistics import RunningStatistics
+
         self.patients: Dict[str, Patient] = {}
         self.base_dir: Optional[str] = None
+        self.check_statistics = check_statistics
+
+        # Estadísticas mantenidas en add/update/remove y la contribución de cada paciente
+        self._statistics = RunningStatistics()
+        self._statistics_snapshots: Dict[str, tuple] = {}
+
+        # Índices secundarios para filter_patients
+        self._index = PatientIndex()
+
+        # Columnas para query, se reconstruyen tras cualquier cambio
+        self._query_columns: Optional[tuple] = None
 
     def set_base_directory(self, directory: str) -> None:
         if os.path.isdir(directory):
@@ -130,31 +156,130 @@ class PapilaDataset:
         else:
             raise NotADirectoryError(f"El directorio {directory} no existe")
 
+    def _track_statistics(self, patient: Patient) -> None:
+        """Reemplaza la contribución del paciente en las estadísticas incrementales."""
+        from core.statistics import statistics_snapshot
+
+        self._untrack_statistics(patient.patient_id)
+        snapshot = statistics_snapshot(patient)
+        self._statistics.add(snapshot)
+        self._statistics_snapshots[patient.patient_id] = snapshot
+
+    def _untrack_statistics(self, patient_id: str) -> None:
+        """Resta la contribución registrada de un paciente, si existe."""
+        snapshot = self._statistics_snapshots.pop(patient_id, None)
+        if snapshot is not None:
+            self._statistics.remove(snapshot)
+
     def add_patient(self, patient: Patient) -> None:
         self.patients[patient.patient_id] = patient
+        self._track_statistics(patient)
+        self._index.add(patient)
+        self._query_columns = None
 
     def get_patient(self, patient_id: str) -> Optional[Patient]:
         return self.patients.get(patient_id)
 
     def update_patient(self, patient: Patient) -> None:
-        """Actualiza un paciente existente en el dataset."""
+        """
+        Actualiza un paciente existente en el dataset.
+
+        Es obligatorio llamarlo después de cualquier cambio de un paciente del
+        dataset, también si se modificó el mismo objeto en el lugar: los índices
+        secundarios (PatientIndex) y las estadísticas acumuladas guardan los
+        valores del último add o update_patient.
+        """
         if patient.patient_id not in self.patients:
             raise ValueError(f"El paciente con ID {patient.patient_id} no existe en el dataset")
         self.patients[patient.patient_id] = patient
+        self._track_statistics(patient)
+        self._index.add(patient)
+        self._query_columns = None
 
     def remove_patient(self, patient_id: str) -> bool:
         if patient_id in self.patients:
             del self.patients[patient_id]
+            self._untrack_statistics(patient_id)
+            self._index.remove(patient_id)
+            self._query_columns = None
             return True
         return False
 
-    def load_from_csv(self, od_file: str, os_file: str) -> None:
-        pass
-
-    def load_images(self, directory: str) -> None:
-        pass
+    def load_from_csv(self, od_file: str, os_file: str, chunksize: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Carga pacientes de los CSV de OD y OS leyéndolos por bloques.
+
+        Las filas se unen por patient_id sin cargar los archivos completos: la
+        memoria usada, además de la de los pacientes, es la de un bloque. Como
+        en la carga de Excel, manda la primera fila de cada paciente y ojo; los
+        pacientes y ojos que ya estaban en el dataset se conservan.
+
+        Args:
+            od_file: Ruta del CSV de ojos derechos
+            os_file: Ruta del CSV de ojos izquierdos
+            chunksize: Filas por bloque (por defecto, CSV_CHUNK_SIZE)
+
+        Returns:
+            Informe con filas, filas descartadas, pacientes, segundos, filas por
+            segundo y pico de memoria del proceso
+        """
+        from core.csv_loader import CSV_CHUNK_SIZE, eye_data_from_row, finish_load_report, iter_csv_rows, \
+            new_load_report
+
+        report = new_load_report()
+        loaded: Dict[str, Patient] = {}
+        for eye_type, csv_file in ((Eye.RIGHT, od_file), (Eye.LEFT, os_file)):
+            eye_attribute = 'right_eye' if eye_type == Eye.RIGHT else 'left_eye'
+            for rows in iter_csv_rows(csv_file, report, chunksize or CSV_CHUNK_SIZE):
+                for row in rows:
+                    patient = loaded.get(row[0]) or self.patients.get(row[0])
+                    if patient is None:
+                        patient = Patient(patient_id=row[0], age=row[1], gender=Gender(row[2]))
+                    elif getattr(patient, eye_attribute) is not None:
+                        continue
+                    patient.set_eye_data(eye_data_from_row(eye_type, row))
+                    loaded[row[0]] = patient
+
+        for patient in loaded.values():
+            self.add_patient(patient)
+        return finish_load_report(report, len(loaded))
+
+    def load_images(self, directory: str, verify: bool = False, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Asigna a los ojos de todos los pacientes sus imágenes de fondo de ojo.
+
+        El directorio se lee una sola vez y los archivos se emparejan en
+        memoria con cada paciente y ojo (ver attach_fundus_images).
+
+        Args:
+            directory: Directorio de imágenes de fondo de ojo
+            verify: Si es True, comprueba en paralelo que cada imagen se puede leer y es un JPEG
+            workers: Hilos de la verificación
+
+        Returns:
+            Resumen con imágenes asignadas, ojos sin imagen e imágenes no válidas
+
+        Raises:
+            NotADirectoryError: Si el directorio no existe
+        """
+        from core.image_loader import attach_fundus_images
+
+        self.set_base_directory(directory)
+        return attach_fundus_images(self.patients.values(), directory, verify, workers)
 
     def filter_patients(self, **kwargs) -> List[Patient]:
+        """
+        Filtra los pacientes por age_min, age_max, gender, diagnosis (en cualquier
+        ojo), od_diagnosis y os_diagnosis. Los filtros desconocidos se ignoran.
+
+        Las consultas selectivas se resuelven con los índices secundarios; las
+        demás recorren el dataset. Los dos caminos solo coinciden si cada
+        cambio de un paciente se notificó con update_patient.
+        """
+        patient_ids = self._index.query(**kwargs)
+        if patient_ids is not None:
+            return [self.patients[patient_id] for patient_id in patient_ids]
+
         filtered_patients = list(self.patients.values())
 
         for key, value in kwargs.items():
@@ -168,53 +293,75 @@ class PapilaDataset:
                 filtered_patients = [p for p in filtered_patients
                                      if (p.right_eye and p.right_eye.diagnosis == value) or
                                      (p.left_eye and p.left_eye.diagnosis == value)]
+            elif key == 'od_diagnosis':
+                filtered_patients = [p for p in filtered_patients if p.right_eye and p.right_eye.diagnosis == value]
+            elif key == 'os_diagnosis':
+                filtered_patients = [p for p in filtered_patients if p.left_eye and p.left_eye.diagnosis == value]
 
         return filtered_patients
 
+    def query_columns(self) -> tuple:
+        """
+        Devuelve los IDs y las columnas de los pacientes para evaluar consultas.
+
+        Returns:
+            Tupla (lista de IDs, diccionario de columnas con los nombres de ColumnarPapilaDataset)
+        """
+        from core.statistics import collect_statistics_columns
+
+        if self._query_columns is None:
+            self._query_columns = (list(self.patients), collect_statistics_columns(self.patients.values()))
+        return self._query_columns
+
+    def query(self, query: Any) -> Any:
+        """
+        Busca pacientes con una consulta sobre edad, género, diagnóstico,
+        severidad y mediciones de cada ojo (ver core.query.parse_query).
+
+        Args:
+            query: Expresión de texto (por ejemplo "od.pneumatic_iop > 21 and age >= 60") o Condition
+
+        Returns:
+            QueryResult con los IDs; los pacientes se obtienen al recorrerlo
+        """
+        from core.query import run_query
+
+        return run_query(self, query)
+
     def get_statistics(self) -> Dict[str, Any]:
-        stats = {
-            "total_patients": len(self.patients),
-            "gender_distribution": {
-                "male": sum(1 for p in self.patients.values() if p.gender == Gender.MALE),
-                "female": sum(1 for p in self.patients.values() if p.gender == Gender.FEMALE)
-            },
-            "diagnosis_distribution": {
-                "healthy": 0,
-                "glaucoma": 0,
-                "suspect": 0,
-                "mixed": 0
-            },
-            "age_stats": {
-                "min": float('inf') if self.patients else 0,
-                "max": float('-inf') if self.patients else 0,
-                "avg": 0
-            }
-        }
-
-        # Manejar caso cuando no hay pacientes
-        if not self.patients:
-            return stats
-
-        total_age = 0
-        for patient in self.patients.values():
-            total_age += patient.age
-            stats["age_stats"]["min"] = min(stats["age_stats"]["min"], patient.age)
-            stats["age_stats"]["max"] = max(stats["age_stats"]["max"], patient.age)
-
-            right_diagnosis = patient.right_eye.diagnosis if patient.right_eye else None
-            left_diagnosis = patient.left_eye.diagnosis if patient.left_eye else None
-
-            if right_diagnosis == left_diagnosis:
-                if right_diagnosis == DiagnosisStatus.HEALTHY:
-                    stats["diagnosis_distribution"]["healthy"] += 1
-                elif right_diagnosis == DiagnosisStatus.GLAUCOMA:
-                    stats["diagnosis_distribution"]["glaucoma"] += 1
-                elif right_diagnosis == DiagnosisStatus.SUSPECT:
-                    stats["diagnosis_distribution"]["suspect"] += 1
-            else:
-                stats["diagnosis_distribution"]["mixed"] += 1
-
-        if self.patients:
-            stats["age_stats"]["avg"] = total_age / len(self.patients)
-
-        return stats
\ No newline at end of file
+        """
+        Devuelve las estadísticas del dataset.
+
+        Se construyen a partir de los agregados que mantienen add_patient,
+        update_patient y remove_patient, sin recorrer los pacientes. Con
+        check_statistics activo se verifican contra un recálculo completo.
+        """
+        stats = self._statistics.result()
+        if self.check_statistics:
+            mismatches = self.verify_statistics(stats)
+            if mismatches:
+                raise RuntimeError("Las estadísticas incrementales no coinciden con el recálculo: "
+                                   + "; ".join(mismatches))
+        return stats
+
+    def recompute_statistics(self) -> Dict[str, Any]:
+        """Calcula las estadísticas recorriendo todos los pacientes del dataset."""
+        from core.statistics import collect_statistics_columns, compute_statistics
+
+        return compute_statistics(collect_statistics_columns(self.patients.values()))
+
+    def verify_statistics(self, stats: Optional[Dict[str, Any]] = None) -> List[str]:
+        """
+        Compara las estadísticas incrementales con un recálculo completo.
+
+        Args:
+            stats: Estadísticas a verificar (por defecto, las incrementales actuales)
+
+        Returns:
+            Lista de diferencias encontradas (vacía si coinciden)
+        """
+        from core.statistics import statistics_mismatches
+
+        if stats is None:
+            stats = self._statistics.result()
+        return statistics_mismatches(self.recompute_statistics(), stats)
@@ -0,0 +1,407 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.columnar_dataset import EYE_PREFIXES, MEASUREMENT_FIELDS, MISSING_CODE
+from core.models import Patient, Gender, DiagnosisStatus
+
+# Operadores de comparación admitidos ("=" es un alias de "==")
+OPERATORS: Dict[str, Callable[[np.ndarray, Any], np.ndarray]] = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+# Selectores de ojo: "any" (o sin prefijo) significa cualquiera de los dos ojos
+EYE_SELECTORS = {"od": ("od",), "os": ("os",), "any": tuple(EYE_PREFIXES.values())}
+
+# Campos de paciente y campos de cada ojo que se pueden consultar
+PATIENT_FIELDS = ("age", "gender")
+EYE_FIELDS = ("diagnosis", "severity") + MEASUREMENT_FIELDS
+
+# Niveles de severidad del glaucoma (mismos nombres que en las estadísticas)
+SEVERITY_LEVELS = ("mild", "moderate", "severe", "unclassifiable")
+
+# Valores con nombre de los campos categóricos
+CATEGORY_VALUES = {
+    "gender": {gender.name.lower(): gender.value for gender in Gender},
+    "diagnosis": {status.name.lower(): status.value for status in DiagnosisStatus},
+    "severity": {level: code for code, level in enumerate(SEVERITY_LEVELS)},
+}
+
+TOKEN_PATTERN = re.compile(r"\s*(?:(-?\d+(?:\.\d*)?|-?\.\d+)|([A-Za-z_][\w.]*)|(<=|>=|==|!=|<|>|=)|([()]))")
+
+
+def severity_codes(diagnosis: np.ndarray, mean_defect: np.ndarray) -> np.ndarray:
+    """
+    Calcula el nivel de severidad del glaucoma de cada ojo, con los mismos
+    umbrales que EyeData.get_glaucoma_severity.
+
+    Args:
+        diagnosis: Códigos de diagnóstico de un ojo
+        mean_defect: Defecto medio de ese ojo (NaN si falta)
+
+    Returns:
+        Posición en SEVERITY_LEVELS, o MISSING_CODE si el ojo no tiene glaucoma
+        o no tiene defecto medio
+    """
+    codes = np.full(diagnosis.shape, MISSING_CODE, dtype=np.int8)
+    graded = (diagnosis == DiagnosisStatus.GLAUCOMA.value) & ~np.isnan(mean_defect)
+    codes[graded] = SEVERITY_LEVELS.index("unclassifiable")
+    codes[graded & (mean_defect >= -6) & (mean_defect < -3)] = SEVERITY_LEVELS.index("mild")
+    codes[graded & (mean_defect >= -12) & (mean_defect < -6)] = SEVERITY_LEVELS.index("moderate")
+    codes[graded & (mean_defect < -12)] = SEVERITY_LEVELS.index("severe")
+    return codes
+
+
+class Condition(ABC):
+    """
+    Nodo de una consulta. Las condiciones se combinan con & (y), | (o) y ~ (no).
+
+    Se evalúan con lógica de tres valores, como en SQL: una comparación con un
+    valor faltante no es ni verdadera ni falsa, y "not" tampoco la cumple. Así
+    "not od.pneumatic_iop > 20" equivale a "od.pneumatic_iop <= 20".
+    """
+
+    @abstractmethod
+    def masks(self, columns: Dict[str, np.ndarray], size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Evalúa la condición sobre todas las filas a la vez.
+
+        Args:
+            columns: Columnas del dataset (nombres de ColumnarPapilaDataset)
+            size: Número de pacientes
+
+        Returns:
+            Tupla (filas donde se cumple, filas donde no se cumple); las filas
+            que no están en ninguna de las dos dependen de valores faltantes
+        """
+
+    def mask(self, columns: Dict[str, np.ndarray], size: int) -> np.ndarray:
+        """
+        Evalúa la condición sobre todas las filas a la vez.
+
+        Args:
+            columns: Columnas del dataset (nombres de ColumnarPapilaDataset)
+            size: Número de pacientes
+
+        Returns:
+            Máscara booleana con las filas que cumplen la condición
+        """
+        return self.masks(columns, size)[0]
+
+    def __and__(self, other: "Condition") -> "Condition":
+        return And(self, other)
+
+    def __or__(self, other: "Condition") -> "Condition":
+        return Or(self, other)
+
+    def __invert__(self) -> "Condition":
+        return Not(self)
+
+
+class Comparison(Condition):
+    """
+    Compara un campo con un valor, por ejemplo Comparison("pneumatic_iop", ">", 21, eye="od").
+
+    Un valor faltante nunca cumple la comparación (tampoco con "!="), ni
+    tampoco su negación con "not". En los campos de ojo sin eye (o con
+    eye="any") basta con que cumpla uno de los dos ojos, y la negación se
+    cumple si ninguno de los ojos con valor cumple la comparación.
+    """
+
+    def __init__(self, field: str, operator: str, value: Any, eye: Optional[str] = None):
+        operator = "==" if operator == "=" else operator
+        if operator not in OPERATORS:
+            raise ValueError(f"Operador desconocido: {operator}")
+
+        if field in PATIENT_FIELDS:
+            if eye is not None:
+                raise ValueError(f"El campo {field} no es de un ojo")
+        elif field in EYE_FIELDS:
+            eye = eye or "any"
+            if eye not in EYE_SELECTORS:
+                raise ValueError(f"Ojo desconocido: {eye} (use od, os o any)")
+        else:
+            raise ValueError(f"Campo desconocido: {field}")
+
+        if field in CATEGORY_VALUES:
+            if operator not in ("==", "!="):
+                raise ValueError(f"El campo {field} solo admite == y !=")
+            value = self._category_code(field, value)
+        else:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"El campo {field} requiere un valor numérico, no {value!r}")
+
+        self.field = field
+        self.operator = operator
+        self.value = value
+        self.eye = eye
+
+    @staticmethod
+    def _category_code(field: str, value: Any) -> int:
+        """Convierte un valor categórico (enum, nombre o código) a su código numérico."""
+        names = CATEGORY_VALUES[field]
+        if isinstance(value, (Gender, DiagnosisStatus)):
+            value = value.value
+        elif isinstance(value, str) and not value.lstrip("-").isdigit():
+            if value.lower() not in names:
+                raise ValueError(f"Valor desconocido para {field}: {value} (use {', '.join(names)})")
+            return names[value.lower()]
+        if int(value) not in names.values():
+            raise ValueError(f"Valor desconocido para {field}: {value}")
+        return int(value)
+
+    def _column_masks(self, column: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Los faltantes (NaN o MISSING_CODE) no cumplen la comparación ni su negación
+        present = ~np.isnan(column) if column.dtype.kind == "f" else column != MISSING_CODE
+        mask = OPERATORS[self.operator](column, self.value)
+        return mask & present, ~mask & present
+
+    def masks(self, columns: Dict[str, np.ndarray], size: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.eye is None:
+            return self._column_masks(columns[self.field])
+
+        # Cualquiera de los ojos: se cumple si se cumple en uno, y no se cumple si
+        # algún ojo tiene el valor y ninguno de los que lo tienen la cumple
+        true = np.zeros(size, dtype=bool)
+        present = np.zeros(size, dtype=bool)
+        for prefix in EYE_SELECTORS[self.eye]:
+            if self.field == "severity":
+                column = severity_codes(columns[f"{prefix}_diagnosis"], columns[f"{prefix}_mean_defect"])
+            else:
+                column = columns[f"{prefix}_{self.field}"]
+            eye_true, eye_false = self._column_masks(column)
+            true |= eye_true
+            present |= eye_true | eye_false
+        return true, present & ~true
+
+    def __repr__(self) -> str:
+        field = self.field if self.eye is None else f"{self.eye}.{self.field}"
+        return f"{field} {self.operator} {self.value}"
+
+
+class And(Condition):
+    def __init__(self, *conditions: Condition):
+        self.conditions = conditions
+
+    def masks(self, columns: Dict[str, np.ndarray], size: int) -> Tuple[np.ndarray, np.ndarray]:
+        true = np.ones(size, dtype=bool)
+        false = np.zeros(size, dtype=bool)
+        for condition in self.conditions:
+            condition_true, condition_false = condition.masks(columns, size)
+            true &= condition_true
+            false |= condition_false
+        return true, false
+
+    def __repr__(self) -> str:
+        return "(" + " and ".join(map(repr, self.conditions)) + ")"
+
+
+class Or(Condition):
+    def __init__(self, *conditions: Condition):
+        self.conditions = conditions
+
+    def masks(self, columns: Dict[str, np.ndarray], size: int) -> Tuple[np.ndarray, np.ndarray]:
+        true = np.zeros(size, dtype=bool)
+        false = np.ones(size, dtype=bool)
+        for condition in self.conditions:
+            condition_true, condition_false = condition.masks(columns, size)
+            true |= condition_true
+            false &= condition_false
+        return true, false
+
+    def __repr__(self) -> str:
+        return "(" + " or ".join(map(repr, self.conditions)) + ")"
+
+
+class Not(Condition):
+    def __init__(self, condition: Condition):
+        self.condition = condition
+
+    def masks(self, columns: Dict[str, np.ndarray], size: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Lo que depende de un valor faltante sigue sin cumplirse
+        true, false = self.condition.masks(columns, size)
+        return false, true
+
+    def __repr__(self) -> str:
+        return f"not {self.condition!r}"
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    """
+    Divide una expresión en tokens (tipo, texto).
+
+    Args:
+        text: Expresión de consulta
+
+    Returns:
+        Lista de tokens: ("number", ...), ("name", ...), ("op", ...) o ("paren", ...)
+    """
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None:
+            raise ValueError(f"Carácter inesperado en la posición {position}: {text[position:]!r}")
+        number, name, operator, paren = match.groups()
+        if number is not None:
+            tokens.append(("number", number))
+        elif name is not None:
+            tokens.append(("name", name))
+        elif operator is not None:
+            tokens.append(("op", operator))
+        else:
+            tokens.append(("paren", paren))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Analizador descendente de la gramática:
+
+        expresion   := termino ("or" termino)*
+        termino     := factor ("and" factor)*
+        factor      := "not" factor | "(" expresion ")" | comparacion
+        comparacion := [od. | os. | any.]campo operador valor
+    """
+
+    def __init__(self, tokens: Sequence[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _next(self, expected: str) -> str:
+        token = self._peek()
+        if token is None:
+            raise ValueError(f"La consulta termina antes de tiempo: se esperaba {expected}")
+        self.position += 1
+        return token[1]
+
+    def _keyword(self, word: str) -> bool:
+        token = self._peek()
+        if token is not None and token[0] == "name" and token[1].lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def parse(self) -> Condition:
+        condition = self._expression()
+        if self._peek() is not None:
+            raise ValueError(f"Token inesperado: {self._peek()[1]}")
+        return condition
+
+    def _expression(self) -> Condition:
+        conditions = [self._term()]
+        while self._keyword("or"):
+            conditions.append(self._term())
+        return conditions[0] if len(conditions) == 1 else Or(*conditions)
+
+    def _term(self) -> Condition:
+        conditions = [self._factor()]
+        while self._keyword("and"):
+            conditions.append(self._factor())
+        return conditions[0] if len(conditions) == 1 else And(*conditions)
+
+    def _factor(self) -> Condition:
+        if self._keyword("not"):
+            return Not(self._factor())
+
+        if self._peek() == ("paren", "("):
+            self.position += 1
+            condition = self._expression()
+            if self._next("')'") != ")":
+                raise ValueError("Falta cerrar un paréntesis")
+            return condition
+
+        token = self._peek()
+        if token is None or token[0] != "name":
+            raise ValueError(f"Se esperaba un campo, no {token[1] if token else 'el final de la consulta'}")
+        field = self._next("un campo").lower()
+        eye = None
+        if "." in field:
+            eye, field = field.split(".", 1)
+
+        token = self._peek()
+        if token is None or token[0] != "op":
+            raise ValueError(f"Se esperaba un operador después de {field}")
+        operator = self._next("un operador")
+
+        token = self._peek()
+        if token is None or token[0] not in ("number", "name"):
+            raise ValueError(f"Se esperaba un valor después de {operator}")
+        value = self._next("un valor")
+        return Comparison(field, operator, value, eye=eye)
+
+
+def parse_query(text: str) -> Condition:
+    """
+    Convierte una expresión de texto en una condición.
+
+    Ejemplos:
+        od.pneumatic_iop > 21 and age >= 60
+        severity = severe or (os.diagnosis = glaucoma and not gender = male)
+
+    Args:
+        text: Expresión de consulta
+
+    Returns:
+        Condición equivalente
+
+    Raises:
+        ValueError: Si la expresión no es válida
+    """
+    tokens = _tokenize(text)
+    if not tokens:
+        raise ValueError("La consulta está vacía")
+    return _Parser(tokens).parse()
+
+
+class QueryResult:
+    """
+    Resultado de una consulta: los IDs que la cumplen, en el orden del dataset.
+
+    Los objetos Patient se obtienen del dataset solo al recorrer el resultado.
+    """
+
+    def __init__(self, dataset: Any, patient_ids: List[str]):
+        self._dataset = dataset
+        self.ids = patient_ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Patient]:
+        for patient_id in self.ids:
+            yield self._dataset.get_patient(patient_id)
+
+    def __getitem__(self, index: int) -> Patient:
+        return self._dataset.get_patient(self.ids[index])
+
+
+def run_query(dataset: Any, query: Any) -> QueryResult:
+    """
+    Ejecuta una consulta sobre un PapilaDataset o un ColumnarPapilaDataset.
+
+    Args:
+        dataset: Dataset que expone query_columns()
+        query: Expresión de texto o Condition
+
+    Returns:
+        Resultado con los IDs de los pacientes que la cumplen
+    """
+    condition = parse_query(query) if isinstance(query, str) else query
+    patient_ids, columns = dataset.query_columns()
+    mask = condition.mask(columns, len(patient_ids))
+    return QueryResult(dataset, [patient_ids[row] for row in np.flatnonzero(mask)])
@@ -0,0 +1,589 @@
+import math
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.columnar_dataset import COLUMN_SPECS, EYE_FLOAT_FIELDS, EYE_PREFIXES, MEASUREMENT_FIELDS, MISSING_CODE
+from core.models import Patient, EyeData, RefractiveError, Eye, Gender, DiagnosisStatus, CrystallineStatus
+
+# Versión del esquema de la base de datos (incrementar si cambian las tablas)
+SCHEMA_VERSION = 2
+
+# Milisegundos que espera una escritura mientras otro proceso tiene la base bloqueada
+BUSY_TIMEOUT_MS = 5000
+
+# Columnas de la tabla eyes, en el orden en que se leen y escriben
+EYE_COLUMNS = ("diagnosis",) + EYE_FLOAT_FIELDS[:3] + ("crystalline_status",) + EYE_FLOAT_FIELDS[3:] + ("fundus_image",)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id TEXT PRIMARY KEY,
+    age INTEGER NOT NULL,
+    gender INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS eyes (
+    patient_id TEXT NOT NULL REFERENCES patients (patient_id) ON DELETE CASCADE,
+    eye TEXT NOT NULL CHECK (eye IN ('OD', 'OS')),
+    diagnosis INTEGER NOT NULL,
+    {", ".join(f"{field} REAL" for field in EYE_FLOAT_FIELDS[:3])},
+    crystalline_status INTEGER,
+    {", ".join(f"{field} REAL" for field in EYE_FLOAT_FIELDS[3:])},
+    fundus_image TEXT,
+    PRIMARY KEY (patient_id, eye)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS excel_snapshot (
+    patient_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_patients_age ON patients (age);
+CREATE INDEX IF NOT EXISTS idx_patients_gender ON patients (gender);
+CREATE INDEX IF NOT EXISTS idx_eyes_diagnosis ON eyes (diagnosis, eye);
+""" + "".join(f"CREATE INDEX IF NOT EXISTS idx_eyes_{field} ON eyes (eye, {field});\n" for field in MEASUREMENT_FIELDS)
+
+# Consulta de pacientes completos: una fila por paciente con los dos ojos
+_SELECT_PATIENTS = (
+    "SELECT p.patient_id, p.age, p.gender, "
+    + ", ".join(f"od.{column}" for column in EYE_COLUMNS) + ", "
+    + ", ".join(f"os.{column}" for column in EYE_COLUMNS)
+    + " FROM patients p"
+    " LEFT JOIN eyes od ON od.patient_id = p.patient_id AND od.eye = 'OD'"
+    " LEFT JOIN eyes os ON os.patient_id = p.patient_id AND os.eye = 'OS'"
+)
+
+_INSERT_EYE = (f"INSERT INTO eyes (patient_id, eye, {', '.join(EYE_COLUMNS)}) "
+               f"VALUES (?, ?, {', '.join('?' for _ in EYE_COLUMNS)})")
+
+
+def _eye_values(eye_data: EyeData) -> tuple:
+    """Valores de un ojo en el orden de EYE_COLUMNS."""
+    refractive_error = eye_data.refractive_error
+    return (
+        eye_data.diagnosis.value,
+        refractive_error.sphere if refractive_error else None,
+        refractive_error.cylinder if refractive_error else None,
+        refractive_error.axis if refractive_error else None,
+        eye_data.crystalline_status.value if eye_data.crystalline_status is not None else None,
+        eye_data.pneumatic_iop,
+        eye_data.perkins_iop,
+        eye_data.pachymetry,
+        eye_data.axial_length,
+        eye_data.mean_defect,
+        eye_data.fundus_image,
+    )
+
+
+def _build_eye(eye_type: Eye, values: Sequence) -> Optional[EyeData]:
+    """Crea un EyeData a partir de los valores de EYE_COLUMNS (None si el ojo no tiene fila)."""
+    (diagnosis, sphere, cylinder, axis, crystalline_status, pneumatic_iop, perkins_iop,
+     pachymetry, axial_length, mean_defect, fundus_image) = values
+    if diagnosis is None:
+        return None
+
+    eye_data = EyeData(
+        eye_type=eye_type,
+        diagnosis=DiagnosisStatus(diagnosis),
+        refractive_error=RefractiveError(sphere=sphere, cylinder=cylinder, axis=axis) if sphere is not None else None,
+        crystalline_status=CrystallineStatus(crystalline_status) if crystalline_status is not None else None,
+        pneumatic_iop=pneumatic_iop,
+        perkins_iop=perkins_iop,
+        pachymetry=pachymetry,
+        axial_length=axial_length,
+        mean_defect=mean_defect
+    )
+    eye_data.fundus_image = fundus_image
+    return eye_data
+
+
+def _build_patient(row: Sequence) -> Patient:
+    """Crea un Patient a partir de una fila de _SELECT_PATIENTS."""
+    eye_width = len(EYE_COLUMNS)
+    return Patient(
+        patient_id=row[0],
+        age=row[1],
+        gender=Gender(row[2]),
+        right_eye=_build_eye(Eye.RIGHT, row[3:3 + eye_width]),
+        left_eye=_build_eye(Eye.LEFT, row[3 + eye_width:])
+    )
+
+
+class _PatientsView(Mapping):
+    """
+    Vista de solo lectura ID -> Patient sobre un SQLitePapilaDataset.
+
+    Permite usar dataset.patients igual que con PapilaDataset. values() e
+    items() leen todos los pacientes con una sola consulta.
+    """
+
+    def __init__(self, dataset: "SQLitePapilaDataset"):
+        self._dataset = dataset
+
+    def __getitem__(self, patient_id: str) -> Patient:
+        patient = self._dataset.get_patient(patient_id)
+        if patient is None:
+            raise KeyError(patient_id)
+        return patient
+
+    def __contains__(self, patient_id: object) -> bool:
+        return self._dataset._fetch_one("SELECT 1 FROM patients WHERE patient_id = ?", (patient_id,)) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([row[0] for row in self._dataset._fetch_all("SELECT patient_id FROM patients ORDER BY rowid")])
+
+    def __len__(self) -> int:
+        return len(self._dataset)
+
+    def values(self) -> List[Patient]:
+        return self._dataset._fetch_patients()
+
+    def items(self) -> List[Tuple[str, Patient]]:
+        return [(patient.patient_id, patient) for patient in self._dataset._fetch_patients()]
+
+
+class SQLitePapilaDataset:
+    """
+    Alternativa a PapilaDataset que guarda los pacientes en una base SQLite.
+
+    Los datos viven en dos tablas normalizadas (patients y eyes) con índices por
+    edad, género y diagnóstico; cada alta, edición o baja se guarda al momento
+    y filter_patients y get_statistics se resuelven con consultas SQL. La base
+    usa el modo WAL, de modo que varios procesos (la interfaz y el menú) pueden
+    leerla mientras otro escribe. Como en ColumnarPapilaDataset, los objetos
+    Patient devueltos se crean al momento: los cambios sobre ellos deben
+    guardarse con update_patient.
+    """
+
+    def __init__(self, db_file: str):
+        """
+        Args:
+            db_file: Ruta de la base de datos (se crea si no existe)
+        """
+        self.db_file = db_file
+        self.base_dir: Optional[str] = None
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(db_file, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+            self._connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+        # Columnas para query, válidas mientras no cambie la base (data_version
+        # detecta los cambios hechos por otras conexiones)
+        self._writes = 0
+        self._query_columns: Optional[tuple] = None
+        self._query_columns_version: Optional[tuple] = None
+
+    @property
+    def patients(self) -> _PatientsView:
+        return _PatientsView(self)
+
+    def __len__(self) -> int:
+        return self._fetch_one("SELECT COUNT(*) FROM patients")[0]
+
+    def close(self) -> None:
+        """Cierra la conexión con la base de datos."""
+        with self._lock:
+            self._connection.close()
+
+    def set_base_directory(self, directory: str) -> None:
+        if os.path.isdir(directory):
+            self.base_dir = directory
+        else:
+            raise NotADirectoryError(f"El directorio {directory} no existe")
+
+    def _fetch_one(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchone()
+
+    def _fetch_all(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def _fetch_patients(self, where: str = "", params: Sequence = ()) -> List[Patient]:
+        """Lee los pacientes que cumplen una condición SQL, en orden de alta."""
+        sql = _SELECT_PATIENTS + (f" WHERE {where}" if where else "") + " ORDER BY p.rowid"
+        return [_build_patient(row) for row in self._fetch_all(sql, params)]
+
+    def _write_patients(self, patients: Iterable[Patient]) -> None:
+        """Inserta o reemplaza pacientes y sus ojos (la transacción la abre quien llama)."""
+        patient_rows, eye_rows, patient_ids = [], [], []
+        for patient in patients:
+            patient_ids.append((patient.patient_id,))
+            patient_rows.append((patient.patient_id, patient.age, patient.gender.value))
+            for eye_type, eye_data in ((Eye.RIGHT, patient.right_eye), (Eye.LEFT, patient.left_eye)):
+                if eye_data is not None:
+                    eye_rows.append((patient.patient_id, eye_type.value) + _eye_values(eye_data))
+
+        connection = self._connection
+        # ON CONFLICT ... DO UPDATE conserva el rowid, es decir, la posición del paciente
+        connection.executemany(
+            "INSERT INTO patients (patient_id, age, gender) VALUES (?, ?, ?) "
+            "ON CONFLICT (patient_id) DO UPDATE SET age = excluded.age, gender = excluded.gender",
+            patient_rows
+        )
+        connection.executemany("DELETE FROM eyes WHERE patient_id = ?", patient_ids)
+        connection.executemany(_INSERT_EYE, eye_rows)
+        self._writes += 1
+
+    def add_patient(self, patient: Patient) -> None:
+        with self._lock, self._connection:
+            self._write_patients([patient])
+
+    def add_patients(self, patients: Iterable[Patient]) -> None:
+        """
+        Añade o reemplaza varios pacientes en una sola transacción.
+
+        Args:
+            patients: Pacientes a guardar
+        """
+        with self._lock, self._connection:
+            self._write_patients(patients)
+
+    def load_from_csv(self, od_file: str, os_file: str, chunksize: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Carga pacientes de los CSV de OD y OS por bloques, guardando cada bloque
+        en una transacción.
+
+        La unión por patient_id la resuelve la clave primaria de la base, así que
+        la memoria usada es la de un bloque aunque los archivos ocupen varios GB.
+        Manda la primera fila de cada paciente y ojo; los pacientes y ojos que ya
+        estaban en la base se conservan.
+
+        Args:
+            od_file: Ruta del CSV de ojos derechos
+            os_file: Ruta del CSV de ojos izquierdos
+            chunksize: Filas por bloque (por defecto, CSV_CHUNK_SIZE)
+
+        Returns:
+            Informe con filas, filas descartadas, pacientes nuevos, segundos,
+            filas por segundo y pico de memoria del proceso
+        """
+        from core.csv_loader import finish_load_report, new_load_report
+
+        report = new_load_report()
+
+        # Mantener los índices secundarios fila a fila (en orden aleatorio) es lo
+        # más caro de una carga grande: se eliminan y se reconstruyen al final. Si
+        # la carga se interrumpe, el esquema los vuelve a crear al abrir la base.
+        with self._lock, self._connection:
+            for index in self._secondary_indexes():
+                self._connection.execute(f"DROP INDEX IF EXISTS {index}")
+        try:
+            added = self._load_csv_rows(od_file, os_file, report, chunksize)
+        finally:
+            with self._lock, self._connection:
+                self._connection.executescript(SCHEMA)
+
+        return finish_load_report(report, added)
+
+    def _secondary_indexes(self) -> List[str]:
+        """Nombres de los índices creados por SCHEMA."""
+        return [row[0] for row in self._fetch_all(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx\\_%' ESCAPE '\\'")]
+
+    def _load_csv_rows(self, od_file: str, os_file: str, report: Dict[str, Any], chunksize: Optional[int]) -> int:
+        """Inserta los bloques de los CSV (una transacción por bloque) y cuenta los pacientes nuevos."""
+        from core.csv_loader import CSV_CHUNK_SIZE, iter_csv_rows
+
+        added = 0
+        for eye_type, csv_file in ((Eye.RIGHT, od_file), (Eye.LEFT, os_file)):
+            for rows in iter_csv_rows(csv_file, report, chunksize or CSV_CHUNK_SIZE):
+                with self._lock, self._connection:
+                    before = self._connection.total_changes
+                    self._connection.executemany(
+                        "INSERT INTO patients (patient_id, age, gender) VALUES (?, ?, ?) "
+                        "ON CONFLICT (patient_id) DO NOTHING",
+                        [row[:3] for row in rows]
+                    )
+                    added += self._connection.total_changes - before
+                    self._connection.executemany(
+                        _INSERT_EYE.replace("INSERT", "INSERT OR IGNORE", 1),
+                        [(row[0], eye_type.value) + row[3:] + (None,) for row in rows]
+                    )
+                    self._writes += 1
+        return added
+
+    def excel_snapshot(self) -> Dict[str, str]:
+        """
+        Devuelve la huella de las filas de Excel de cada paciente en la última
+        importación o exportación (ver export_database_to_excel).
+
+        Returns:
+            Diccionario ID -> huella de patient_fingerprint (vacío si nunca se guardó)
+        """
+        return dict(self._fetch_all("SELECT patient_id, fingerprint FROM excel_snapshot"))
+
+    def save_excel_snapshot(self, fingerprints: Dict[str, str], replace: bool = False) -> None:
+        """
+        Guarda la huella de las filas de Excel de los pacientes.
+
+        Args:
+            fingerprints: Diccionario ID -> huella de patient_fingerprint
+            replace: Si es True, se descartan las huellas de los demás pacientes
+        """
+        with self._lock, self._connection:
+            if replace:
+                self._connection.execute("DELETE FROM excel_snapshot")
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO excel_snapshot (patient_id, fingerprint) VALUES (?, ?)",
+                fingerprints.items())
+
+    def get_patient(self, patient_id: str) -> Optional[Patient]:
+        patients = self._fetch_patients("p.patient_id = ?", (patient_id,))
+        return patients[0] if patients else None
+
+    def update_patient(self, patient: Patient) -> None:
+        """Actualiza un paciente existente en el dataset."""
+        with self._lock, self._connection:
+            if self._connection.execute("SELECT 1 FROM patients WHERE patient_id = ?",
+                                        (patient.patient_id,)).fetchone() is None:
+                raise ValueError(f"El paciente con ID {patient.patient_id} no existe en el dataset")
+            self._write_patients([patient])
+
+    def remove_patient(self, patient_id: str) -> bool:
+        with self._lock, self._connection:
+            removed = self._connection.execute("DELETE FROM patients WHERE patient_id = ?", (patient_id,)).rowcount
+            self._writes += 1
+        return removed > 0
+
+    def load_images(self, directory: str, verify: bool = False, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Asigna a los ojos de todos los pacientes sus imágenes de fondo de ojo.
+
+        Los pacientes se emparejan en memoria con una sola lectura del
+        directorio y las rutas se guardan en una única transacción.
+
+        Args:
+            directory: Directorio de imágenes de fondo de ojo
+            verify: Si es True, comprueba en paralelo que cada imagen se puede leer y es un JPEG
+            workers: Hilos de la verificación
+
+        Returns:
+            Resumen con imágenes asignadas, ojos sin imagen e imágenes no válidas
+
+        Raises:
+            NotADirectoryError: Si el directorio no existe
+        """
+        from core.image_loader import attach_fundus_images
+
+        self.set_base_directory(directory)
+        patients = self._fetch_patients()
+        report = attach_fundus_images(patients, directory, verify, workers)
+
+        rows = [(eye_data.fundus_image, patient.patient_id, eye_data.eye_type.value)
+                for patient in patients for eye_data in (patient.right_eye, patient.left_eye)
+                if eye_data is not None and eye_data.fundus_image is not None]
+        with self._lock, self._connection:
+            self._connection.executemany("UPDATE eyes SET fundus_image = ? WHERE patient_id = ? AND eye = ?", rows)
+            self._writes += 1
+        return report
+
+    def filter_patients(self, **kwargs) -> List[Patient]:
+        """
+        Filtra los pacientes por age_min, age_max, gender, diagnosis (en cualquier
+        ojo), od_diagnosis y os_diagnosis con una consulta SQL que usa los
+        índices. Los filtros desconocidos se ignoran.
+        """
+        conditions, params = [], []
+        for key, value in kwargs.items():
+            if key == 'age_min':
+                conditions.append("p.age >= ?")
+                params.append(value)
+            elif key == 'age_max':
+                conditions.append("p.age <= ?")
+                params.append(value)
+            elif key == 'gender':
+                conditions.append("p.gender = ?")
+                params.append(value.value)
+            elif key == 'diagnosis':
+                conditions.append("p.patient_id IN (SELECT patient_id FROM eyes WHERE diagnosis = ?)")
+                params.append(value.value)
+            elif key in ('od_diagnosis', 'os_diagnosis'):
+                conditions.append("p.patient_id IN (SELECT patient_id FROM eyes WHERE diagnosis = ? AND eye = ?)")
+                params.extend((value.value, Eye.RIGHT.value if key == 'od_diagnosis' else Eye.LEFT.value))
+
+        return self._fetch_patients(" AND ".join(conditions), params)
+
+    def _version(self) -> tuple:
+        """Identifica el estado actual de la base (cambios propios y de otras conexiones)."""
+        return self._writes, self._fetch_one("PRAGMA data_version")[0]
+
+    def query_columns(self) -> tuple:
+        """
+        Devuelve los IDs y las columnas de los pacientes para evaluar consultas.
+
+        Returns:
+            Tupla (lista de IDs, diccionario de columnas con los nombres de ColumnarPapilaDataset)
+        """
+        version = self._version()
+        if self._query_columns is not None and self._query_columns_version == version:
+            return self._query_columns
+
+        rows = self._fetch_all(_SELECT_PATIENTS + " ORDER BY p.rowid")
+        patient_ids = [row[0] for row in rows]
+        values = list(zip(*rows)) if rows else [()] * (3 + 2 * len(EYE_COLUMNS))
+
+        columns = {
+            "age": np.array(values[1], dtype=COLUMN_SPECS["age"][0]),
+            "gender": np.array(values[2], dtype=COLUMN_SPECS["gender"][0]),
+        }
+        offset = 3
+        for prefix in EYE_PREFIXES.values():
+            for column_name, column_values in zip(EYE_COLUMNS, values[offset:offset + len(EYE_COLUMNS)]):
+                name = f"{prefix}_{column_name}"
+                dtype, empty = COLUMN_SPECS[name]
+                if dtype == object:
+                    columns[name] = np.array(column_values, dtype=object)
+                    continue
+                # None se convierte en NaN; en las columnas enteras, en MISSING_CODE
+                column = np.array(column_values, dtype=np.float64)
+                if dtype != np.float64:
+                    column = np.where(np.isnan(column), empty, column).astype(dtype)
+                columns[name] = column
+            columns[f"{prefix}_present"] = columns[f"{prefix}_diagnosis"] != MISSING_CODE
+            offset += len(EYE_COLUMNS)
+
+        self._query_columns = (patient_ids, columns)
+        self._query_columns_version = version
+        return self._query_columns
+
+    def query(self, query: Any) -> Any:
+        """Busca pacientes con una consulta (ver core.query.parse_query)."""
+        from core.query import run_query
+
+        return run_query(self, query)
+
+    def _measurement_summaries(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Resume cada medición de cada ojo con SQL: conteo, media, desviación
+        estándar, mínimo, máximo y cuantiles.
+
+        La desviación se calcula en una segunda consulta como la media de las
+        desviaciones al cuadrado respecto a la media de la primera, igual que
+        compute_statistics, para no restar dos cantidades casi iguales.
+        """
+        from core.statistics import EYE_NAMES, QUANTILES
+
+        aggregates = ", ".join(
+            f"COUNT({field}), AVG({field}), MIN({field}), MAX({field})" for field in MEASUREMENT_FIELDS
+        )
+        rows = self._fetch_all(f"SELECT eye, {aggregates} FROM eyes GROUP BY eye")
+        by_eye = {row[0]: row[1:] for row in rows}
+
+        deviations = ", ".join(f"AVG(({field} - ?) * ({field} - ?))" for field in MEASUREMENT_FIELDS)
+        summaries = {}
+        for eye_type in EYE_PREFIXES:
+            eye_name = EYE_NAMES[eye_type]
+            values = by_eye.get(eye_type.value, (0, None, None, None) * len(MEASUREMENT_FIELDS))
+            means = [values[4 * i + 1] for i in range(len(MEASUREMENT_FIELDS))]
+            variances = (None,) * len(MEASUREMENT_FIELDS)
+            if eye_type.value in by_eye:
+                variances = self._fetch_one(f"SELECT {deviations} FROM eyes WHERE eye = ?",
+                                            [mean for mean in means for _ in range(2)] + [eye_type.value])
+            summaries[eye_name] = {}
+            for i, field in enumerate(MEASUREMENT_FIELDS):
+                count, mean, minimum, maximum = values[4 * i:4 * i + 4]
+                summary = {"count": count, "mean": None, "std": None, "min": None, "max": None}
+                summary.update({name: None for name in QUANTILES})
+                if count:
+                    summary.update(mean=float(mean), std=math.sqrt(variances[i]),
+                                   min=float(minimum), max=float(maximum))
+                    summary.update(self._quantiles(eye_type, field, count))
+                summaries[eye_name][field] = summary
+        return summaries
+
+    def _quantiles(self, eye_type: Eye, field: str, count: int) -> Dict[str, float]:
+        """
+        Calcula los cuantiles de una medición con interpolación lineal (como np.quantile).
+
+        Los dos valores vecinos de cada cuantil se leen en orden del índice
+        (eye, medición), sin ordenar la columna. La consulta no fuerza el
+        índice: mientras load_from_csv lo reconstruye, otro proceso sigue
+        pudiendo calcular las estadísticas (ordenando la columna).
+        """
+        from core.statistics import QUANTILES
+
+        quantiles = {}
+        for name, q in QUANTILES.items():
+            position = q * (count - 1)
+            lower = int(position)
+            rows = self._fetch_all(
+                f"SELECT {field} FROM eyes "
+                f"WHERE eye = ? AND {field} IS NOT NULL ORDER BY {field} LIMIT 2 OFFSET ?",
+                (eye_type.value, lower)
+            )
+            lower_value = rows[0][0]
+            upper_value = rows[-1][0]
+            quantiles[name] = float(lower_value + (upper_value - lower_value) * (position - lower))
+        return quantiles
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """
+        Devuelve las estadísticas del dataset calculadas con consultas SQL.
+
+        Tiene la misma estructura que compute_statistics; solo los valores
+        agregados (y los vecinos de cada cuantil) salen de la base.
+        """
+        from core.statistics import EYE_NAMES
+
+        with self._lock:
+            # Una transacción de lectura para que todas las consultas vean el mismo estado
+            self._connection.execute("BEGIN")
+            try:
+                total, male, female, age_min, age_max, age_avg = self._fetch_one(
+                    "SELECT COUNT(*), TOTAL(gender = ?), TOTAL(gender = ?), MIN(age), MAX(age), AVG(age) "
+                    "FROM patients", (Gender.MALE.value, Gender.FEMALE.value))
+                diagnosis_rows = self._fetch_all(
+                    "SELECT od.diagnosis, os.diagnosis, COUNT(*) FROM patients p "
+                    "LEFT JOIN eyes od ON od.patient_id = p.patient_id AND od.eye = 'OD' "
+                    "LEFT JOIN eyes os ON os.patient_id = p.patient_id AND os.eye = 'OS' "
+                    "GROUP BY od.diagnosis, os.diagnosis")
+                severity_rows = self._fetch_all(
+                    "SELECT eye, TOTAL(mean_defect >= -6 AND mean_defect < -3), "
+                    "TOTAL(mean_defect >= -12 AND mean_defect < -6), TOTAL(mean_defect < -12), "
+                    "COUNT(mean_defect) FROM eyes WHERE diagnosis = ? GROUP BY eye",
+                    (DiagnosisStatus.GLAUCOMA.value,))
+                eye_stats = self._measurement_summaries()
+            finally:
+                self._connection.execute("COMMIT")
+
+        stats = {
+            "total_patients": total,
+            "gender_distribution": {"male": int(male), "female": int(female)},
+            "diagnosis_distribution": {"healthy": 0, "glaucoma": 0, "suspect": 0, "mixed": 0},
+            "age_stats": {"min": 0, "max": 0, "avg": 0},
+            "eye_stats": eye_stats,
+            "severity_distribution": {
+                eye_name: {"mild": 0, "moderate": 0, "severe": 0, "unclassifiable": 0}
+                for eye_name in EYE_NAMES.values()
+            }
+        }
+
+        # Diagnóstico combinado: un ojo sin datos cuenta como distinto; sin ningún ojo no cuenta
+        for right, left, count in diagnosis_rows:
+            if right != left:
+                stats["diagnosis_distribution"]["mixed"] += count
+            elif right is not None:
+                stats["diagnosis_distribution"][DiagnosisStatus(right).name.lower()] += count
+
+        for eye, mild, moderate, severe, graded in severity_rows:
+            stats["severity_distribution"][EYE_NAMES[Eye(eye)]] = {
+                "mild": int(mild),
+                "moderate": int(moderate),
+                "severe": int(severe),
+                "unclassifiable": int(graded - mild - moderate - severe)
+            }
+
+        if total:
+            stats["age_stats"] = {"min": age_min, "max": age_max, "avg": float(age_avg)}
+        return stats
+
+    def recompute_statistics(self) -> Dict[str, Any]:
+        """Calcula las estadísticas con NumPy a partir de todas las columnas (para verificar las de SQL)."""
+        from core.statistics import compute_statistics
+
+        return compute_statistics(self.query_columns()[1])
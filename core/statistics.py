@@ -0,0 +1,482 @@
+import math
+from bisect import bisect_left, insort
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.columnar_dataset import EYE_PREFIXES, MEASUREMENT_FIELDS, MISSING_CODE
+from core.models import Patient, Eye, Gender, DiagnosisStatus
+
+# Nombre de cada ojo en el resultado de las estadísticas
+EYE_NAMES = {Eye.RIGHT: "right", Eye.LEFT: "left"}
+
+# Cuantiles calculados para cada medición
+QUANTILES = {"q25": 0.25, "median": 0.5, "q75": 0.75}
+
+# Posición del defecto medio dentro de MEASUREMENT_FIELDS
+MEAN_DEFECT_INDEX = MEASUREMENT_FIELDS.index("mean_defect")
+
+
+def collect_statistics_columns(patients: Iterable[Patient]) -> Dict[str, np.ndarray]:
+    """
+    Extrae en una sola pasada los arreglos necesarios para las estadísticas.
+
+    Args:
+        patients: Pacientes del dataset
+
+    Returns:
+        Diccionario con los mismos nombres de columna que ColumnarPapilaDataset
+    """
+    get_measurements = attrgetter(*MEASUREMENT_FIELDS)
+    missing_eye = (MISSING_CODE,) + (None,) * len(MEASUREMENT_FIELDS)
+
+    rows = []
+    for patient in patients:
+        right, left = patient.right_eye, patient.left_eye
+        rows.append((patient.age, patient.gender.value)
+                    + (missing_eye if right is None else (right.diagnosis.value,) + get_measurements(right))
+                    + (missing_eye if left is None else (left.diagnosis.value,) + get_measurements(left)))
+
+    # None se convierte en NaN al crear el arreglo de tipo float
+    table = np.array(rows, dtype=np.float64).reshape(len(rows), 2 + 2 * len(missing_eye))
+    columns = {
+        "age": table[:, 0].astype(np.int64),
+        "gender": table[:, 1].astype(np.int8),
+    }
+    offset = 2
+    for prefix in EYE_PREFIXES.values():
+        columns[f"{prefix}_diagnosis"] = table[:, offset].astype(np.int8)
+        for i, field in enumerate(MEASUREMENT_FIELDS, start=offset + 1):
+            columns[f"{prefix}_{field}"] = table[:, i]
+        offset += len(missing_eye)
+    return columns
+
+
+def _measurement_summary(values: np.ndarray) -> Dict[str, Any]:
+    """
+    Resume una medición: conteo, media, desviación estándar, mínimo, máximo y cuantiles.
+
+    Se ordena una sola vez (los NaN quedan al final) y del arreglo ordenado se
+    obtienen mínimo, máximo y cuantiles con interpolación lineal, igual que
+    np.quantile. Ordenar es más rápido que np.quantile con muchos valores
+    repetidos, como ocurre con las mediciones clínicas redondeadas.
+
+    Args:
+        values: Valores de la medición (NaN para los faltantes)
+
+    Returns:
+        Diccionario con el resumen; los valores son None si no hay datos
+    """
+    count = int(values.size - np.count_nonzero(np.isnan(values)))
+    ordered = np.sort(values)[:count]
+
+    summary = {"count": count, "mean": None, "std": None, "min": None, "max": None}
+    summary.update({name: None for name in QUANTILES})
+    if not count:
+        return summary
+
+    mean = ordered.sum() / count
+    deviations = ordered - mean
+    summary["mean"] = float(mean)
+    summary["std"] = float(np.sqrt(np.dot(deviations, deviations) / count))
+    summary["min"] = float(ordered[0])
+    summary["max"] = float(ordered[-1])
+    for name, q in QUANTILES.items():
+        summary[name] = _sorted_quantile(ordered, q)
+    return summary
+
+
+def _sorted_quantile(ordered: Sequence[float], q: float) -> float:
+    """
+    Calcula un cuantil de valores ya ordenados con interpolación lineal (como np.quantile).
+
+    Args:
+        ordered: Valores ordenados de menor a mayor (sin NaN)
+        q: Cuantil entre 0 y 1
+
+    Returns:
+        Valor del cuantil
+    """
+    position = q * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return float(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower))
+
+
+def _severity_level(diagnosis: int, mean_defect: Optional[float]) -> Optional[str]:
+    """
+    Clasifica la severidad del glaucoma de un ojo (umbrales de EyeData.get_glaucoma_severity).
+
+    Args:
+        diagnosis: Código de diagnóstico del ojo
+        mean_defect: Defecto medio del ojo
+
+    Returns:
+        Nivel de severidad o None si el ojo no tiene glaucoma o no tiene defecto medio
+    """
+    if diagnosis != DiagnosisStatus.GLAUCOMA.value or mean_defect is None:
+        return None
+    if -6 <= mean_defect < -3:
+        return "mild"
+    if -12 <= mean_defect < -6:
+        return "moderate"
+    if mean_defect < -12:
+        return "severe"
+    return "unclassifiable"
+
+
+def _severity_histogram(diagnosis: np.ndarray, mean_defect: np.ndarray) -> Dict[str, int]:
+    """
+    Cuenta los ojos con glaucoma por nivel de severidad según el defecto medio,
+    con los mismos umbrales que EyeData.get_glaucoma_severity.
+
+    Args:
+        diagnosis: Códigos de diagnóstico de un ojo
+        mean_defect: Defecto medio de ese ojo (NaN si falta)
+
+    Returns:
+        Diccionario nivel de severidad -> número de ojos
+    """
+    graded = (diagnosis == DiagnosisStatus.GLAUCOMA.value) & ~np.isnan(mean_defect)
+    md = mean_defect[graded]
+
+    mild = np.count_nonzero((md >= -6) & (md < -3))
+    moderate = np.count_nonzero((md >= -12) & (md < -6))
+    severe = np.count_nonzero(md < -12)
+    return {
+        "mild": int(mild),
+        "moderate": int(moderate),
+        "severe": int(severe),
+        "unclassifiable": int(md.size - mild - moderate - severe)
+    }
+
+
+def compute_statistics(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """
+    Calcula las estadísticas del dataset de forma vectorizada.
+
+    Mantiene las claves de PapilaDataset.get_statistics (total, género,
+    diagnóstico y edad) y añade por ojo el resumen de cada medición
+    ("eye_stats") y el histograma de severidad del glaucoma
+    ("severity_distribution").
+
+    Args:
+        columns: Arreglos con los nombres de columna de ColumnarPapilaDataset
+
+    Returns:
+        Diccionario con las estadísticas
+    """
+    age = columns["age"]
+    total = int(age.size)
+    stats = {
+        "total_patients": total,
+        "gender_distribution": {"male": 0, "female": 0},
+        "diagnosis_distribution": {"healthy": 0, "glaucoma": 0, "suspect": 0, "mixed": 0},
+        "age_stats": {"min": 0, "max": 0, "avg": 0},
+        "eye_stats": {},
+        "severity_distribution": {}
+    }
+
+    for eye_type, prefix in EYE_PREFIXES.items():
+        eye_name = EYE_NAMES[eye_type]
+        stats["eye_stats"][eye_name] = {
+            field: _measurement_summary(columns[f"{prefix}_{field}"]) for field in MEASUREMENT_FIELDS
+        }
+        stats["severity_distribution"][eye_name] = _severity_histogram(
+            columns[f"{prefix}_diagnosis"], columns[f"{prefix}_mean_defect"])
+
+    if not total:
+        return stats
+
+    stats["gender_distribution"]["male"] = int(np.count_nonzero(columns["gender"] == Gender.MALE.value))
+    stats["gender_distribution"]["female"] = int(np.count_nonzero(columns["gender"] == Gender.FEMALE.value))
+
+    # Diagnóstico combinado: un ojo sin datos tiene MISSING_CODE y cuenta como distinto
+    right = columns["od_diagnosis"]
+    left = columns["os_diagnosis"]
+    same_diagnosis = np.bincount(right[right == left].astype(np.intp) + 1, minlength=4)
+    stats["diagnosis_distribution"]["healthy"] = int(same_diagnosis[DiagnosisStatus.HEALTHY.value + 1])
+    stats["diagnosis_distribution"]["glaucoma"] = int(same_diagnosis[DiagnosisStatus.GLAUCOMA.value + 1])
+    stats["diagnosis_distribution"]["suspect"] = int(same_diagnosis[DiagnosisStatus.SUSPECT.value + 1])
+    stats["diagnosis_distribution"]["mixed"] = int(total - same_diagnosis.sum())
+
+    stats["age_stats"]["min"] = int(age.min())
+    stats["age_stats"]["max"] = int(age.max())
+    stats["age_stats"]["avg"] = float(age.sum(dtype=np.int64)) / total
+
+    return stats
+
+
+def statistics_snapshot(patient: Patient) -> Tuple:
+    """
+    Obtiene los valores de un paciente que intervienen en las estadísticas.
+
+    Se guarda una copia por paciente para poder restar su contribución aunque
+    el objeto Patient se modifique después en el lugar.
+
+    Args:
+        patient: Paciente
+
+    Returns:
+        Tupla (edad, género, diagnóstico OD, mediciones OD, diagnóstico OS, mediciones OS)
+    """
+    get_measurements = attrgetter(*MEASUREMENT_FIELDS)
+    snapshot = [patient.age, patient.gender.value]
+    for eye_data in (patient.right_eye, patient.left_eye):
+        if eye_data is None:
+            snapshot.extend((MISSING_CODE, (None,) * len(MEASUREMENT_FIELDS)))
+        else:
+            snapshot.extend((eye_data.diagnosis.value, get_measurements(eye_data)))
+    return tuple(snapshot)
+
+
+class _RunningMeasurement:
+    """
+    Conteo, media, suma de desviaciones al cuadrado y multiconjunto ordenado de una medición.
+
+    La media y la desviación se mantienen con el método de Welford (también al
+    quitar valores), que no sufre la cancelación de restar la media al cuadrado
+    de la media de los cuadrados; si quitar un valor anularía casi toda la
+    dispersión, se recalcula de los valores guardados. Los valores se guardan como valores distintos
+    ordenados (bisect) más un contador por valor: las mediciones clínicas están
+    redondeadas y tienen pocos valores distintos. Para cada cuantil se mantiene
+    un cursor (valor y número de elementos menores) sobre la posición inferior
+    de la interpolación; como cada cambio mueve la posición como mucho un
+    elemento, actualizarlo cuesta O(log n) y el resumen no recorre los valores.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.squared_deviations = 0.0
+        self.counts: Dict[float, int] = {}
+        self.values: List[float] = []
+        # Cuantil -> [valor en la posición inferior, número de elementos menores que ese valor]
+        self._cursors: Dict[str, Optional[List[float]]] = {name: None for name in QUANTILES}
+        self._summary: Optional[Dict[str, Any]] = None
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.squared_deviations += delta * (value - self.mean)
+
+        if value in self.counts:
+            self.counts[value] += 1
+        else:
+            self.counts[value] = 1
+            insort(self.values, value)
+
+        for name, cursor in self._cursors.items():
+            if cursor is None:
+                self._cursors[name] = cursor = [value, 0]
+            elif value < cursor[0]:
+                cursor[1] += 1
+            self._seek(cursor, int(QUANTILES[name] * (self.count - 1)))
+        self._summary = None
+
+    def remove(self, value: float) -> None:
+        self.count -= 1
+        removed_at = None
+        if self.counts[value] > 1:
+            self.counts[value] -= 1
+        else:
+            del self.counts[value]
+            removed_at = bisect_left(self.values, value)
+            del self.values[removed_at]
+
+        delta = value - self.mean
+        mean = self.mean - delta / self.count if self.count else 0.0
+        removed_deviations = delta * (value - mean)
+        if len(self.values) > 1 and 2 * removed_deviations <= self.squared_deviations:
+            self.mean = mean
+            self.squared_deviations -= removed_deviations
+        else:
+            # El valor quitado aportaba la mayor parte de la dispersión (un valor atípico,
+            # o quedan menos de dos valores distintos): restarlo perdería casi toda la
+            # precisión, así que se recalcula del multiconjunto
+            self._recompute()
+
+        for name, cursor in self._cursors.items():
+            if not self.count:
+                self._cursors[name] = None
+                continue
+            if value < cursor[0]:
+                cursor[1] -= 1
+            elif value == cursor[0] and removed_at is not None:
+                # El valor del cursor ya no existe: pasa al siguiente (o al anterior si era el último)
+                if removed_at < len(self.values):
+                    cursor[0] = self.values[removed_at]
+                else:
+                    cursor[0] = self.values[removed_at - 1]
+                    cursor[1] -= self.counts[cursor[0]]
+            self._seek(cursor, int(QUANTILES[name] * (self.count - 1)))
+        self._summary = None
+
+    def _recompute(self) -> None:
+        """Recalcula la media y la suma de desviaciones al cuadrado a partir de los valores guardados."""
+        if not self.count:
+            self.mean = self.squared_deviations = 0.0
+            return
+        self.mean = math.fsum(value * count for value, count in self.counts.items()) / self.count
+        self.squared_deviations = math.fsum(count * (value - self.mean) ** 2 for value, count in self.counts.items())
+
+    def _seek(self, cursor: List[float], rank: int) -> None:
+        """Mueve un cursor hasta el valor que ocupa la posición rank del multiconjunto ordenado."""
+        value, below = cursor
+        while rank < below:
+            value = self.values[bisect_left(self.values, value) - 1]
+            below -= self.counts[value]
+        while rank >= below + self.counts[value]:
+            below += self.counts[value]
+            value = self.values[bisect_left(self.values, value) + 1]
+        cursor[0], cursor[1] = value, below
+
+    def summary(self) -> Dict[str, Any]:
+        if self._summary is not None:
+            return dict(self._summary)
+
+        count = self.count
+        summary = {"count": count, "mean": None, "std": None, "min": None, "max": None}
+        summary.update({name: None for name in QUANTILES})
+        if count:
+            summary["mean"] = float(self.mean)
+            summary["std"] = math.sqrt(self.squared_deviations / count)
+            summary["min"] = float(self.values[0])
+            summary["max"] = float(self.values[-1])
+
+            # Cuantiles con interpolación lineal entre la posición del cursor y la siguiente
+            for name, q in QUANTILES.items():
+                position = q * (count - 1)
+                lower_value, below = self._cursors[name]
+                upper_value = lower_value
+                if int(position) + 1 < count and int(position) + 1 >= below + self.counts[lower_value]:
+                    upper_value = self.values[bisect_left(self.values, lower_value) + 1]
+                summary[name] = float(lower_value + (upper_value - lower_value) * (position - int(position)))
+
+        self._summary = summary
+        return dict(summary)
+
+
+class RunningStatistics:
+    """
+    Agregados de las estadísticas del dataset que se actualizan paciente a paciente.
+
+    Produce el mismo resultado que compute_statistics sin recorrer el dataset:
+    contadores para las distribuciones, medias y desviaciones por el método de
+    Welford, y multiconjuntos ordenados para mínimos, máximos y cuantiles.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.gender_counts = {gender.value: 0 for gender in Gender}
+        self.diagnosis_counts = {"healthy": 0, "glaucoma": 0, "suspect": 0, "mixed": 0}
+        self.age = _RunningMeasurement()
+        self.measurements = {
+            (eye_name, field): _RunningMeasurement()
+            for eye_name in EYE_NAMES.values() for field in MEASUREMENT_FIELDS
+        }
+        self.severity_counts = {
+            eye_name: {"mild": 0, "moderate": 0, "severe": 0, "unclassifiable": 0} for eye_name in EYE_NAMES.values()
+        }
+
+    @staticmethod
+    def _combined_diagnosis(right: int, left: int) -> Optional[str]:
+        """Clave de diagnosis_distribution de un paciente (None si no tiene ningún ojo)."""
+        if right != left:
+            return "mixed"
+        if right == MISSING_CODE:
+            return None
+        return DiagnosisStatus(right).name.lower()
+
+    def _apply(self, snapshot: Tuple, sign: int) -> None:
+        """Suma (sign=1) o resta (sign=-1) la contribución de un paciente."""
+        age, gender, right_diagnosis, right_values, left_diagnosis, left_values = snapshot
+
+        self.total += sign
+        self.gender_counts[gender] += sign
+        if sign > 0:
+            self.age.add(age)
+        else:
+            self.age.remove(age)
+
+        combined = self._combined_diagnosis(right_diagnosis, left_diagnosis)
+        if combined is not None:
+            self.diagnosis_counts[combined] += sign
+
+        for eye_name, diagnosis, values in (("right", right_diagnosis, right_values),
+                                            ("left", left_diagnosis, left_values)):
+            for field, value in zip(MEASUREMENT_FIELDS, values):
+                if value is None or value != value:
+                    continue
+                if sign > 0:
+                    self.measurements[(eye_name, field)].add(value)
+                else:
+                    self.measurements[(eye_name, field)].remove(value)
+
+            level = _severity_level(diagnosis, values[MEAN_DEFECT_INDEX])
+            if level is not None:
+                self.severity_counts[eye_name][level] += sign
+
+    def add(self, snapshot: Tuple) -> None:
+        self._apply(snapshot, 1)
+
+    def remove(self, snapshot: Tuple) -> None:
+        self._apply(snapshot, -1)
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Construye el diccionario de estadísticas a partir de los agregados.
+
+        Returns:
+            Diccionario con la misma estructura que compute_statistics
+        """
+        stats = {
+            "total_patients": self.total,
+            "gender_distribution": {
+                "male": self.gender_counts[Gender.MALE.value],
+                "female": self.gender_counts[Gender.FEMALE.value]
+            },
+            "diagnosis_distribution": dict(self.diagnosis_counts),
+            "age_stats": {"min": 0, "max": 0, "avg": 0},
+            "eye_stats": {
+                eye_name: {field: self.measurements[(eye_name, field)].summary() for field in MEASUREMENT_FIELDS}
+                for eye_name in EYE_NAMES.values()
+            },
+            "severity_distribution": {eye_name: dict(counts) for eye_name, counts in self.severity_counts.items()}
+        }
+
+        if self.total:
+            stats["age_stats"]["min"] = int(self.age.values[0])
+            stats["age_stats"]["max"] = int(self.age.values[-1])
+            stats["age_stats"]["avg"] = float(self.age.mean)
+
+        return stats
+
+
+def statistics_mismatches(expected: Any, actual: Any, path: str = "") -> List[str]:
+    """
+    Compara dos resultados de estadísticas con tolerancia para los valores float.
+
+    Args:
+        expected: Resultado de referencia (recálculo completo)
+        actual: Resultado a verificar (incremental)
+        path: Prefijo de la clave, usado en la recursión
+
+    Returns:
+        Lista con las claves cuyos valores no coinciden
+    """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        mismatches = []
+        for key in expected.keys() | actual.keys():
+            mismatches.extend(statistics_mismatches(expected.get(key), actual.get(key), f"{path}/{key}"))
+        return mismatches
+
+    if isinstance(expected, float) or isinstance(actual, float):
+        if expected is not None and actual is not None and math.isclose(expected, actual, rel_tol=1e-6,
+                                                                         abs_tol=1e-6):
+            return []
+    elif expected == actual:
+        return []
+    return [f"{path}: {expected!r} != {actual!r}"]
@@ -1,53 +1,42 @@
+import hashlib
 import os
+import threading
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from core.models import PapilaDataset, Patient, EyeData, RefractiveError, Eye, Gender, DiagnosisStatus, \
     CrystallineStatus
+from core.columnar_dataset import ColumnarPapilaDataset, EYE_FLOAT_FIELDS, EYE_PREFIXES, MISSING_CODE
+from core.image_loader import attach_fundus_images
+from core.sqlite_dataset import SQLitePapilaDataset
+from features.excel_pair import lock_excel_pair, read_excel_pair, read_generation, write_excel_pair
+from features.patient_journal import EXCEL_COLUMNS, get_patient_journal, patient_fingerprint, patient_to_rows
+from utils.image_index import get_image_index
 
 # Obtener rutas de archivos Excel desde variables de entorno
 OD_EXCEL_FILE = os.environ.get('OD_EXCEL_FILE', 'patient_data_od.xlsx')
 OS_EXCEL_FILE = os.environ.get('OS_EXCEL_FILE', 'patient_data_os.xlsx')
 FUNDUS_IMAGES_DIR = os.environ.get('FUNDUS_IMAGES_DIR', 'FundusImages')
 
+# Almacenamiento de los pacientes: "excel" (archivos Excel y diario de cambios) o "sqlite"
+PATIENT_STORAGE = os.environ.get('PATIENT_STORAGE', 'excel')
+PATIENT_DB_FILE = os.environ.get('PATIENT_DB_FILE', 'patient_data.sqlite')
 
-def get_next_correlative_number(images_dir: str) -> int:
-    """
-    Obtiene el próximo número correlativo para imágenes de fondo de ojo.
-
-    Args:
-        images_dir: Directorio de imágenes de fondo de ojo
-
-    Returns:
-        Próximo número correlativo
-    """
-    # Verificar si el directorio existe
-    if not os.path.exists(images_dir):
-        os.makedirs(images_dir)
-        return 1
+# Carga diferida: los datos se guardan en columnas y los pacientes se crean al pedirlos
+LAZY_LOADING = os.environ.get('PATIENT_LAZY_LOADING', '0') == '1'
+# Pacientes materializados que conserva la carga diferida
+PATIENT_CACHE_SIZE = int(os.environ.get('PATIENT_CACHE_SIZE', 256))
 
-    # Obtener todos los archivos de imagen existentes
-    image_files = [f for f in os.listdir(images_dir) if f.startswith('RET') and f.endswith(('.jpg', '.jpeg', '.png'))]
+# Tipos de las columnas de los archivos Excel de pacientes
+EXCEL_DTYPES = {
+    'patient_id': str,  # Asegurar que patient_id sea string
+    'age': int,
+    'gender': int,
+    'diagnosis': int
+}
 
-    # Si no hay imágenes, comenzar desde 1
-    if not image_files:
-        return 1
-
-    # Extraer números de las imágenes existentes
-    existing_numbers = []
-    for filename in image_files:
-        try:
-            # Extraer el número entre 'RET' y 'O' (para OD/OS)
-            number = int(filename[3:filename.index('O')])
-            existing_numbers.append(number)
-        except (ValueError, IndexError):
-            continue
-
-    # Si no se extrajeron números, comenzar desde 1
-    if not existing_numbers:
-        return 1
-
-    # Devolver el siguiente número no utilizado
-    return max(existing_numbers) + 1
+# Versión del formato de la caché columnar (incrementar si cambia la estructura)
+CACHE_FORMAT_VERSION = 1
 
 
 def rename_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -82,269 +71,893 @@ def rename_columns(df: pd.DataFrame) -> pd.DataFrame:
     return renamed_df
 
 
-def clean_headers(df: pd.DataFrame) -> pd.DataFrame:
+def get_cache_path(excel_file: str) -> str:
+    """
+    Obtiene la ruta de la caché columnar asociada a un archivo Excel.
+
+    Args:
+        excel_file: Ruta del archivo Excel
+
+    Returns:
+        Ruta del archivo de caché, junto al Excel de origen
+    """
+    directory, filename = os.path.split(excel_file)
+    return os.path.join(directory, f".{filename}.cache.npz")
+
+
+def _file_sha256(path: str) -> str:
+    """
+    Calcula el hash SHA-256 del contenido de un archivo.
+
+    Args:
+        path: Ruta del archivo
+
+    Returns:
+        Hash hexadecimal del contenido
+    """
+    with open(path, 'rb') as f:
+        return _stream_sha256(f)
+
+
+def _stream_sha256(f) -> str:
+    """Calcula el hash SHA-256 de un archivo ya abierto, desde su posición actual."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _save_frame_cache(df: pd.DataFrame, cache_path: str, source_stat: os.stat_result, source_hash: str) -> None:
+    """
+    Guarda un DataFrame en formato columnar (un arreglo NumPy por columna).
+
+    Las columnas de texto se guardan como arreglos de tipo str con una máscara
+    de valores faltantes, de forma que la caché se lee sin pickle.
+
+    Args:
+        df: DataFrame a guardar
+        cache_path: Ruta del archivo de caché
+        source_stat: Resultado de os.stat del Excel de origen
+        source_hash: Hash SHA-256 del Excel de origen
+    """
+    arrays = {
+        'columns': np.array([str(col) for col in df.columns], dtype=str),
+        'source_meta': np.array([CACHE_FORMAT_VERSION, source_stat.st_mtime_ns, source_stat.st_size],
+                                dtype=np.int64),
+        'source_hash': np.array(source_hash),
+    }
+    for i, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            missing = pd.isna(values)
+            arrays[f"mask_{i}"] = missing
+            values = np.where(missing, '', values).astype(str)
+        arrays[f"col_{i}"] = values
+
+    # Escribir en un archivo temporal propio y reemplazar para no dejar cachés a medias,
+    # aunque otro proceso esté guardando la misma caché
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def _load_frame_cache(cache_path: str, source_stat: os.stat_result, excel_file: str) -> Optional[pd.DataFrame]:
     """
-    Limpia los encabezados del DataFrame.
+    Carga un DataFrame desde la caché columnar si sigue vigente.
+
+    La caché es válida si el tamaño del Excel no cambió y coincide su fecha de
+    modificación o, si esta cambió, el hash de su contenido.
 
     Args:
-        df: DataFrame a limpiar
+        cache_path: Ruta del archivo de caché
+        source_stat: Resultado de os.stat del Excel de origen
+        excel_file: Ruta del Excel de origen
+
     Returns:
-        DataFrame con encabezados limpios
+        DataFrame almacenado o None si la caché no existe o está desactualizada
     """
-    df.columns = df.columns.str.lower()
-    df.columns = df.columns.str.strip()
-    df = rename_columns(df)
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        with np.load(cache_path) as data:
+            version, mtime_ns, size = (int(v) for v in data['source_meta'])
+            if version != CACHE_FORMAT_VERSION or size != source_stat.st_size:
+                return None
+            if mtime_ns != source_stat.st_mtime_ns and str(data['source_hash']) != _file_sha256(excel_file):
+                return None
+
+            columns = {}
+            for i, col in enumerate(data['columns']):
+                values = data[f"col_{i}"]
+                if f"mask_{i}" in data.files:
+                    values = values.astype(object)
+                    values[data[f"mask_{i}"]] = np.nan
+                columns[str(col)] = values
+            return pd.DataFrame(columns)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Caché inválida en {cache_path}, se reconstruirá: {e}")
+        return None
+
+
+def read_patient_excel(excel_file: str, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Lee un archivo Excel de pacientes con los encabezados normalizados.
+
+    El resultado se guarda en una caché columnar junto al Excel, que se reutiliza
+    mientras el archivo de origen no cambie (tamaño, fecha de modificación o hash).
+
+    Args:
+        excel_file: Ruta del archivo Excel
+        use_cache: False para ignorar la caché y leer siempre el Excel
+
+    Returns:
+        DataFrame con los datos del archivo
+    """
+    cache_path = get_cache_path(excel_file)
+
+    # Fecha, tamaño, contenido y hash salen del mismo archivo abierto, aunque otro
+    # proceso lo reemplace mientras tanto
+    with open(excel_file, 'rb') as f:
+        source_stat = os.fstat(f.fileno())
+        if use_cache:
+            df = _load_frame_cache(cache_path, source_stat, excel_file)
+            if df is not None:
+                return df
+
+        df = pd.read_excel(f, header=0, dtype=EXCEL_DTYPES)
+        df.columns = df.columns.astype(str).str.lower().str.strip()
+        df = rename_columns(df)
+
+        if use_cache:
+            f.seek(0)
+            try:
+                _save_frame_cache(df, cache_path, source_stat, _stream_sha256(f))
+            except OSError as e:
+                print(f"No se pudo guardar la caché {cache_path}: {e}")
 
-    # Eliminar filas vacías o incompletas (asumiendo que la primera fila es duplicada de cabecera)
-    if len(df) > 0:
-        return df.drop(0)
     return df
 
 
-def generate_image_path(patient_id: str, eye_type: Eye) -> Optional[str]:
+def read_patient_excel_pair(od_excel_file: str, os_excel_file: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Lee los archivos Excel de OD y OS de una misma generación, restaurando antes el
+    par si una escritura quedó a medias (ver read_excel_pair).
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+
+    Returns:
+        Tupla (DataFrame OD, DataFrame OS) de la misma generación
+    """
+    od_df, os_df, _ = read_excel_pair(od_excel_file, os_excel_file, read_patient_excel)
+    return od_df, os_df
+
+
+def read_patient_frames(od_excel_file: str, os_excel_file: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Genera la ruta de la imagen del fondo de ojo basado en el ID del paciente y el tipo de ojo.
+    Lee los datos actuales de los pacientes: el par de archivos Excel con los cambios del diario aplicados.
 
     Args:
-        patient_id: ID del paciente
-        eye_type: Tipo de ojo (RIGHT o LEFT)
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
 
     Returns:
-        Ruta completa a la imagen o None si no existe
+        Tupla (DataFrame OD, DataFrame OS)
+    """
+    od_df, os_df = read_patient_excel_pair(od_excel_file, os_excel_file)
+    od_df, os_df, _ = get_patient_journal(od_excel_file).apply(od_df, os_df)
+    return od_df, os_df
+
+
+class ExcelPairSource:
+    """
+    Origen de datos de build_patient_dataset: el par de archivos Excel de pacientes.
+
+    Los archivos se leen con read_patient_excel_pair (caché columnar y par de la
+    misma generación) y, si journal es True, con los cambios del diario aplicados.
     """
-    print(f"\n--- DEPURACIÓN GENERATE_IMAGE_PATH ---")
-    print(f"ID original recibido: '{patient_id}', tipo: {type(patient_id)}")
-    print(f"Tipo de ojo: {eye_type}")
 
-    # Obtener sufijo basado en el tipo de ojo
-    suffix = "OD" if eye_type == Eye.RIGHT else "OS"
-    print(f"Sufijo: {suffix}")
+    def __init__(self, od_excel_file: str = None, os_excel_file: str = None, journal: bool = True):
+        self.od_excel_file = od_excel_file or OD_EXCEL_FILE
+        self.os_excel_file = os_excel_file or OS_EXCEL_FILE
+        self.journal = journal
 
-    # Limpiar ID (eliminar caracteres como #)
-    clean_id = str(patient_id).replace('#', '')
-    print(f"ID limpiado: '{clean_id}'")
+    def read_frames(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Lee los datos de los pacientes.
 
-    # Intentar con diferentes formatos de ID
-    possible_filenames = [
-        f"RET{clean_id}{suffix}.jpg",
-        f"RET{int(clean_id) if clean_id.isdigit() else clean_id}{suffix}.jpg"
-    ]
+        Returns:
+            Tupla (DataFrame OD, DataFrame OS) con las columnas de EXCEL_COLUMNS
+        """
+        if self.journal:
+            return read_patient_frames(self.od_excel_file, self.os_excel_file)
+        return read_patient_excel_pair(self.od_excel_file, self.os_excel_file)
 
-    for filename in possible_filenames:
-        filepath = os.path.join(FUNDUS_IMAGES_DIR, filename)
-        print(f"Buscando: {filepath}")
 
-        if os.path.exists(filepath):
-            print(f"ÉXITO: Se encontró el archivo {filepath}")
-            return filepath
+class FrameSource:
+    """Origen de datos de build_patient_dataset: DataFrames OD y OS ya leídos."""
 
-    # Si no se encuentra imagen existente, generar un nombre nuevo
-    new_filename = generate_correlative_image_filename(patient_id, eye_type, FUNDUS_IMAGES_DIR)
-    new_filepath = os.path.join(FUNDUS_IMAGES_DIR, new_filename)
-    print(f"Generando nuevo nombre de archivo: {new_filepath}")
+    def __init__(self, od_df: pd.DataFrame, os_df: pd.DataFrame):
+        self.od_df = od_df
+        self.os_df = os_df
 
-    return new_filepath
+    def read_frames(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        return self.od_df, self.os_df
 
 
-def load_patient_data(od_excel_file: str = None, os_excel_file: str = None) -> PapilaDataset:
+def iter_source_patients(source) -> Iterator[Patient]:
     """
-    Carga los datos de pacientes desde los archivos Excel.
+    Crea los pacientes de un origen de datos, sin imágenes.
+
+    Args:
+        source: Objeto con read_frames() -> (DataFrame OD, DataFrame OS), como ExcelPairSource o FrameSource
+
+    Returns:
+        Iterador de pacientes en el orden de OD, seguidos de los que solo están en OS
+
+    Raises:
+        ValueError: Si falta la edad o el género, o hay códigos fuera de los enumerados
     """
-    # Usar los valores de las variables de entorno si no se proporcionan parámetros
-    od_excel_file = od_excel_file or OD_EXCEL_FILE
-    os_excel_file = os_excel_file or OS_EXCEL_FILE
+    return _iter_patients(*source.read_frames())
 
-    dataset = PapilaDataset()
 
-    try:
-        # Cargar datos de OD
-        od_df = pd.read_excel(od_excel_file,
-                              header=0,  # Usar la primera fila como encabezado
-                              dtype={
-                                  'patient_id': str,  # Asegurar que patient_id sea string
-                                  'age': int,
-                                  'gender': int,
-                                  'diagnosis': int
-                              })
-
-        # Cargar datos de OS de manera similar
-        os_df = pd.read_excel(os_excel_file,
-                              header=0,
-                              dtype={
-                                  'patient_id': str,
-                                  'age': int,
-                                  'gender': int,
-                                  'diagnosis': int
-                              })
-
-        # Combinar IDs de pacientes
-        patient_ids = set(od_df['patient_id'].tolist() + os_df['patient_id'].tolist())
-
-        # Crear pacientes
-        for patient_id in patient_ids:
-            # Obtener datos OD
-            od_data = od_df[od_df['patient_id'] == patient_id]
-            # Obtener datos OS
-            os_data = os_df[os_df['patient_id'] == patient_id]
-
-            # Si hay datos del paciente
-            if not od_data.empty or not os_data.empty:
-                # Tomar la primera fila para datos generales (debería ser la misma en ambos archivos)
-                patient_row = od_data.iloc[0] if not od_data.empty else os_data.iloc[0]
-
-                # Crear paciente
-                patient = Patient(
-                    patient_id=str(patient_id),
-                    age=int(patient_row['age']),
-                    gender=Gender(int(patient_row['gender']))
-                )
-
-                # Agregar datos OD si existen
-                if not od_data.empty and not pd.isna(od_data.iloc[0]['diagnosis']):
-                    right_eye = _create_eye_data_from_row(od_data.iloc[0], Eye.RIGHT)
-                    patient.set_eye_data(right_eye)
-
-                # Agregar datos OS si existen
-                if not os_data.empty and not pd.isna(os_data.iloc[0]['diagnosis']):
-                    left_eye = _create_eye_data_from_row(os_data.iloc[0], Eye.LEFT)
-                    patient.set_eye_data(left_eye)
-
-                # Agregar paciente al dataset
-                dataset.add_patient(patient)
+def build_patient_dataset(source, lazy: bool = False, images_dir: str = None,
+                          cache_size: int = None):
+    """
+    Carga en un dataset los pacientes de un origen de datos.
+
+    Es la conversión de filas a pacientes común a la interfaz, el menú y la
+    importación a SQLite: una fila por ID (la primera), sin filas sin ID, ojos
+    sin diagnóstico omitidos, None donde falta una medición, y las imágenes
+    asignadas con una sola lectura del directorio.
+
+    Args:
+        source: Objeto con read_frames() -> (DataFrame OD, DataFrame OS), como ExcelPairSource o FrameSource
+        lazy: Si es True, devuelve un ColumnarPapilaDataset que crea los pacientes al pedirlos
+        images_dir: Directorio de imágenes de fondo de ojo (por defecto, FUNDUS_IMAGES_DIR)
+        cache_size: Pacientes creados que conserva la carga diferida (por defecto, PATIENT_CACHE_SIZE)
+
+    Returns:
+        PapilaDataset, o ColumnarPapilaDataset si lazy es True
 
+    Raises:
+        ValueError: Si falta la edad o el género, o hay códigos fuera de los enumerados
+    """
+    images_dir = images_dir or FUNDUS_IMAGES_DIR
+    cache_size = PATIENT_CACHE_SIZE if cache_size is None else cache_size
+    od_df, os_df = source.read_frames()
+
+    if lazy:
+        dataset = _build_columnar_dataset(od_df, os_df, cache_size)
+    else:
+        dataset = PapilaDataset()
+        _populate_dataset(dataset, od_df, os_df)
+
+    # Asignar las imágenes de fondo de ojo con una sola lectura del directorio
+    if os.path.isdir(images_dir):
+        if lazy:
+            # Cada paciente busca sus imágenes al crearse; el índice se construye mientras tanto
+            dataset.defer_images(images_dir)
+            threading.Thread(target=get_image_index(images_dir).refresh, name="image-index",
+                             daemon=True).start()
+        else:
+            dataset.load_images(images_dir)
+    return dataset
+
+
+def load_patient_data(od_excel_file: str = None, os_excel_file: str = None, lazy: bool = None):
+    """
+    Carga los datos de pacientes desde los archivos Excel.
+
+    Con carga diferida (lazy o PATIENT_LAZY_LOADING=1) los datos quedan en un
+    ColumnarPapilaDataset y los objetos Patient/EyeData solo se crean cuando se
+    piden, conservando los últimos PATIENT_CACHE_SIZE. Si la carga falla, se
+    informa del error y se devuelve un dataset vacío (ver build_patient_dataset).
+    """
+    lazy = LAZY_LOADING if lazy is None else lazy
+
+    try:
+        # Datos de OD y OS (desde la caché si los Excel no cambiaron) con los cambios
+        # registrados desde el último volcado a los Excel
+        return build_patient_dataset(ExcelPairSource(od_excel_file, os_excel_file), lazy)
     except Exception as e:
         print(f"Error al cargar datos: {e}")
+        return ColumnarPapilaDataset(cache_size=PATIENT_CACHE_SIZE) if lazy else PapilaDataset()
+
+
+def import_excel_to_database(dataset: SQLitePapilaDataset, od_excel_file: str = None,
+                             os_excel_file: str = None) -> int:
+    """
+    Importa a una base SQLite los pacientes de los archivos Excel en una sola transacción.
+
+    También se aplican los cambios del diario que aún no se exportaron a los Excel
+    y se asignan las imágenes de fondo de ojo de FUNDUS_IMAGES_DIR. La base guarda
+    la huella de las filas de cada paciente importado, con la que
+    export_database_to_excel reconoce lo que cambie después en los Excel.
+
+    Args:
+        dataset: Dataset SQLite de destino (los pacientes con el mismo ID se reemplazan)
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+
+    Returns:
+        Número de pacientes importados
+    """
+    patients = list(iter_source_patients(ExcelPairSource(od_excel_file, os_excel_file)))
+    if os.path.isdir(FUNDUS_IMAGES_DIR):
+        attach_fundus_images(patients, FUNDUS_IMAGES_DIR)
+    dataset.add_patients(patients)
+    dataset.save_excel_snapshot({patient.patient_id: patient_fingerprint(patient) for patient in patients})
+    return len(patients)
+
+
+def load_patient_database(db_file: str = None, od_excel_file: str = None,
+                          os_excel_file: str = None) -> SQLitePapilaDataset:
+    """
+    Abre la base SQLite de pacientes; si está vacía, importa primero los archivos Excel.
+
+    Args:
+        db_file: Ruta de la base de datos
+        od_excel_file: Ruta del archivo Excel de OD (para la importación inicial)
+        os_excel_file: Ruta del archivo Excel de OS (para la importación inicial)
+
+    Returns:
+        Dataset respaldado por la base de datos
+    """
+    dataset = SQLitePapilaDataset(db_file or PATIENT_DB_FILE)
+
+    if not len(dataset):
+        try:
+            imported = import_excel_to_database(dataset, od_excel_file, os_excel_file)
+            print(f"Se importaron {imported} pacientes de los archivos Excel a {dataset.db_file}")
+        except Exception as e:
+            print(f"Error al importar los archivos Excel: {e}")
 
     return dataset
 
 
-def _create_eye_data_from_row(row, eye_type: Eye) -> EyeData:
+def load_patients(od_excel_file: str = None, os_excel_file: str = None, storage: str = None):
+    """
+    Carga los pacientes con el almacenamiento configurado en PATIENT_STORAGE.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+        storage: "excel" o "sqlite" (por defecto, PATIENT_STORAGE)
+
+    Returns:
+        PapilaDataset cargado de los Excel o SQLitePapilaDataset
+    """
+    storage = storage or PATIENT_STORAGE
+    if storage == 'sqlite':
+        return load_patient_database(PATIENT_DB_FILE, od_excel_file, os_excel_file)
+    if storage != 'excel':
+        raise ValueError(f"Almacenamiento desconocido: {storage} (use excel o sqlite)")
+    return load_patient_data(od_excel_file, os_excel_file)
+
+
+def _first_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deja una fila por ID de paciente.
+
+    Args:
+        df: DataFrame con la columna patient_id
+
+    Returns:
+        DataFrame sin IDs vacíos; si un ID aparece varias veces se conserva la
+        primera fila, igual que con iloc[0]
+    """
+    return df[df['patient_id'].notna()].drop_duplicates(subset='patient_id', keep='first')
+
+
+def _optional_floats(values: np.ndarray) -> list:
+    """Convierte un arreglo de floats en una lista de float de Python, con None en lugar de NaN."""
+    missing = np.isnan(values)
+    if not missing.any():
+        return values.tolist()
+    values = values.astype(object)
+    values[missing] = None
+    return values.tolist()
+
+
+def _enum_members(codes: np.ndarray, enum_type, column: str) -> list:
+    """Convierte códigos enteros en miembros del enumerado, con los mismos errores que enum_type(código)."""
+    _check_codes(codes, enum_type, column)
+    members = {member.value: member for member in enum_type}
+    return [members[code] for code in codes.tolist()]
+
+
+def _build_eye_records(df: pd.DataFrame, eye_type: Eye) -> Dict[str, EyeData]:
     """
-    Crea un objeto EyeData a partir de una fila del DataFrame.
+    Crea los EyeData de todas las filas de un DataFrame de una sola vez.
+
+    Cada columna se convierte una vez en un arreglo NumPy tipado y en una lista
+    de valores de Python (None donde falta el dato); los EyeData se crean luego
+    recorriendo esas listas, sin indexar una fila de pandas por campo. Las
+    filas sin diagnóstico no tienen ojo.
+
+    Args:
+        df: DataFrame con una fila por paciente (ver _first_rows)
+        eye_type: Ojo de las filas
+
+    Returns:
+        Diccionario ID de paciente -> datos del ojo
+
+    Raises:
+        ValueError: Si hay valores no numéricos o códigos fuera de los enumerados
     """
-    # Crear objeto RefractiveError si existe el valor de esfera
-    refractive_error = None
-    if not pd.isna(row['sphere']):
-        refractive_error = RefractiveError(
-            sphere=float(row['sphere']),
-            cylinder=float(row['cylinder']) if not pd.isna(row['cylinder']) else None,
-            axis=float(row['axis']) if not pd.isna(row['axis']) else None
+    diagnosis = df['diagnosis'].to_numpy(dtype=float)
+    df = df[~np.isnan(diagnosis)]
+    if df.empty:
+        return {}
+
+    patient_ids = df['patient_id'].astype(str).tolist()
+    diagnoses = _enum_members(df['diagnosis'].to_numpy(dtype=float).astype(int), DiagnosisStatus, 'diagnosis')
+
+    crystalline = df['crystalline_status'].to_numpy(dtype=float)
+    has_crystalline = ~np.isnan(crystalline)
+    crystalline_members = iter(_enum_members(crystalline[has_crystalline].astype(int), CrystallineStatus,
+                                             'crystalline_status'))
+    crystalline_statuses = [next(crystalline_members) if present else None for present in has_crystalline.tolist()]
+
+    float_columns = [_optional_floats(df[field].to_numpy(dtype=float)) for field in EYE_FLOAT_FIELDS]
+
+    records = {}
+    for (patient_id, diagnosis, crystalline_status, sphere, cylinder, axis,
+         pneumatic_iop, perkins_iop, pachymetry, axial_length, mean_defect) in zip(
+            patient_ids, diagnoses, crystalline_statuses, *float_columns):
+        records[patient_id] = EyeData(
+            eye_type=eye_type,
+            diagnosis=diagnosis,
+            refractive_error=RefractiveError(sphere=sphere, cylinder=cylinder, axis=axis)
+            if sphere is not None else None,
+            crystalline_status=crystalline_status,
+            pneumatic_iop=pneumatic_iop,
+            perkins_iop=perkins_iop,
+            pachymetry=pachymetry,
+            axial_length=axial_length,
+            mean_defect=mean_defect
         )
+    return records
 
-    # Crear objeto EyeData
-    eye_data = EyeData(
-        eye_type=eye_type,
-        diagnosis=DiagnosisStatus(int(row['diagnosis'])),
-        refractive_error=refractive_error,
-        crystalline_status=CrystallineStatus(int(row['crystalline_status'])) if not pd.isna(
-            row['crystalline_status']) else None,
-        pneumatic_iop=float(row['pneumatic_iop']) if not pd.isna(row['pneumatic_iop']) else None,
-        perkins_iop=float(row['perkins_iop']) if not pd.isna(row['perkins_iop']) else None,
-        pachymetry=float(row['pachymetry']) if not pd.isna(row['pachymetry']) else None,
-        axial_length=float(row['axial_length']) if not pd.isna(row['axial_length']) else None,
-        mean_defect=float(row['mean_defect']) if not pd.isna(row['mean_defect']) else None
-    )
-
-    # Intentar agregar imagen de fondo de ojo
-    image_path = generate_image_path(str(row['patient_id']), eye_type)
-    if os.path.exists(image_path):
-        try:
-            eye_data.add_fundus_image(image_path)
-        except FileNotFoundError:
-            print(f"No se pudo encontrar la imagen en: {image_path}")
 
-    return eye_data
+def _demographics(df: pd.DataFrame) -> Dict[str, tuple]:
+    """
+    Extrae la edad y el género de cada paciente de un DataFrame.
 
+    Args:
+        df: DataFrame con una fila por paciente (ver _first_rows)
 
-def update_excel_files(patient: Patient, edit_mode: bool) -> None:
+    Returns:
+        Diccionario ID de paciente -> (edad, Gender), en el orden del DataFrame
+
+    Raises:
+        ValueError: Si falta la edad o el género, o el código de género no existe
     """
-    Actualiza los archivos Excel con los datos del paciente.
+    columns = []
+    for field in ('age', 'gender'):
+        values = df[field].to_numpy(dtype=float)
+        if np.isnan(values).any():
+            raise ValueError(f"Faltan valores de {field}")
+        columns.append(values.astype(int))
+    genders = _enum_members(columns[1], Gender, 'gender')
+    return dict(zip(df['patient_id'].astype(str).tolist(), zip(columns[0].tolist(), genders)))
+
+
+def _iter_patients(od_df: pd.DataFrame, os_df: pd.DataFrame) -> Iterator[Patient]:
+    """
+    Crea los pacientes a partir de los DataFrames OD y OS.
+
+    Los DataFrames se reducen a una fila por patient_id y sus columnas se
+    convierten de una vez (ver _build_eye_records), de modo que la unión OD/OS
+    es lineal en el número de filas y no hay accesos a filas de pandas por campo.
 
     Args:
-        patient: Paciente a actualizar
-        edit_mode: True si es una edición, False si es un nuevo paciente
+        od_df: DataFrame con los datos del ojo derecho
+        os_df: DataFrame con los datos del ojo izquierdo
+
+    Returns:
+        Iterador de pacientes en el orden de OD, seguidos de los que solo están en OS
     """
-    # Obtener rutas de archivos Excel desde variables de entorno
-    od_excel_file = os.environ.get('OD_EXCEL_FILE', 'patient_data_od.xlsx')
-    os_excel_file = os.environ.get('OS_EXCEL_FILE', 'patient_data_os.xlsx')
+    od_df = _first_rows(od_df)
+    os_df = _first_rows(os_df)
+    od_eyes = _build_eye_records(od_df, Eye.RIGHT)
+    os_eyes = _build_eye_records(os_df, Eye.LEFT)
+
+    # IDs en el orden de OD seguidos de los que solo aparecen en OS; los datos
+    # generales salen de la fila OD si existe (deberían coincidir en ambos archivos)
+    demographics = _demographics(od_df)
+    demographics.update(_demographics(os_df[~os_df['patient_id'].isin(od_df['patient_id'])]))
+
+    for patient_id, (age, gender) in demographics.items():
+        yield Patient(
+            patient_id=patient_id,
+            age=age,
+            gender=gender,
+            right_eye=od_eyes.get(patient_id),
+            left_eye=os_eyes.get(patient_id)
+        )
 
-    try:
-        # Actualizar OD
-        od_df = pd.read_excel(od_excel_file)
-        od_df = clean_headers(od_df)
-        od_data = {
-            'patient_id': patient.patient_id,
-            'age': patient.age,
-            'gender': patient.gender.value,
-            'diagnosis': patient.right_eye.diagnosis.value if patient.right_eye else "",
-            'sphere': patient.right_eye.refractive_error.sphere if patient.right_eye and patient.right_eye.refractive_error else "",
-            'cylinder': patient.right_eye.refractive_error.cylinder if patient.right_eye and patient.right_eye.refractive_error and patient.right_eye.refractive_error.cylinder is not None else "",
-            'axis': patient.right_eye.refractive_error.axis if patient.right_eye and patient.right_eye.refractive_error and patient.right_eye.refractive_error.axis is not None else "",
-            'crystalline_status': patient.right_eye.crystalline_status.value if patient.right_eye and patient.right_eye.crystalline_status else "",
-            'pneumatic_iop': patient.right_eye.pneumatic_iop if patient.right_eye and patient.right_eye.pneumatic_iop is not None else "",
-            'perkins_iop': patient.right_eye.perkins_iop if patient.right_eye and patient.right_eye.perkins_iop is not None else "",
-            'pachymetry': patient.right_eye.pachymetry if patient.right_eye and patient.right_eye.pachymetry is not None else "",
-            'axial_length': patient.right_eye.axial_length if patient.right_eye and patient.right_eye.axial_length is not None else "",
-            'mean_defect': patient.right_eye.mean_defect if patient.right_eye and patient.right_eye.mean_defect is not None else "",
-        }
-
-        if edit_mode:
-            od_df = od_df[od_df['patient_id'] != patient.patient_id]
-        od_df = pd.concat([od_df, pd.DataFrame([od_data])], ignore_index=True)
-        od_df.to_excel(od_excel_file, index=False)
-
-        # Actualizar OS
-        os_df = pd.read_excel(os_excel_file)
-        os_df = clean_headers(os_df)
-        os_data = {
-            'patient_id': patient.patient_id,
-            'age': patient.age,
-            'gender': patient.gender.value,
-            'diagnosis': patient.left_eye.diagnosis.value if patient.left_eye else "",
-            'sphere': patient.left_eye.refractive_error.sphere if patient.left_eye and patient.left_eye.refractive_error else "",
-            'cylinder': patient.left_eye.refractive_error.cylinder if patient.left_eye and patient.left_eye.refractive_error and patient.left_eye.refractive_error.cylinder is not None else "",
-            'axis': patient.left_eye.refractive_error.axis if patient.left_eye and patient.left_eye.refractive_error and patient.left_eye.refractive_error.axis is not None else "",
-            'crystalline_status': patient.left_eye.crystalline_status.value if patient.left_eye and patient.left_eye.crystalline_status else "",
-            'pneumatic_iop': patient.left_eye.pneumatic_iop if patient.left_eye and patient.left_eye.pneumatic_iop is not None else "",
-            'perkins_iop': patient.left_eye.perkins_iop if patient.left_eye and patient.left_eye.perkins_iop is not None else "",
-            'pachymetry': patient.left_eye.pachymetry if patient.left_eye and patient.left_eye.pachymetry is not None else "",
-            'axial_length': patient.left_eye.axial_length if patient.left_eye and patient.left_eye.axial_length is not None else "",
-            'mean_defect': patient.left_eye.mean_defect if patient.left_eye and patient.left_eye.mean_defect is not None else "",
-        }
-
-        if edit_mode:
-            os_df = os_df[os_df['patient_id'] != patient.patient_id]
-        os_df = pd.concat([os_df, pd.DataFrame([os_data])], ignore_index=True)
-        os_df.to_excel(os_excel_file, index=False)
 
-    except Exception as e:
-        print(f"Error al actualizar archivos Excel: {e}")
-        # Manejar el error según sea necesario
+def _populate_dataset(dataset: PapilaDataset, od_df: pd.DataFrame, os_df: pd.DataFrame) -> None:
+    """
+    Crea los pacientes a partir de los DataFrames OD y OS y los añade al dataset.
+
+    Args:
+        dataset: Dataset donde se añadirán los pacientes
+        od_df: DataFrame con los datos del ojo derecho
+        os_df: DataFrame con los datos del ojo izquierdo
+    """
+    for patient in _iter_patients(od_df, os_df):
+        dataset.add_patient(patient)
+
 
+def _check_codes(values: np.ndarray, enum_type, column: str) -> None:
+    """Comprueba que los códigos de una columna existen en el enumerado, como haría enum_type(valor)."""
+    invalid = values[~np.isin(values, [member.value for member in enum_type])]
+    if len(invalid):
+        raise ValueError(f"{invalid[0]} no es un valor válido de {column}")
 
-def delete_from_excel(patient_id: str) -> None:
+
+def _build_columnar_dataset(od_df: pd.DataFrame, os_df: pd.DataFrame,
+                            cache_size: int = PATIENT_CACHE_SIZE) -> ColumnarPapilaDataset:
     """
-    Elimina un paciente de los archivos Excel.
+    Crea un ColumnarPapilaDataset a partir de los DataFrames OD y OS sin crear objetos Patient.
+
+    La unión por patient_id se hace con operaciones vectorizadas y sigue las
+    mismas reglas que _iter_patients: primera fila de cada ID, pacientes en el
+    orden de OD seguidos de los que solo están en OS, edad y género de la fila
+    OD si existe, y ojos presentes solo si tienen diagnóstico.
 
     Args:
-        patient_id: ID del paciente a eliminar
+        od_df: DataFrame con los datos del ojo derecho
+        os_df: DataFrame con los datos del ojo izquierdo
+        cache_size: Tamaño de la caché de pacientes materializados
+
+    Returns:
+        Dataset columnar con los pacientes
+
+    Raises:
+        ValueError: Si hay valores no numéricos o códigos fuera de los enumerados
+    """
+    frames = {}
+    for eye_type, df in ((Eye.RIGHT, od_df), (Eye.LEFT, os_df)):
+        df = _first_rows(df)
+        frames[eye_type] = df.set_index(df['patient_id'].astype(str))
+
+    od_ids = frames[Eye.RIGHT].index
+    os_ids = frames[Eye.LEFT].index
+    patient_ids = od_ids.append(os_ids[~os_ids.isin(od_ids)])
+
+    columns = {}
+    has_od_row = patient_ids.isin(od_ids)
+    for field in ('age', 'gender'):
+        od_values = frames[Eye.RIGHT][field].reindex(patient_ids).to_numpy(dtype=float)
+        os_values = frames[Eye.LEFT][field].reindex(patient_ids).to_numpy(dtype=float)
+        values = np.where(has_od_row, od_values, os_values)
+        if np.isnan(values).any():
+            raise ValueError(f"Faltan valores de {field}")
+        columns[field] = values.astype(int)
+    _check_codes(columns['gender'], Gender, 'gender')
+
+    for eye_type, prefix in EYE_PREFIXES.items():
+        df = frames[eye_type].reindex(patient_ids)
+        diagnosis = df['diagnosis'].to_numpy(dtype=float)
+        present = ~np.isnan(diagnosis)
+        columns[f"{prefix}_present"] = present
+
+        codes = np.where(present, diagnosis, MISSING_CODE).astype(int)
+        _check_codes(codes[present], DiagnosisStatus, 'diagnosis')
+        columns[f"{prefix}_diagnosis"] = codes
+
+        crystalline = df['crystalline_status'].to_numpy(dtype=float)
+        has_crystalline = present & ~np.isnan(crystalline)
+        codes = np.where(has_crystalline, crystalline, MISSING_CODE).astype(int)
+        _check_codes(codes[has_crystalline], CrystallineStatus, 'crystalline_status')
+        columns[f"{prefix}_crystalline_status"] = codes
+
+        values = {field: np.where(present, df[field].to_numpy(dtype=float), np.nan) for field in EYE_FLOAT_FIELDS}
+        # Sin esfera no hay error refractivo, así que cilindro y eje no se conservan
+        for field in ('cylinder', 'axis'):
+            values[field][np.isnan(values['sphere'])] = np.nan
+        for field, field_values in values.items():
+            columns[f"{prefix}_{field}"] = field_values
+
+    return ColumnarPapilaDataset.from_columns(patient_ids, columns, cache_size)
+
+
+def frame_fingerprints(od_df: pd.DataFrame, os_df: pd.DataFrame, patient_ids: Iterable[str]) -> Dict[str, str]:
     """
-    # Obtener rutas de archivos Excel desde variables de entorno
-    od_excel_file = os.environ.get('OD_EXCEL_FILE', 'patient_data_od.xlsx')
-    os_excel_file = os.environ.get('OS_EXCEL_FILE', 'patient_data_os.xlsx')
+    Calcula la huella (patient_fingerprint) de algunos pacientes de los DataFrames OD y OS.
 
-    try:
-        # Eliminar de OD
-        od_df = pd.read_excel(od_excel_file)
-        od_df = clean_headers(od_df)
-        od_df = od_df[od_df['patient_id'] != patient_id]
-        od_df.to_excel(od_excel_file, index=False)
-
-        # Eliminar de OS
-        os_df = pd.read_excel(os_excel_file)
-        os_df = clean_headers(os_df)
-        os_df = os_df[os_df['patient_id'] != patient_id]
-        os_df.to_excel(os_excel_file, index=False)
+    Los pacientes se crean con la misma conversión que la carga, así que la
+    huella coincide con la del paciente que tiene cargado una ventana o el menú.
 
-    except Exception as e:
-        print(f"Error al eliminar paciente de archivos Excel: {e}")
+    Args:
+        od_df: DataFrame con los datos del ojo derecho
+        os_df: DataFrame con los datos del ojo izquierdo
+        patient_ids: IDs de los pacientes
+
+    Returns:
+        Diccionario ID -> huella; la de None para los IDs que no están
+    """
+    patient_ids = set(patient_ids)
+    fingerprints = dict.fromkeys(patient_ids, patient_fingerprint(None))
+    for patient in _iter_patients(od_df[od_df['patient_id'].isin(patient_ids)],
+                                  os_df[os_df['patient_id'].isin(patient_ids)]):
+        fingerprints[patient.patient_id] = patient_fingerprint(patient)
+    return fingerprints
+
+
+class _ExcelFingerprints:
+    """
+    Huellas de los pacientes de una versión del par de archivos Excel.
+
+    Guarda los DataFrames leídos y las filas de cada ID, así que cada guardado
+    con base solo convierte las filas de sus pacientes en lugar de volver a
+    leer los dos archivos y recorrerlos completos (ver record_patient_changes).
+    """
+
+    def __init__(self, version: tuple, od_df: pd.DataFrame, os_df: pd.DataFrame):
+        self.version = version
+        self._frames = (od_df, os_df)
+        self._rows = tuple(df.groupby('patient_id', sort=False).indices for df in self._frames)
+        self._fingerprints: Dict[str, str] = {}
+
+    def get(self, patient_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Devuelve la huella de algunos pacientes, calculando solo las que faltan.
+
+        Args:
+            patient_ids: IDs de los pacientes
+
+        Returns:
+            Diccionario ID -> huella; la de None para los IDs que no están
+        """
+        patient_ids = set(patient_ids)
+        missing = [patient_id for patient_id in patient_ids if patient_id not in self._fingerprints]
+        if missing:
+            frames = []
+            for df, rows in zip(self._frames, self._rows):
+                positions = [rows[patient_id] for patient_id in missing if patient_id in rows]
+                frames.append(df.iloc[np.sort(np.concatenate(positions))] if positions else df.iloc[:0])
+            self._fingerprints.update(frame_fingerprints(*frames, missing))
+        return {patient_id: self._fingerprints[patient_id] for patient_id in patient_ids}
+
+
+_excel_fingerprints: Dict[Tuple[str, str], _ExcelFingerprints] = {}
+_excel_fingerprints_lock = threading.Lock()
+
+
+def _excel_pair_version(od_excel_file: str, os_excel_file: str) -> tuple:
+    """Marcador de generación del par y fecha y tamaño de los dos archivos (cambian también al editarlos a mano)."""
+    stats = [os.stat(excel_file) for excel_file in (od_excel_file, os_excel_file)]
+    return read_generation(od_excel_file), tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+
+
+def excel_pair_fingerprints(od_excel_file: str, os_excel_file: str, patient_ids: Iterable[str]) -> Dict[str, str]:
+    """
+    Calcula la huella de algunos pacientes tal como están en los archivos Excel.
+
+    Los archivos solo se leen cuando cambia su versión (el marcador de
+    generación o la fecha o el tamaño de alguno); mientras tanto se reutilizan
+    los DataFrames y las huellas ya calculadas.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+        patient_ids: IDs de los pacientes
+
+    Returns:
+        Diccionario ID -> huella; la de None para los IDs que no están
+    """
+    key = (os.path.abspath(od_excel_file), os.path.abspath(os_excel_file))
+    version = _excel_pair_version(od_excel_file, os_excel_file)
+    with _excel_fingerprints_lock:
+        cached = _excel_fingerprints.get(key)
+        if cached is None or cached.version != version:
+            cached = _ExcelFingerprints(version, *read_patient_excel_pair(od_excel_file, os_excel_file))
+            # Si el par cambió durante la lectura, las huellas sirven para esta llamada pero no se guardan
+            if _excel_pair_version(od_excel_file, os_excel_file) == version:
+                _excel_fingerprints[key] = cached
+        return cached.get(patient_ids)
+
+
+def save_patient_record(patient: Patient, od_excel_file: str = None, os_excel_file: str = None,
+                        base: Optional[str] = None) -> None:
+    """
+    Registra el alta o la edición de un paciente en el diario de cambios.
+
+    Los archivos Excel no se reescriben: el cambio se aplica al cargar los datos
+    y se vuelca a los Excel con compact_journal.
+
+    Args:
+        patient: Paciente con los datos actuales
+        od_excel_file: Ruta del archivo Excel de OD (identifica el diario)
+        os_excel_file: Ruta del archivo Excel de OS
+        base: Huella del paciente antes de editarlo (ver record_patient_changes)
+
+    Raises:
+        RuntimeError: Si el paciente cambió desde que se leyó
+    """
+    if record_patient_changes({patient.patient_id: patient_to_rows(patient)}, od_excel_file, os_excel_file,
+                              {patient.patient_id: base} if base is not None else None):
+        raise RuntimeError(f"El paciente {patient.patient_id} cambió desde que se leyó; no se guardó el cambio")
+
+
+def delete_patient_record(patient_id: str, od_excel_file: str = None, os_excel_file: str = None,
+                          base: Optional[str] = None) -> None:
+    """
+    Registra la baja de un paciente en el diario de cambios.
+
+    Args:
+        patient_id: ID del paciente eliminado
+        od_excel_file: Ruta del archivo Excel de OD (identifica el diario)
+        os_excel_file: Ruta del archivo Excel de OS
+        base: Huella del paciente antes de eliminarlo (ver record_patient_changes)
+
+    Raises:
+        RuntimeError: Si el paciente cambió desde que se leyó
+    """
+    if record_patient_changes({patient_id: None}, od_excel_file, os_excel_file,
+                              {patient_id: base} if base is not None else None):
+        raise RuntimeError(f"El paciente {patient_id} cambió desde que se leyó; no se eliminó")
+
+
+def record_patient_changes(changes: Dict[str, Optional[Tuple[Optional[dict], Optional[dict]]]],
+                           od_excel_file: str = None, os_excel_file: str = None,
+                           bases: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    Registra en el diario varios cambios a la vez, en una sola transacción.
+
+    Los cambios con base solo se registran si el paciente guardado (el del
+    diario o, si no tiene cambios en él, el de los Excel) sigue teniendo esa
+    huella. Se hace con el bloqueo del par, así que compact_journal no puede
+    volcar el diario y cambiar los Excel durante la comprobación. Las huellas
+    de los Excel salen de excel_pair_fingerprints, que solo vuelve a leer los
+    archivos cuando cambian.
+
+    Args:
+        changes: Diccionario ID -> (fila OD, fila OS) de patient_to_rows, o None para una baja
+        od_excel_file: Ruta del archivo Excel de OD (identifica el diario)
+        os_excel_file: Ruta del archivo Excel de OS
+        bases: Diccionario ID -> huella del paciente en que se basó cada cambio
+            (patient_fingerprint antes de editarlo, o de None para un alta)
+
+    Returns:
+        IDs de los cambios rechazados porque otro escritor cambió antes al paciente
+    """
+    od_excel_file = od_excel_file or OD_EXCEL_FILE
+    os_excel_file = os_excel_file or OS_EXCEL_FILE
+
+    def excel_fingerprints(patient_ids: List[str]) -> Dict[str, str]:
+        if not os.path.exists(od_excel_file) or not os.path.exists(os_excel_file):
+            return {}
+        return excel_pair_fingerprints(od_excel_file, os_excel_file, patient_ids)
+
+    journal = get_patient_journal(od_excel_file)
+    if not bases:
+        return journal.record_changes(changes)
+    with lock_excel_pair(od_excel_file):
+        return journal.record_changes(changes, bases, excel_fingerprints)
+
+
+def compact_journal(od_excel_file: str = None, os_excel_file: str = None) -> int:
+    """
+    Vuelca los cambios del diario a los archivos Excel y vacía el diario.
+
+    Es la única operación que reescribe los Excel completos. Los dos archivos se
+    escriben como una transacción (write_excel_pair): si se interrumpe, el par
+    anterior se restaura al leerlo y el diario, que solo se vacía al terminar,
+    se vuelve a aplicar sin duplicar filas. La lectura, la escritura y el
+    vaciado se hacen con el bloqueo del par, así que dos procesos que exportan
+    a la vez no se pisan; los cambios que otros registran mientras tanto
+    quedan en el diario para la siguiente exportación.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+
+    Returns:
+        Número de cambios volcados
+    """
+    od_excel_file = od_excel_file or OD_EXCEL_FILE
+    os_excel_file = os_excel_file or OS_EXCEL_FILE
+
+    journal = get_patient_journal(od_excel_file)
+    with lock_excel_pair(od_excel_file):
+        # Contar con el bloqueo tomado: otro proceso pudo exportar mientras se esperaba
+        pending = len(journal)
+        if not pending:
+            return 0
+
+        od_df, os_df, last_seq = journal.apply(*read_patient_excel_pair(od_excel_file, os_excel_file))
+        write_excel_pair(od_df, os_df, od_excel_file, os_excel_file)
+        journal.clear(last_seq)
+    return pending
+
+
+def export_database_to_excel(dataset: SQLitePapilaDataset, od_excel_file: str = None,
+                             os_excel_file: str = None) -> int:
+    """
+    Escribe en los archivos Excel todos los pacientes de una base SQLite.
+
+    Antes se incorporan a la base los cambios que se hicieron en los Excel desde
+    la importación o la última exportación (ediciones guardadas en el diario por
+    otras sesiones, volcados y guardados del menú). Para reconocerlos, la base
+    guarda la huella de las filas de Excel de cada paciente en ese momento: un
+    paciente que solo cambió en los Excel se copia a la base; si cambió de forma
+    distinta en la base y en los Excel, no se exporta nada. Después el diario se
+    vacía hasta el último cambio leído. Todo se hace con el bloqueo del par, así
+    que nadie escribe los Excel entre la lectura y la escritura; los cambios que
+    otros registren mientras tanto en el diario se conservan y la siguiente
+    exportación los incorpora.
+
+    Args:
+        dataset: Dataset SQLite de origen
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+
+    Returns:
+        Número de pacientes exportados
+
+    Raises:
+        RuntimeError: Si algún paciente cambió de forma distinta en la base y en los Excel
+    """
+    od_excel_file = od_excel_file or OD_EXCEL_FILE
+    os_excel_file = os_excel_file or OS_EXCEL_FILE
+
+    journal = get_patient_journal(od_excel_file)
+    with lock_excel_pair(od_excel_file):
+        od_df, os_df, last_seq = journal.apply(*read_patient_excel_pair(od_excel_file, os_excel_file))
+        excel_patients = {patient.patient_id: patient for patient in _iter_patients(od_df, os_df)}
+        excel = {patient_id: patient_fingerprint(patient) for patient_id, patient in excel_patients.items()}
+        database = {patient.patient_id: patient_fingerprint(patient) for patient in dataset.patients.values()}
+        snapshot = dataset.excel_snapshot()
+        if not snapshot and database:
+            # Base sin huellas (cargada de CSV o importada sin ellas): manda la base, como antes
+            snapshot = dict(excel)
+
+        incoming, removed, conflicts = [], [], []
+        for patient_id in {**excel, **database, **snapshot}:
+            base, excel_value, database_value = (snapshot.get(patient_id), excel.get(patient_id),
+                                                 database.get(patient_id))
+            if excel_value == base or excel_value == database_value:
+                continue
+            if database_value != base:
+                conflicts.append(patient_id)
+            elif excel_value is None:
+                removed.append(patient_id)
+            else:
+                incoming.append(excel_patients[patient_id])
+
+        if conflicts:
+            raise RuntimeError(f"{len(conflicts)} pacientes cambiaron en la base y en los archivos Excel desde "
+                               f"la última exportación: {', '.join(conflicts[:10])}")
+        if incoming or removed:
+            print(f"Se incorporan a la base {len(incoming)} pacientes modificados y {len(removed)} eliminados "
+                  f"en los archivos Excel")
+            if incoming and os.path.isdir(FUNDUS_IMAGES_DIR):
+                attach_fundus_images(incoming, FUNDUS_IMAGES_DIR)
+            dataset.add_patients(incoming)
+            for patient_id in removed:
+                dataset.remove_patient(patient_id)
+
+        patients = dataset.patients.values()
+        od_rows, os_rows = [], []
+        for patient in patients:
+            od_row, os_row = patient_to_rows(patient)
+            if od_row is not None:
+                od_rows.append(od_row)
+            if os_row is not None:
+                os_rows.append(os_row)
+
+        write_excel_pair(pd.DataFrame(od_rows, columns=EXCEL_COLUMNS),
+                         pd.DataFrame(os_rows, columns=EXCEL_COLUMNS), od_excel_file, os_excel_file)
+        dataset.save_excel_snapshot({patient.patient_id: patient_fingerprint(patient) for patient in patients},
+                                    replace=True)
+        journal.clear(last_seq)
+    return len(patients)
@@ -0,0 +1,265 @@
+import json
+import os
+import shutil
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+
+from utils.file_lock import FileLock, get_file_lock
+
+# Estados del marcador de generación
+STATE_PENDING = "pending"
+STATE_COMMITTED = "committed"
+
+# Lecturas sin bloqueo que se intentan antes de leer con el bloqueo tomado
+READ_ATTEMPTS = 5
+
+
+def get_generation_path(od_excel_file: str) -> str:
+    """
+    Obtiene la ruta del marcador de generación de un par de archivos Excel.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+
+    Returns:
+        Archivo oculto junto al Excel de OD
+    """
+    directory, filename = os.path.split(od_excel_file)
+    return os.path.join(directory, f".{filename}.generation.json")
+
+
+def lock_excel_pair(od_excel_file: str) -> FileLock:
+    """
+    Obtiene el bloqueo entre procesos de un par de archivos Excel.
+
+    Lo toman write_excel_pair y recover_excel_pair; quien lee, modifica y vuelve
+    a escribir el par (como compact_journal) debe tenerlo durante todo el ciclo
+    para no perder los cambios de otro proceso. Es reentrante en el mismo hilo.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+
+    Returns:
+        FileLock sobre un archivo oculto junto al Excel de OD (usar con with)
+    """
+    directory, filename = os.path.split(od_excel_file)
+    return get_file_lock(os.path.join(directory, f".{filename}.lock"))
+
+
+def _temp_path(excel_file: str) -> str:
+    root, extension = os.path.splitext(excel_file)
+    return f"{root}.tmp{extension}"
+
+
+def _backup_path(excel_file: str) -> str:
+    directory, filename = os.path.split(excel_file)
+    return os.path.join(directory, f".{filename}.prev")
+
+
+def _fsync_file(path: str) -> None:
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_directory(directory: str) -> None:
+    """Asegura en disco los renombrados de un directorio (no disponible en Windows)."""
+    try:
+        fd = os.open(directory or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def read_generation(od_excel_file: str) -> Tuple[int, str]:
+    """
+    Lee el marcador de generación de un par de archivos Excel.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+
+    Returns:
+        Tupla (generación, estado); (0, "committed") si el par nunca se escribió con write_excel_pair
+    """
+    try:
+        with open(get_generation_path(od_excel_file), encoding='utf-8') as f:
+            marker = json.load(f)
+        return int(marker["generation"]), marker["state"]
+    except FileNotFoundError:
+        return 0, STATE_COMMITTED
+
+
+def _write_marker(od_excel_file: str, generation: int, state: str, existed: Tuple[bool, bool] = (True, True)) -> None:
+    """Reemplaza el marcador de generación de forma atómica y lo asegura en disco."""
+    path = get_generation_path(od_excel_file)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"generation": generation, "state": state, "existed": list(existed)}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(os.path.dirname(path))
+
+
+def _backup(excel_file: str) -> bool:
+    """
+    Conserva la versión actual de un Excel para poder restaurarla.
+
+    Returns:
+        True si el archivo existía
+    """
+    backup_path = _backup_path(excel_file)
+    _remove(backup_path)
+    if not os.path.exists(excel_file):
+        return False
+    try:
+        # Un enlace duro no copia datos: el reemplazo posterior no lo modifica
+        os.link(excel_file, backup_path)
+    except OSError:
+        shutil.copy2(excel_file, backup_path)
+    return True
+
+
+def write_excel_pair(od_df: pd.DataFrame, os_df: pd.DataFrame, od_excel_file: str, os_excel_file: str) -> int:
+    """
+    Escribe los dos archivos Excel como una sola transacción.
+
+    Los DataFrames se escriben en archivos temporales que se aseguran en disco;
+    luego se guardan copias de los archivos actuales, el marcador de generación
+    pasa a "pending", se renombran los dos temporales y el marcador pasa a
+    "committed". Si el proceso se interrumpe después de marcar "pending",
+    recover_excel_pair restaura el par anterior; si se interrumpe antes, los
+    archivos no se tocaron. Todo se hace con el bloqueo del par tomado.
+
+    Args:
+        od_df: DataFrame del Excel de OD
+        os_df: DataFrame del Excel de OS
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+
+    Returns:
+        Nueva generación del par
+    """
+    with lock_excel_pair(od_excel_file):
+        _recover(od_excel_file, os_excel_file)
+        generation = read_generation(od_excel_file)[0] + 1
+        files = ((od_df, od_excel_file), (os_df, os_excel_file))
+
+        try:
+            for df, excel_file in files:
+                df.to_excel(_temp_path(excel_file), index=False)
+                _fsync_file(_temp_path(excel_file))
+        except BaseException:
+            for _, excel_file in files:
+                _remove(_temp_path(excel_file))
+            raise
+
+        existed = tuple(_backup(excel_file) for _, excel_file in files)
+        _write_marker(od_excel_file, generation, STATE_PENDING, existed)
+
+        for _, excel_file in files:
+            os.replace(_temp_path(excel_file), excel_file)
+        for directory in {os.path.dirname(excel_file) for _, excel_file in files}:
+            _fsync_directory(directory)
+
+        _write_marker(od_excel_file, generation, STATE_COMMITTED)
+        for _, excel_file in files:
+            _remove(_backup_path(excel_file))
+        return generation
+
+
+def recover_excel_pair(od_excel_file: str, os_excel_file: str) -> Optional[int]:
+    """
+    Deshace una escritura del par de archivos Excel que quedó a medias.
+
+    Si el marcador está en "pending", uno o los dos archivos pueden ser de la
+    nueva generación: se restauran ambos desde las copias (o se eliminan si no
+    existían). El par restaurado recibe un número de generación nuevo, para que
+    quien lo leyó durante la escritura interrumpida no lo confunda con el que
+    tenía. Si otro proceso está escribiendo el par, se espera a que termine: su
+    escritura no está interrumpida.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+
+    Returns:
+        Generación del par restaurado, o None si el par estaba completo
+    """
+    with lock_excel_pair(od_excel_file):
+        return _recover(od_excel_file, os_excel_file)
+
+
+def _recover(od_excel_file: str, os_excel_file: str) -> Optional[int]:
+    """recover_excel_pair con el bloqueo del par ya tomado."""
+    generation, state = read_generation(od_excel_file)
+    files = (od_excel_file, os_excel_file)
+    if state != STATE_PENDING:
+        # Restos de una escritura interrumpida antes de marcar "pending" o después de confirmarla
+        for excel_file in files:
+            _remove(_temp_path(excel_file))
+            _remove(_backup_path(excel_file))
+        return None
+
+    with open(get_generation_path(od_excel_file), encoding='utf-8') as f:
+        existed = json.load(f).get("existed", [True, True])
+
+    for excel_file, file_existed in zip(files, existed):
+        backup_path = _backup_path(excel_file)
+        if os.path.exists(backup_path):
+            os.replace(backup_path, excel_file)
+            # Si el archivo no llegó a reemplazarse, la copia es un enlace al mismo
+            # archivo y el renombrado no hace nada
+            _remove(backup_path)
+        elif not file_existed:
+            _remove(excel_file)
+        _remove(_temp_path(excel_file))
+    for directory in {os.path.dirname(excel_file) for excel_file in files}:
+        _fsync_directory(directory)
+
+    _write_marker(od_excel_file, generation + 1, STATE_COMMITTED)
+    print(f"⚠️ Se restauró la versión anterior de {od_excel_file} y {os_excel_file} "
+          f"(la escritura de la generación {generation} quedó a medias)")
+    return generation + 1
+
+
+def read_excel_pair(od_excel_file: str, os_excel_file: str,
+                    read: Callable[[str], pd.DataFrame] = pd.read_excel) -> Tuple[pd.DataFrame, pd.DataFrame, int]:
+    """
+    Lee los dos archivos Excel de una misma generación sin bloquear a los escritores.
+
+    La generación se comprueba antes y después de leer; si cambió, otro proceso
+    escribió el par mientras tanto y se vuelve a leer. Un par en "pending"
+    se recupera (o se espera a que termine quien lo está escribiendo). Tras
+    READ_ATTEMPTS lecturas fallidas se lee con el bloqueo tomado.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+        read: Función que lee un archivo Excel
+
+    Returns:
+        Tupla (DataFrame OD, DataFrame OS, generación leída)
+    """
+    for _ in range(READ_ATTEMPTS):
+        marker = read_generation(od_excel_file)
+        if marker[1] == STATE_PENDING:
+            recover_excel_pair(od_excel_file, os_excel_file)
+            continue
+        od_df, os_df = read(od_excel_file), read(os_excel_file)
+        if read_generation(od_excel_file) == marker:
+            return od_df, os_df, marker[0]
+
+    with lock_excel_pair(od_excel_file):
+        _recover(od_excel_file, os_excel_file)
+        return read(od_excel_file), read(os_excel_file), read_generation(od_excel_file)[0]
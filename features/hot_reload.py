@@ -0,0 +1,217 @@
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from core.models import Patient
+from features.excel_pair import read_generation
+from features.patient_journal import EXCEL_COLUMNS, get_patient_journal, patient_to_rows
+
+# Intervalo (ms) entre comprobaciones de cambios en los archivos de datos
+RELOAD_INTERVAL_MS = int(os.environ.get('RELOAD_INTERVAL_MS', 2000))
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def source_signature(od_excel_file: str, os_excel_file: str) -> tuple:
+    """
+    Resume en una tupla el estado de los datos de pacientes, sin leerlos.
+
+    Incluye la fecha, el tamaño y el inodo de los dos Excel, su marcador de
+    generación y el último cambio del diario. Cualquier escritura de otro
+    proceso (o de otro programa, como el propio Excel) cambia la tupla.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+        os_excel_file: Ruta del archivo Excel de OS
+
+    Returns:
+        Tupla comparable entre dos llamadas
+    """
+    return (_file_signature(od_excel_file), _file_signature(os_excel_file),
+            read_generation(od_excel_file), get_patient_journal(od_excel_file).last_seq())
+
+
+def _row_hashes(df: pd.DataFrame) -> pd.Series:
+    """Hash de la fila de cada paciente (la primera de cada ID, como al cargar), indexado por ID."""
+    from features.data_loading import _first_rows
+
+    df = _first_rows(df).reindex(columns=EXCEL_COLUMNS)
+    return pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy(), index=df['patient_id'].to_numpy())
+
+
+def _changed_ids(old: pd.Series, new: pd.Series) -> Set[str]:
+    """IDs cuya fila se añadió, se quitó o cambió entre dos series de _row_hashes."""
+    ids = old.index.union(new.index)
+    # Un ID ausente tiene hash 0 (reindex conserva el tipo uint64)
+    differs = old.reindex(ids, fill_value=0).to_numpy() != new.reindex(ids, fill_value=0).to_numpy()
+    return set(ids[differs])
+
+
+class SourceChanges:
+    """
+    Cambios encontrados en los archivos de datos, pendientes de aplicar al dataset.
+
+    Attributes:
+        patients: Pacientes nuevos o modificados, leídos de los archivos
+        removed: IDs que ya no están en los archivos
+        all_ids: Todos los IDs de los archivos si hay que comparar el dataset completo; si no, None
+    """
+
+    def __init__(self, signature: tuple, hashes: Tuple[pd.Series, pd.Series], patients: List[Patient],
+                 removed: List[str], all_ids: Optional[Set[str]] = None):
+        self.signature = signature
+        self.hashes = hashes
+        self.patients = patients
+        self.removed = removed
+        self.all_ids = all_ids
+
+
+class ExcelSourceWatcher:
+    """
+    Detecta cambios en los archivos de datos de pacientes y calcula qué pacientes cambiaron.
+
+    changed() solo compara source_signature, así que se puede llamar a menudo.
+    diff() vuelve a leer los datos (el par de Excel con el diario) y compara el
+    hash de la fila de cada paciente con el de la última lectura aceptada, así
+    que solo crea los pacientes cuyas filas cambiaron. accept() toma la lectura
+    como referencia una vez aplicada al dataset.
+
+    El objeto debe crearse antes de cargar el dataset, y prepare() llamarse
+    después: si los datos cambiaron entre medias, el primer diff() compara el
+    dataset completo.
+    """
+
+    def __init__(self, od_excel_file: str, os_excel_file: str):
+        self.od_excel_file = od_excel_file
+        self.os_excel_file = os_excel_file
+        self._signature = source_signature(od_excel_file, os_excel_file)
+        self._hashes: Optional[Tuple[pd.Series, pd.Series]] = None
+        # Firma cuya lectura falló: no se reintenta hasta que los archivos vuelvan a cambiar
+        self._failed_signature = None
+
+    def prepare(self) -> None:
+        """Toma como referencia los datos actuales (puede llamarse desde otro hilo)."""
+        from features.data_loading import read_patient_frames
+
+        od_df, os_df = read_patient_frames(self.od_excel_file, self.os_excel_file)
+        hashes = (_row_hashes(od_df), _row_hashes(os_df))
+        # Si los datos cambiaron desde que se cargó el dataset, la referencia no le
+        # corresponde: se deja vacía y el primer diff compara todo
+        if source_signature(self.od_excel_file, self.os_excel_file) == self._signature:
+            self._hashes = hashes
+
+    def changed(self) -> bool:
+        """True si los archivos de datos cambiaron desde la última lectura aceptada."""
+        signature = source_signature(self.od_excel_file, self.os_excel_file)
+        return signature != self._signature and signature != self._failed_signature
+
+    def diff(self) -> SourceChanges:
+        """
+        Lee los datos actuales y obtiene los pacientes que cambiaron (puede llamarse desde otro hilo).
+
+        Returns:
+            SourceChanges con los pacientes nuevos o modificados y los IDs eliminados
+        """
+        from features.data_loading import FUNDUS_IMAGES_DIR, FrameSource, iter_source_patients, read_patient_frames
+        from core.image_loader import attach_fundus_images
+
+        # La firma se toma antes de leer: si algo cambia durante la lectura, la siguiente comprobación lo verá
+        signature = source_signature(self.od_excel_file, self.os_excel_file)
+        try:
+            od_df, os_df = read_patient_frames(self.od_excel_file, self.os_excel_file)
+            hashes = (_row_hashes(od_df), _row_hashes(os_df))
+        except Exception:
+            self._failed_signature = signature
+            raise
+
+        all_ids = None
+        if self._hashes is None:
+            all_ids = set(hashes[0].index) | set(hashes[1].index)
+            changed = all_ids
+        else:
+            changed = _changed_ids(self._hashes[0], hashes[0]) | _changed_ids(self._hashes[1], hashes[1])
+
+        patients = list(iter_source_patients(FrameSource(od_df[od_df['patient_id'].isin(changed)],
+                                                         os_df[os_df['patient_id'].isin(changed)])))
+        if patients and os.path.isdir(FUNDUS_IMAGES_DIR):
+            attach_fundus_images(patients, FUNDUS_IMAGES_DIR)
+        present = {patient.patient_id for patient in patients}
+        removed = [patient_id for patient_id in changed if patient_id not in present]
+        return SourceChanges(signature, hashes, patients, removed, all_ids)
+
+    def accept(self, changes: SourceChanges) -> None:
+        """
+        Toma como referencia la lectura de un diff ya aplicado al dataset.
+
+        Args:
+            changes: Resultado de diff()
+        """
+        self._signature = changes.signature
+        self._hashes = changes.hashes
+
+    def forget(self, patient_ids: Iterable[str]) -> None:
+        """
+        Hace que el próximo diff() vuelva a leer unos pacientes aunque sus filas no cambien.
+
+        Se usa cuando el dataset tiene de esos pacientes datos que no están en
+        los archivos (por ejemplo, un cambio local rechazado por conflicto).
+
+        Args:
+            patient_ids: IDs de los pacientes
+        """
+        patient_ids = list(patient_ids)
+        if self._hashes is not None:
+            self._hashes = tuple(hashes[~hashes.index.isin(patient_ids)] for hashes in self._hashes)
+        self._signature = None
+
+
+def _patient_state(patient: Patient) -> tuple:
+    """Filas de Excel e imágenes de un paciente, para comparar dos versiones."""
+    images = tuple(eye.fundus_image if eye is not None else None for eye in (patient.right_eye, patient.left_eye))
+    return patient_to_rows(patient), images
+
+
+def apply_source_changes(dataset, changes: SourceChanges, skip: Iterable[str] = ()) -> Dict[str, List[str]]:
+    """
+    Aplica al dataset los pacientes que cambiaron en los archivos.
+
+    Cada paciente leído se compara con el del dataset y solo se actualiza si sus
+    datos o imágenes son distintos, así que los cambios ya presentes (por
+    ejemplo, los guardados desde esta misma ventana) no hacen nada.
+
+    Args:
+        dataset: PapilaDataset o ColumnarPapilaDataset a actualizar
+        changes: Resultado de ExcelSourceWatcher.diff()
+        skip: IDs que no se tocan (cambios locales aún sin escribir)
+
+    Returns:
+        Diccionario con los IDs añadidos ("added"), modificados ("updated") y eliminados ("removed")
+    """
+    skip = set(skip)
+    report = {"added": [], "updated": [], "removed": []}
+
+    for patient in changes.patients:
+        if patient.patient_id in skip:
+            continue
+        current = dataset.get_patient(patient.patient_id)
+        if current is None:
+            dataset.add_patient(patient)
+            report["added"].append(patient.patient_id)
+        elif _patient_state(current) != _patient_state(patient):
+            dataset.update_patient(patient)
+            report["updated"].append(patient.patient_id)
+
+    removed = changes.removed
+    if changes.all_ids is not None:
+        removed = [patient_id for patient_id in dataset.patients.keys() if patient_id not in changes.all_ids]
+    for patient_id in removed:
+        if patient_id not in skip and dataset.remove_patient(patient_id):
+            report["removed"].append(patient_id)
+    return report
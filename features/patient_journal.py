@@ -0,0 +1,422 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from core.models import Patient, EyeData
+
+# Columnas de una fila de los archivos Excel de pacientes (en su orden)
+EXCEL_COLUMNS = [
+    'patient_id', 'age', 'gender', 'diagnosis', 'sphere', 'cylinder', 'axis', 'crystalline_status',
+    'pneumatic_iop', 'perkins_iop', 'pachymetry', 'axial_length', 'mean_defect'
+]
+
+# Versión del esquema del diario (incrementar y añadir la migración en _MIGRATIONS si cambia la tabla)
+JOURNAL_SCHEMA_VERSION = 2
+
+
+def get_journal_path(od_excel_file: str) -> str:
+    """
+    Obtiene la ruta del diario de cambios asociado a los archivos Excel.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+
+    Returns:
+        Ruta de PATIENT_JOURNAL_FILE si está definida; si no, un archivo oculto junto al Excel de OD
+    """
+    journal_file = os.environ.get('PATIENT_JOURNAL_FILE')
+    if journal_file:
+        return journal_file
+    directory, filename = os.path.split(od_excel_file)
+    return os.path.join(directory, f".{filename}.journal.sqlite")
+
+
+def _eye_to_row(patient: Patient, eye: Optional[EyeData]) -> Optional[dict]:
+    """
+    Convierte los datos de un ojo en una fila de Excel.
+
+    Returns:
+        Diccionario con EXCEL_COLUMNS (None en los valores que faltan) o None si no hay datos del ojo
+    """
+    if eye is None:
+        return None
+    refractive_error = eye.refractive_error
+    return {
+        'patient_id': patient.patient_id,
+        'age': patient.age,
+        'gender': patient.gender.value,
+        'diagnosis': eye.diagnosis.value,
+        'sphere': refractive_error.sphere if refractive_error else None,
+        'cylinder': refractive_error.cylinder if refractive_error else None,
+        'axis': refractive_error.axis if refractive_error else None,
+        'crystalline_status': eye.crystalline_status.value if eye.crystalline_status else None,
+        'pneumatic_iop': eye.pneumatic_iop,
+        'perkins_iop': eye.perkins_iop,
+        'pachymetry': eye.pachymetry,
+        'axial_length': eye.axial_length,
+        'mean_defect': eye.mean_defect,
+    }
+
+
+def patient_to_rows(patient: Patient) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    Convierte un paciente en sus filas de los archivos Excel OD y OS.
+
+    Como al guardar desde el menú, un ojo sin datos no tiene fila.
+
+    Args:
+        patient: Paciente a convertir
+
+    Returns:
+        Tupla (fila OD, fila OS); cada una puede ser None
+    """
+    return _eye_to_row(patient, patient.right_eye), _eye_to_row(patient, patient.left_eye)
+
+
+def rows_fingerprint(rows: Tuple[Optional[dict], Optional[dict]]) -> str:
+    """
+    Calcula la huella de las filas de Excel de un paciente, para saber si cambiaron.
+
+    Los números se comparan como float, así que 60 y 60.0 tienen la misma huella
+    (y también -0.0 y 0.0, que Excel guarda igual), y sin esfera no cuentan el
+    cilindro ni el eje, que la carga descarta.
+
+    Args:
+        rows: Tupla (fila OD, fila OS) de patient_to_rows; (None, None) si el paciente no existe
+
+    Returns:
+        Hash hexadecimal de las filas
+    """
+    normalized = []
+    for row in rows:
+        if row is not None:
+            # Sumar 0.0 convierte -0.0 en 0.0
+            row = {column: float(value) + 0.0 if isinstance(value, (int, float)) else value
+                   for column, value in row.items()}
+            if row.get('sphere') is None:
+                row['cylinder'] = row['axis'] = None
+        normalized.append(row)
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def patient_fingerprint(patient: Optional[Patient]) -> str:
+    """
+    Calcula la huella de las filas de Excel de un paciente (ver rows_fingerprint).
+
+    Args:
+        patient: Paciente, o None si no existe (la base de un alta)
+
+    Returns:
+        Hash hexadecimal de patient_to_rows(patient)
+    """
+    return rows_fingerprint(patient_to_rows(patient) if patient is not None else (None, None))
+
+
+class PatientJournal:
+    """
+    Diario de cambios de pacientes en SQLite, pendientes de volcar a los Excel.
+
+    Cada alta, edición o baja es una sola inserción al final de la tabla, sin
+    leer ni reescribir los archivos Excel. Al cargar los datos se aplican los
+    cambios sobre los DataFrames de los Excel (el último cambio de cada
+    paciente gana) y compact_journal los vuelca a los Excel cuando se pide.
+
+    Cada cambio puede llevar la huella (patient_fingerprint) del paciente en que
+    se basó la edición. Si el paciente cambió después, porque otra ventana u
+    otro proceso registró antes su propio cambio, el cambio se rechaza en lugar
+    de pisar al otro.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        try:
+            self._migrate()
+        except BaseException:
+            self._connection.close()
+            raise
+
+    def _migrate(self) -> None:
+        """
+        Crea el esquema del diario o lo actualiza a JOURNAL_SCHEMA_VERSION.
+
+        Raises:
+            RuntimeError: Si el diario es de una versión posterior del esquema
+        """
+        # BEGIN IMMEDIATE: si dos procesos abren el diario a la vez, solo uno lo migra
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version > JOURNAL_SCHEMA_VERSION:
+                raise RuntimeError(f"El diario {self.path} usa la versión {version} del esquema y este "
+                                   f"programa solo admite hasta la {JOURNAL_SCHEMA_VERSION}")
+            for statements in _MIGRATIONS[version:]:
+                for statement in statements:
+                    self._connection.execute(statement)
+            self._connection.execute(f"PRAGMA user_version={JOURNAL_SCHEMA_VERSION}")
+        except BaseException:
+            self._connection.rollback()
+            raise
+        self._connection.commit()
+
+    def _append(self, patient_id: str, rows: Optional[Tuple[Optional[dict], Optional[dict]]], base: Optional[str],
+                stored_fingerprints: Optional[Callable[[List[str]], Dict[str, str]]]) -> None:
+        bases = {patient_id: base} if base is not None else None
+        if self.record_changes({patient_id: rows}, bases, stored_fingerprints):
+            raise RuntimeError(f"El paciente {patient_id} cambió desde que se leyó; no se guardó el cambio")
+
+    def record_save(self, patient: Patient, base: Optional[str] = None,
+                    stored_fingerprints: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> None:
+        """
+        Registra el alta o la edición de un paciente.
+
+        Args:
+            patient: Paciente con los datos actuales
+            base: Huella del paciente antes de editarlo (patient_fingerprint(None) para un alta);
+                None para no comprobarla
+            stored_fingerprints: Ver record_changes
+
+        Raises:
+            RuntimeError: Si el paciente cambió desde que se leyó (el cambio no se registra)
+        """
+        self._append(patient.patient_id, patient_to_rows(patient), base, stored_fingerprints)
+
+    def record_delete(self, patient_id: str, base: Optional[str] = None,
+                      stored_fingerprints: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> None:
+        """
+        Registra la baja de un paciente.
+
+        Args:
+            patient_id: ID del paciente eliminado
+            base: Huella del paciente antes de eliminarlo; None para no comprobarla
+            stored_fingerprints: Ver record_changes
+
+        Raises:
+            RuntimeError: Si el paciente cambió desde que se leyó (la baja no se registra)
+        """
+        self._append(patient_id, None, base, stored_fingerprints)
+
+    def record_changes(self, changes: Dict[str, Optional[Tuple[Optional[dict], Optional[dict]]]],
+                       bases: Optional[Dict[str, str]] = None,
+                       stored_fingerprints: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> List[str]:
+        """
+        Registra varios cambios en una sola transacción (una sola escritura a disco).
+
+        Los cambios con base se comprueban antes de escribir, dentro de la misma
+        transacción: el paciente guardado es el del último cambio del diario o,
+        si no tiene ninguno, el de los Excel (stored_fingerprints). Si su huella
+        no es la base, otro escritor lo cambió desde que se leyó y el cambio se
+        rechaza. Los demás cambios se registran igualmente.
+
+        Args:
+            changes: Diccionario ID -> (fila OD, fila OS) de patient_to_rows, o None para una baja
+            bases: Diccionario ID -> huella del paciente en que se basó el cambio
+                (patient_fingerprint); los cambios sin base no se comprueban
+            stored_fingerprints: Función que recibe IDs sin cambios en el diario y
+                devuelve la huella de esos pacientes en los Excel (la de None si no
+                están); sin ella, esos cambios no se comprueban
+
+        Returns:
+            IDs de los cambios rechazados por conflicto
+        """
+        bases = bases or {}
+        with self._lock:
+            # BEGIN IMMEDIATE: ningún otro proceso escribe entre la comprobación y la inserción
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                conflicts = self._conflicts({patient_id: base for patient_id, base in bases.items()
+                                             if patient_id in changes}, stored_fingerprints)
+                self._connection.executemany(_INSERT_CHANGE, [
+                    _change_params(patient_id, rows is None, *(rows or (None, None)), bases.get(patient_id))
+                    for patient_id, rows in changes.items() if patient_id not in conflicts
+                ])
+            except BaseException:
+                self._connection.rollback()
+                raise
+            self._connection.commit()
+        return conflicts
+
+    def _conflicts(self, bases: Dict[str, str],
+                   stored_fingerprints: Optional[Callable[[List[str]], Dict[str, str]]]) -> List[str]:
+        """IDs cuya huella guardada no es la base del cambio (dentro de la transacción de record_changes)."""
+        stored = {}
+        for patient_id in bases:
+            row = self._connection.execute(
+                "SELECT deleted, od_row, os_row FROM changes WHERE patient_id = ? ORDER BY seq DESC LIMIT 1",
+                (patient_id,)
+            ).fetchone()
+            if row is not None:
+                stored[patient_id] = rows_fingerprint(_decode_rows(*row))
+
+        unjournaled = [patient_id for patient_id in bases if patient_id not in stored]
+        if unjournaled and stored_fingerprints is not None:
+            stored.update(stored_fingerprints(unjournaled))
+        return [patient_id for patient_id, base in bases.items()
+                if patient_id in stored and stored[patient_id] != base]
+
+    def last_seq(self) -> int:
+        """Último seq registrado (0 si el diario está vacío); cambia con cada cambio nuevo."""
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM changes").fetchone()[0]
+
+    def changes(self) -> Tuple[int, Dict[str, Tuple[Optional[dict], Optional[dict]]]]:
+        """
+        Devuelve el último cambio registrado de cada paciente.
+
+        Returns:
+            Tupla (último seq leído, diccionario ID -> (fila OD, fila OS)). Un
+            paciente eliminado tiene (None, None).
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT seq, patient_id, deleted, od_row, os_row FROM changes ORDER BY seq"
+            ).fetchall()
+
+        last_seq = 0
+        latest: Dict[str, Tuple[Optional[dict], Optional[dict]]] = {}
+        for seq, patient_id, deleted, od_row, os_row in rows:
+            last_seq = seq
+            # Reinsertar para que el orden sea el del último cambio
+            latest.pop(patient_id, None)
+            latest[patient_id] = _decode_rows(deleted, od_row, os_row)
+        return last_seq, latest
+
+    def apply(self, od_df: pd.DataFrame, os_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, int]:
+        """
+        Aplica los cambios registrados a los DataFrames de los Excel.
+
+        Las filas de los pacientes modificados se quitan y sus filas actuales se
+        añaden al final, igual que hacía la reescritura de los Excel al guardar.
+
+        Args:
+            od_df: DataFrame del Excel de OD
+            os_df: DataFrame del Excel de OS
+
+        Returns:
+            Tupla (DataFrame OD, DataFrame OS, último seq aplicado)
+        """
+        last_seq, latest = self.changes()
+        od_df, os_df = apply_row_changes(od_df, os_df, latest)
+        return od_df, os_df, last_seq
+
+    def clear(self, up_to_seq: int) -> None:
+        """
+        Elimina los cambios ya volcados a los Excel.
+
+        Args:
+            up_to_seq: Último seq incluido en el volcado (los posteriores se conservan)
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM changes WHERE seq <= ?", (up_to_seq,))
+
+    def close(self) -> None:
+        """Cierra la conexión con el diario."""
+        with self._lock:
+            self._connection.close()
+
+
+# Sentencias que pasan el esquema de la versión i a la i + 1 (la versión 0 es un diario nuevo)
+_MIGRATIONS = [
+    (
+        "CREATE TABLE IF NOT EXISTS changes ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " patient_id TEXT NOT NULL,"
+        " deleted INTEGER NOT NULL DEFAULT 0,"
+        " od_row TEXT,"
+        " os_row TEXT)",
+    ),
+    (
+        # Huella del paciente en que se basó cada cambio (NULL si no se comprobó)
+        "ALTER TABLE changes ADD COLUMN base TEXT",
+        "CREATE INDEX IF NOT EXISTS changes_patient ON changes (patient_id, seq)",
+    ),
+]
+
+_INSERT_CHANGE = "INSERT INTO changes (patient_id, deleted, od_row, os_row, base) VALUES (?, ?, ?, ?, ?)"
+
+
+def _change_params(patient_id: str, deleted: bool, od_row: Optional[dict], os_row: Optional[dict],
+                   base: Optional[str] = None) -> tuple:
+    """Parámetros de la inserción de un cambio (las filas se guardan como JSON)."""
+    return (patient_id, int(deleted),
+            json.dumps(od_row) if od_row is not None else None,
+            json.dumps(os_row) if os_row is not None else None,
+            base)
+
+
+def _decode_rows(deleted: int, od_row: Optional[str], os_row: Optional[str]) -> Tuple[Optional[dict], Optional[dict]]:
+    """Filas (OD, OS) de un cambio guardado; (None, None) para una baja."""
+    if deleted:
+        return None, None
+    return json.loads(od_row) if od_row else None, json.loads(os_row) if os_row else None
+
+
+def apply_row_changes(od_df: pd.DataFrame, os_df: pd.DataFrame,
+                      changes: Dict[str, Tuple[Optional[dict], Optional[dict]]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Reemplaza en los DataFrames de los Excel las filas de los pacientes modificados.
+
+    Las filas de los pacientes de changes se quitan y sus filas nuevas se añaden
+    al final; las demás filas no se tocan.
+
+    Args:
+        od_df: DataFrame del Excel de OD
+        os_df: DataFrame del Excel de OS
+        changes: Diccionario ID -> (fila OD, fila OS) de patient_to_rows; (None, None) elimina al paciente
+
+    Returns:
+        Tupla (DataFrame OD, DataFrame OS)
+    """
+    if not changes:
+        return od_df, os_df
+
+    changed = list(changes)
+    od_rows = [od_row for od_row, _ in changes.values() if od_row is not None]
+    os_rows = [os_row for _, os_row in changes.values() if os_row is not None]
+    return _replace_rows(od_df, changed, od_rows), _replace_rows(os_df, changed, os_rows)
+
+
+def _replace_rows(df: pd.DataFrame, patient_ids: list, rows: list) -> pd.DataFrame:
+    """Quita las filas de los pacientes indicados y añade las nuevas al final."""
+    df = df[~df['patient_id'].isin(patient_ids)]
+    if not rows:
+        return df.reset_index(drop=True)
+    # Las columnas sin ningún valor se omiten: concat las rellena con NaN
+    new_rows = pd.DataFrame(rows, columns=EXCEL_COLUMNS).dropna(axis=1, how='all')
+    if df.empty:
+        return new_rows.reindex(columns=df.columns.union(new_rows.columns, sort=False))
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
+_journals: Dict[str, PatientJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_patient_journal(od_excel_file: str) -> PatientJournal:
+    """
+    Devuelve el diario compartido de un par de archivos Excel.
+
+    Args:
+        od_excel_file: Ruta del archivo Excel de OD
+
+    Returns:
+        Diario de cambios (se crea en la primera llamada)
+    """
+    key = os.path.abspath(get_journal_path(od_excel_file))
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = _journals[key] = PatientJournal(key)
+        return journal
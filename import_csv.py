@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from core.csv_loader import CSV_CHUNK_SIZE
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Importa los CSV de OD y OS del registro de pacientes.")
+    parser.add_argument("od_csv", help="CSV de ojos derechos")
+    parser.add_argument("os_csv", help="CSV de ojos izquierdos")
+    parser.add_argument("--db", default=os.getenv("PATIENT_DB_FILE", "patient_data.sqlite"),
+                        help="Base SQLite de destino (por defecto PATIENT_DB_FILE)")
+    parser.add_argument("--chunksize", type=int, default=CSV_CHUNK_SIZE, help="Filas leídas por bloque")
+    parser.add_argument("--memory", action="store_true",
+                        help="Cargar en un PapilaDataset en memoria en lugar de la base (solo informa)")
+    args = parser.parse_args(argv)
+
+    for csv_file in (args.od_csv, args.os_csv):
+        if not os.path.isfile(csv_file):
+            print(f"❌ El archivo {csv_file} no existe")
+            return 2
+
+    if args.memory:
+        from core.models import PapilaDataset
+        dataset = PapilaDataset()
+        target = "memoria"
+    else:
+        from core.sqlite_dataset import SQLitePapilaDataset
+        dataset = SQLitePapilaDataset(args.db)
+        target = args.db
+
+    try:
+        report = dataset.load_from_csv(args.od_csv, args.os_csv, args.chunksize)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        return 1
+
+    peak = report["peak_memory_bytes"]
+    print(f"✅ {report['rows']} filas ({report['skipped']} descartadas), {report['patients']} pacientes nuevos "
+          f"en {target}")
+    print(f"   {report['seconds']:.1f} s, {report['rows_per_second']:.0f} filas/s, "
+          f"pico de memoria {f'{peak / 2 ** 20:.0f} MiB' if peak is not None else 'no disponible'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
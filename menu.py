@@ -5,8 +5,15 @@ import os
 
 # Importar las clases desde models.py
 from core.models import (
-    Gender, DiagnosisStatus, Eye, CrystallineStatus,
-    RefractiveError, EyeData, Patient, PapilaDataset
+    Gender, DiagnosisStatus, Eye,
+    RefractiveError, EyeData, Patient
+)
+from features.data_loading import (
+    ExcelPairSource, FrameSource, build_patient_dataset, frame_fingerprints, load_patient_database
+)
+from features.excel_pair import lock_excel_pair, read_excel_pair, read_generation, write_excel_pair
+from features.patient_journal import (
+    EXCEL_COLUMNS, apply_row_changes, patient_fingerprint, patient_to_rows, rows_fingerprint
 )
 
 # === Cargar variables de entorno ===
@@ -14,172 +21,37 @@ load_dotenv()
 od_excel_file = os.getenv("OD_EXCEL_FILE", "patient_data_od.xlsx")
 os_excel_file = os.getenv("OS_EXCEL_FILE", "patient_data_os.xlsx")
 fundus_images_dir = os.getenv("FUNDUS_IMAGES_DIR", "FundusImages")
+patient_storage = os.getenv("PATIENT_STORAGE", "excel")
+patient_db_file = os.getenv("PATIENT_DB_FILE", "patient_data.sqlite")
 
 if not os_excel_file or not od_excel_file:
     raise EnvironmentError("❌ No se encontraron las variables OD_EXCEL_FILE y/o OS_EXCEL_FILE en el archivo .env")
 
 
-def clean_headers(df: pd.DataFrame) -> pd.DataFrame:
-    """Limpia los encabezados del DataFrame."""
-    df.columns = df.columns.str.lower().str.strip()
-
-    column_mapping = {
-        "unnamed: 0": "patient_id",
-        "dioptre_1": "sphere",
-        "dioptre_2": "cylinder",
-        "astigmatism": "axis",
-        "phakic/pseudophakic": "crystalline_status",
-        "pneumatic": "pneumatic_iop",
-        "perkins": "perkins_iop",
-        "vf_md": "mean_defect"
-    }
-
-    for old_col, new_col in column_mapping.items():
-        if old_col in df.columns:
-            df.rename(columns={old_col: new_col}, inplace=True)
-
-    if len(df) > 0:
-        df = df.drop(0, errors='ignore')
-
-    return df
-
-
 # === Gestor del Menú ===
 class GestorPacientes:
     def __init__(self, od_file, os_file):
         self.od_file = od_file
         self.os_file = os_file
-        self.dataset = PapilaDataset()
-        self._load_data()
+        # Cambios de esta sesión (ID -> filas OD y OS), para combinarlos si otro proceso guarda antes
+        self._changes = {}
+        # Huella de cada paciente cambiado antes de su primer cambio, para detectar conflictos
+        self._bases = {}
+        # Generación de los archivos de salida al abrir el menú
+        self._output_generation = read_generation(self._output_files()[0])[0]
+        if patient_storage == "sqlite":
+            # Los cambios se guardan en la base al momento
+            self.dataset = load_patient_database(patient_db_file, od_file, os_file)
+            print(f"✅ Base de datos {patient_db_file}: {len(self.dataset)} pacientes.")
+        else:
+            self._load_data()
 
     def _load_data(self):
-        """Carga los datos de pacientes desde los archivos Excel."""
+        """Carga los datos de pacientes desde los archivos Excel, con los cambios del diario."""
         try:
-            # Cargar datos de OD
-            od_df = pd.read_excel(self.od_file, header=0)
-            od_df = clean_headers(od_df)
-
-            # Cargar datos de OS
-            os_df = pd.read_excel(self.os_file, header=0)
-            os_df = clean_headers(os_df)
-
-            print("🧾 Columnas OD:", od_df.columns.tolist())
-            print("🧾 Columnas OS:", os_df.columns.tolist())
-
-            # Obtener IDs únicos de pacientes
-            patient_ids = set(od_df['patient_id'].tolist() + os_df['patient_id'].tolist())
-            print(f"👥 Pacientes encontrados: {len(patient_ids)}")
-
-            # Procesar cada paciente
-            for patient_id in patient_ids:
-                # Obtener datos OD
-                od_data = od_df[od_df['patient_id'] == patient_id]
-                # Obtener datos OS
-                os_data = os_df[os_df['patient_id'] == patient_id]
-
-                # Si hay datos del paciente
-                if not od_data.empty or not os_data.empty:
-                    # Tomar la primera fila para datos generales
-                    patient_row = od_data.iloc[0] if not od_data.empty else os_data.iloc[0]
-
-                    # Crear paciente
-                    age = int(patient_row['age']) if not pd.isna(patient_row['age']) else 0
-                    gender = Gender(int(patient_row['gender'])) if not pd.isna(patient_row['gender']) else Gender.MALE
-                    patient = Patient(str(patient_id), age, gender)
-
-                    # Procesar ojo derecho
-                    if not od_data.empty and not pd.isna(od_data.iloc[0]['diagnosis']):
-                        row = od_data.iloc[0]
-
-                        # Crear error refractivo
-                        refractive_error = None
-                        if not pd.isna(row.get('sphere')):
-                            refractive_error = RefractiveError(
-                                sphere=float(row['sphere']),
-                                cylinder=float(row['cylinder']) if 'cylinder' in row and not pd.isna(
-                                    row['cylinder']) else None,
-                                axis=float(row['axis']) if 'axis' in row and not pd.isna(row['axis']) else None
-                            )
-
-                        # Crear objeto EyeData
-                        right_eye = EyeData(
-                            eye_type=Eye.RIGHT,
-                            diagnosis=DiagnosisStatus(int(row['diagnosis'])),
-                            refractive_error=refractive_error,
-                            crystalline_status=CrystallineStatus(
-                                int(row['crystalline_status'])) if 'crystalline_status' in row and not pd.isna(
-                                row['crystalline_status']) else None,
-                            pneumatic_iop=float(row['pneumatic_iop']) if 'pneumatic_iop' in row and not pd.isna(
-                                row['pneumatic_iop']) else None,
-                            perkins_iop=float(row['perkins_iop']) if 'perkins_iop' in row and not pd.isna(
-                                row['perkins_iop']) else None,
-                            pachymetry=float(row['pachymetry']) if 'pachymetry' in row and not pd.isna(
-                                row['pachymetry']) else None,
-                            axial_length=float(row['axial_length']) if 'axial_length' in row and not pd.isna(
-                                row['axial_length']) else None,
-                            mean_defect=float(row['mean_defect']) if 'mean_defect' in row and not pd.isna(
-                                row['mean_defect']) else None
-                        )
-
-                        # Intentar agregar imagen de fondo de ojo
-                        try:
-                            image_filename = f"RET{str(row['patient_id']).replace('#', '')}OD.jpg"
-                            image_path = os.path.join(fundus_images_dir, image_filename)
-                            if os.path.exists(image_path):
-                                right_eye.add_fundus_image(image_path)
-                        except:
-                            pass
-
-                        patient.set_eye_data(right_eye)
-
-                    # Procesar ojo izquierdo
-                    if not os_data.empty and not pd.isna(os_data.iloc[0]['diagnosis']):
-                        row = os_data.iloc[0]
-
-                        # Crear error refractivo
-                        refractive_error = None
-                        if not pd.isna(row.get('sphere')):
-                            refractive_error = RefractiveError(
-                                sphere=float(row['sphere']),
-                                cylinder=float(row['cylinder']) if 'cylinder' in row and not pd.isna(
-                                    row['cylinder']) else None,
-                                axis=float(row['axis']) if 'axis' in row and not pd.isna(row['axis']) else None
-                            )
-
-                        # Crear objeto EyeData
-                        left_eye = EyeData(
-                            eye_type=Eye.LEFT,
-                            diagnosis=DiagnosisStatus(int(row['diagnosis'])),
-                            refractive_error=refractive_error,
-                            crystalline_status=CrystallineStatus(
-                                int(row['crystalline_status'])) if 'crystalline_status' in row and not pd.isna(
-                                row['crystalline_status']) else None,
-                            pneumatic_iop=float(row['pneumatic_iop']) if 'pneumatic_iop' in row and not pd.isna(
-                                row['pneumatic_iop']) else None,
-                            perkins_iop=float(row['perkins_iop']) if 'perkins_iop' in row and not pd.isna(
-                                row['perkins_iop']) else None,
-                            pachymetry=float(row['pachymetry']) if 'pachymetry' in row and not pd.isna(
-                                row['pachymetry']) else None,
-                            axial_length=float(row['axial_length']) if 'axial_length' in row and not pd.isna(
-                                row['axial_length']) else None,
-                            mean_defect=float(row['mean_defect']) if 'mean_defect' in row and not pd.isna(
-                                row['mean_defect']) else None
-                        )
-
-                        # Intentar agregar imagen de fondo de ojo
-                        try:
-                            image_filename = f"RET{str(row['patient_id']).replace('#', '')}OS.jpg"
-                            image_path = os.path.join(fundus_images_dir, image_filename)
-                            if os.path.exists(image_path):
-                                left_eye.add_fundus_image(image_path)
-                        except:
-                            pass
-
-                        patient.set_eye_data(left_eye)
-
-                    # Añadir paciente al dataset
-                    self.dataset.add_patient(patient)
-
+            # Misma conversión que la interfaz (desde la caché si los Excel no cambiaron)
+            self.dataset = build_patient_dataset(ExcelPairSource(self.od_file, self.os_file),
+                                                 images_dir=fundus_images_dir)
             print(f"✅ Se cargaron {len(self.dataset.patients)} pacientes correctamente.")
 
         except Exception as e:
@@ -192,7 +64,8 @@ class GestorPacientes:
         print("2. Agregar paciente")
         print("3. Ver paciente")
         print("4. Eliminar paciente")
-        print("5. Guardar y salir")
+        print("5. Buscar pacientes")
+        print("6. Guardar y salir")
 
     def ver_pacientes(self):
         if not self.dataset.patients:
@@ -205,6 +78,23 @@ class GestorPacientes:
             print(
                 f"ID: {pid}, Edad: {patient.age}, Género: {patient.gender.name}, Diagnóstico: {patient.get_patient_diagnosis()}")
 
+    def buscar_pacientes(self):
+        print("Campos: age, gender, y por ojo (od., os. o any.; sin prefijo = cualquier ojo):")
+        print("        diagnosis, severity, pneumatic_iop, perkins_iop, pachymetry, axial_length, mean_defect")
+        print("Ejemplo: od.pneumatic_iop > 21 and (severity = severe or age >= 70)")
+        consulta = input("Consulta: ").strip()
+
+        try:
+            resultado = self.dataset.query(consulta)
+        except ValueError as e:
+            print(f"❌ Consulta inválida: {str(e)}")
+            return
+
+        print(f"🔎 {len(resultado)} pacientes encontrados")
+        for patient in resultado:
+            print(
+                f"ID: {patient.patient_id}, Edad: {patient.age}, Género: {patient.gender.name}, Diagnóstico: {patient.get_patient_diagnosis()}")
+
     def ver_paciente(self):
         pid = input("ID del paciente: ").strip()
         paciente = self.dataset.get_patient(pid)
@@ -341,12 +231,18 @@ class GestorPacientes:
             print("Se creará el paciente sin datos del ojo izquierdo.")
 
         # Agregar paciente al dataset
+        self._bases.setdefault(nuevo_paciente.patient_id,
+                               patient_fingerprint(self.dataset.get_patient(nuevo_paciente.patient_id)))
         self.dataset.add_patient(nuevo_paciente)
+        self._changes[nuevo_paciente.patient_id] = patient_to_rows(nuevo_paciente)
         print("✅ Paciente agregado.")
 
     def eliminar_paciente(self):
         pid = input("ID del paciente a eliminar: ")
+        base = patient_fingerprint(self.dataset.get_patient(pid))
         if self.dataset.remove_patient(pid):
+            self._bases.setdefault(pid, base)
+            self._changes[pid] = (None, None)
             print("✅ Paciente eliminado.")
         else:
             print("❌ Paciente no encontrado.")
@@ -416,12 +312,38 @@ class GestorPacientes:
             os_df = pd.DataFrame(os_data)
 
             # Definir rutas de salida
-            od_output = self.od_file.replace(".xlsx", "_actualizado.xlsx")
-            os_output = self.os_file.replace(".xlsx", "_actualizado.xlsx")
-
-            # Guardar archivos
-            od_df.to_excel(od_output, index=False)
-            os_df.to_excel(os_output, index=False)
+            od_output, os_output = self._output_files()
+
+            # Guardar los dos archivos como una sola transacción, con el bloqueo tomado
+            # para que otro proceso no guarde entre la comprobación y la escritura
+            merged = False
+            with lock_excel_pair(od_output):
+                generation = read_generation(od_output)[0]
+                if generation != self._output_generation and os.path.exists(od_output) \
+                        and os.path.exists(os_output):
+                    # Otro proceso guardó desde que se abrió el menú: aplicar solo los
+                    # cambios de esta sesión sobre lo que guardó, salvo los de pacientes
+                    # que ese proceso también cambió (se conserva su versión)
+                    saved_od, saved_os, _ = read_excel_pair(od_output, os_output)
+                    saved_od = saved_od.reindex(columns=EXCEL_COLUMNS)
+                    saved_os = saved_os.reindex(columns=EXCEL_COLUMNS)
+                    saved = frame_fingerprints(saved_od, saved_os, self._changes)
+                    conflicts = [pid for pid, rows in self._changes.items()
+                                 if saved[pid] not in (self._bases.get(pid), rows_fingerprint(rows))]
+                    changes = {pid: rows for pid, rows in self._changes.items() if pid not in conflicts}
+                    od_df, os_df = apply_row_changes(saved_od, saved_os, changes)
+                    print(f"⚠️ Otro usuario guardó los datos mientras tanto; "
+                          f"se combinaron los {len(changes)} cambios de esta sesión")
+                    if conflicts:
+                        print(f"⚠️ {len(conflicts)} pacientes los cambió también el otro usuario; se conserva "
+                              f"su versión y no se guardaron los cambios de esta sesión: {', '.join(conflicts)}")
+                    merged = True
+                self._output_generation = write_excel_pair(od_df, os_df, od_output, os_output)
+            self._changes.clear()
+            self._bases.clear()
+            if merged and patient_storage != "sqlite":
+                # Seguir trabajando sobre lo guardado, con los cambios del otro usuario
+                self.dataset = build_patient_dataset(FrameSource(od_df, os_df), images_dir=fundus_images_dir)
 
             print(f"✅ Datos guardados en:")
             print(f"   - Ojo derecho: {od_output}")
@@ -430,13 +352,18 @@ class GestorPacientes:
         except Exception as e:
             print(f"❌ Error al guardar datos: {str(e)}")
 
+    def _output_files(self):
+        """Rutas de los archivos Excel donde se guardan los cambios."""
+        return (self.od_file.replace(".xlsx", "_actualizado.xlsx"),
+                self.os_file.replace(".xlsx", "_actualizado.xlsx"))
+
     def ejecutar(self):
         print("\n🏥 SISTEMA DE GESTIÓN DE PACIENTES 🏥")
 
         while True:
             try:
                 self.mostrar_menu()
-                opcion = input("Seleccione una opción (1-5): ")
+                opcion = input("Seleccione una opción (1-6): ")
 
                 if opcion == "1":
                     self.ver_pacientes()
@@ -447,6 +374,8 @@ class GestorPacientes:
                 elif opcion == "4":
                     self.eliminar_paciente()
                 elif opcion == "5":
+                    self.buscar_pacientes()
+                elif opcion == "6":
                     self.guardar()
                     print("\n👋 ¡Hasta pronto!")
                     break
@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils.image_index import FUNDUS_IMAGE_PATTERN
+from utils.thumbnail_cache import THUMBNAIL_CACHE_DIR, THUMBNAIL_QUALITY, THUMBNAIL_QUALITY_PRESETS, ThumbnailCache
+
+# Imágenes que recibe cada proceso por envío (reduce la comunicación entre procesos)
+CHUNK_SIZE = 32
+
+# Segundos entre dos líneas de progreso
+PROGRESS_INTERVAL = 2.0
+
+# Caché de miniaturas de cada proceso del pool
+_worker_cache: Optional[ThumbnailCache] = None
+
+
+def find_fundus_images(images_dir: str) -> List[str]:
+    """
+    Lista las imágenes de fondo de ojo de un directorio (RET{id}OD.jpg / RET{id}OS.jpg).
+
+    Args:
+        images_dir: Directorio de imágenes
+
+    Returns:
+        Rutas de las imágenes, ordenadas por nombre
+    """
+    with os.scandir(images_dir) as entries:
+        names = [entry.name for entry in entries if FUNDUS_IMAGE_PATTERN.match(entry.name) and entry.is_file()]
+    return [os.path.join(images_dir, name) for name in sorted(names)]
+
+
+def _init_worker(cache_dir: str, quality: str) -> None:
+    global _worker_cache
+    _worker_cache = ThumbnailCache(memory_limit=0, cache_dir=cache_dir, quality=quality)
+
+
+def _pregenerate_one(image_path: str) -> Tuple[str, str, Optional[str]]:
+    """
+    Genera la miniatura de una imagen en un proceso del pool.
+
+    Returns:
+        Tupla (ruta, estado, error) con estado "generated", "fresh" o "failed"
+    """
+    try:
+        generated = _worker_cache.pregenerate(image_path)
+        return image_path, "generated" if generated else "fresh", None
+    except Exception as e:
+        return image_path, "failed", f"{type(e).__name__}: {str(e)}"
+
+
+def pregenerate_thumbnails(images_dir: str, cache_dir: str = THUMBNAIL_CACHE_DIR, quality: str = THUMBNAIL_QUALITY,
+                           workers: Optional[int] = None) -> dict:
+    """
+    Genera en paralelo las miniaturas en disco de todas las imágenes de un directorio.
+
+    Las miniaturas que ya existen para la versión actual de la imagen (misma
+    ruta, mtime y tamaño) se saltan, por lo que volver a ejecutar el comando
+    después de una interrupción continúa donde quedó.
+
+    Args:
+        images_dir: Directorio de imágenes de fondo de ojo
+        cache_dir: Directorio de la caché de miniaturas en disco
+        quality: Calidad del reescalado (clave de THUMBNAIL_QUALITY_PRESETS)
+        workers: Número de procesos (por defecto, uno por núcleo)
+
+    Returns:
+        Resumen con total, generadas, al día, fallidas, errores y segundos
+    """
+    image_paths = find_fundus_images(images_dir)
+    summary = {"total": len(image_paths), "generated": 0, "fresh": 0, "failed": 0, "errors": [], "seconds": 0.0}
+    print(f"🖼️  {len(image_paths)} imágenes en {images_dir}; miniaturas en {cache_dir}")
+
+    start = last_report = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir, quality)) as executor:
+        for done, (image_path, status, error) in enumerate(
+                executor.map(_pregenerate_one, image_paths, chunksize=CHUNK_SIZE), start=1):
+            summary[status] += 1
+            if error is not None:
+                summary["errors"].append((image_path, error))
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                print(f"   {done}/{len(image_paths)} procesadas, {summary['generated'] / (now - start):.1f} imágenes/s")
+
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Genera las miniaturas de las imágenes de fondo de ojo.")
+    parser.add_argument("--images-dir", default=os.getenv("FUNDUS_IMAGES_DIR", "FundusImages"),
+                        help="Directorio de imágenes (por defecto FUNDUS_IMAGES_DIR)")
+    parser.add_argument("--cache-dir", default=THUMBNAIL_CACHE_DIR,
+                        help="Directorio de la caché de miniaturas (por defecto THUMBNAIL_CACHE_DIR)")
+    parser.add_argument("--quality", default=THUMBNAIL_QUALITY, choices=list(THUMBNAIL_QUALITY_PRESETS),
+                        help="Calidad del reescalado")
+    parser.add_argument("--workers", type=int, default=None, help="Número de procesos (por defecto, uno por núcleo)")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.images_dir):
+        print(f"❌ El directorio {args.images_dir} no existe")
+        return 2
+
+    summary = pregenerate_thumbnails(args.images_dir, args.cache_dir, args.quality, args.workers)
+
+    seconds = summary["seconds"]
+    print(f"✅ {summary['generated']} generadas, {summary['fresh']} ya al día, {summary['failed']} fallidas "
+          f"en {seconds:.1f} s ({summary['generated'] / seconds if seconds else 0:.1f} imágenes/s, "
+          f"{summary['total'] / seconds if seconds else 0:.1f} revisadas/s)")
+    for image_path, error in summary["errors"]:
+        print(f"❌ {image_path}: {error}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
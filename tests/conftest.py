@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del proyecto se importan desde la raíz del repositorio (core, features, ui...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
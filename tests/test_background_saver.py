@@ -0,0 +1,41 @@
+"""
+Debounce del BackgroundSaver después de un flush sin cambios pendientes.
+"""
+import time
+
+from ui.background_saver import BackgroundSaver
+
+
+class Root:
+    """Sustituto de la ventana de Tk: no hace falta ejecutar los callbacks de after."""
+
+    def after(self, ms, callback, *args):
+        pass
+
+
+def test_flush_without_changes_keeps_debounce():
+    writes = []
+
+    def write(changes, bases):
+        writes.append((time.monotonic(), set(changes)))
+        return []
+
+    saver = BackgroundSaver(Root(), write, lambda error: None, lambda conflicts: None,
+                            debounce_ms=300, max_delay_ms=5000)
+    try:
+        assert saver.flush(1)
+        saver.delete("#1", "base")
+        time.sleep(0.1)
+        assert writes == []
+        assert saver.flush(5)
+        assert [ids for _, ids in writes] == [{"#1"}]
+
+        # Tras el flush, la siguiente ráfaga vuelve a esperar el debounce
+        marked = time.monotonic()
+        saver.delete("#2", "base")
+        deadline = time.monotonic() + 5
+        while saver.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert writes[-1][0] - marked >= 0.3
+    finally:
+        saver.close(5)
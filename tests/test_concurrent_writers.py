@@ -0,0 +1,167 @@
+"""
+Prueba de estrés de escritores concurrentes sobre el diario de cambios.
+
+Varios procesos leen un paciente, suben en 1 su PIO neumática de OD y
+registran el cambio con la huella del paciente leído (record_patient_changes),
+mientras otro proceso vuelca el diario a los Excel cada poco (compact_journal).
+Si la detección de conflictos funciona, ningún incremento aceptado se pierde:
+la PIO final de cada paciente es la inicial más el número de cambios aceptados.
+
+Con pytest se ejecuta una versión corta. Para una más larga:
+
+    python tests/test_concurrent_writers.py --writers 8 --iterations 200
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Pacientes que se disputan los escritores (pocos, para forzar conflictos)
+HOT_PATIENTS = 3
+
+
+def _paths(directory):
+    return os.path.join(directory, "patient_data_od.xlsx"), os.path.join(directory, "patient_data_os.xlsx")
+
+
+def _read_patients(directory, patient_ids):
+    from features.data_loading import FrameSource, iter_source_patients, read_patient_frames
+
+    od_df, os_df = read_patient_frames(*_paths(directory))
+    return {patient.patient_id: patient for patient in iter_source_patients(FrameSource(
+        od_df[od_df['patient_id'].isin(patient_ids)], os_df[os_df['patient_id'].isin(patient_ids)]))}
+
+
+def _hot_patient_ids(directory):
+    """Primeros pacientes con PIO neumática en OD."""
+    from features.data_loading import iter_source_patients, ExcelPairSource
+
+    ids = []
+    for patient in iter_source_patients(ExcelPairSource(*_paths(directory))):
+        if patient.right_eye is not None and patient.right_eye.pneumatic_iop is not None:
+            ids.append(patient.patient_id)
+            if len(ids) == HOT_PATIENTS:
+                return ids
+    return ids
+
+
+def _writer(directory, patient_ids, iterations, seed):
+    """Incrementa la PIO de pacientes al azar; devuelve los cambios aceptados por paciente."""
+    import random
+
+    from features.data_loading import record_patient_changes
+    from features.patient_journal import patient_fingerprint, patient_to_rows
+
+    rng = random.Random(seed)
+    accepted = dict.fromkeys(patient_ids, 0)
+    rejected = 0
+    for _ in range(iterations):
+        patient_id = rng.choice(patient_ids)
+        patient = _read_patients(directory, [patient_id])[patient_id]
+        base = patient_fingerprint(patient)
+        patient.right_eye.pneumatic_iop += 1
+        conflicts = record_patient_changes({patient_id: patient_to_rows(patient)}, *_paths(directory),
+                                           bases={patient_id: base})
+        if conflicts:
+            rejected += 1
+        else:
+            accepted[patient_id] += 1
+    return {"accepted": accepted, "rejected": rejected}
+
+
+def _compactor(directory, iterations):
+    import time
+
+    from features.data_loading import compact_journal
+
+    exported = 0
+    for _ in range(iterations):
+        exported += compact_journal(*_paths(directory))
+        time.sleep(0.05)
+    return {"exported": exported}
+
+
+def run_stress(writers, iterations, compactions):
+    """
+    Lanza los procesos sobre una copia de los Excel del repositorio y comprueba el resultado.
+
+    Returns:
+        Diccionario con los cambios aceptados y rechazados
+    """
+    directory = tempfile.mkdtemp(prefix="journal-stress-")
+    try:
+        for source in ("patient_data_od.xlsx", "patient_data_os.xlsx"):
+            shutil.copy(os.path.join(ROOT, source), directory)
+        env = dict(os.environ, FUNDUS_IMAGES_DIR=os.path.join(directory, "FundusImages"))
+        env.pop('PATIENT_JOURNAL_FILE', None)
+        os.environ.pop('PATIENT_JOURNAL_FILE', None)
+
+        patient_ids = _hot_patient_ids(directory)
+        initial = {patient_id: patient.right_eye.pneumatic_iop
+                   for patient_id, patient in _read_patients(directory, patient_ids).items()}
+
+        script = os.path.abspath(__file__)
+        processes = [subprocess.Popen([sys.executable, script, "--worker", "writer", "--directory", directory,
+                                       "--iterations", str(iterations), "--seed", str(seed),
+                                       "--patients", ",".join(patient_ids)],
+                                      stdout=subprocess.PIPE, env=env, cwd=directory)
+                     for seed in range(writers)]
+        if compactions:
+            processes.append(subprocess.Popen([sys.executable, script, "--worker", "compactor",
+                                               "--directory", directory, "--iterations", str(compactions)],
+                                              stdout=subprocess.PIPE, env=env, cwd=directory))
+        results = []
+        for process in processes:
+            output, _ = process.communicate(timeout=600)
+            assert process.returncode == 0, f"El proceso {process.args} terminó con {process.returncode}"
+            results.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+        accepted = {patient_id: sum(result["accepted"][patient_id] for result in results if "accepted" in result)
+                    for patient_id in patient_ids}
+        final = {patient_id: patient.right_eye.pneumatic_iop
+                 for patient_id, patient in _read_patients(directory, patient_ids).items()}
+        for patient_id in patient_ids:
+            assert final[patient_id] == initial[patient_id] + accepted[patient_id], \
+                f"{patient_id}: PIO {final[patient_id]}, esperada {initial[patient_id] + accepted[patient_id]}"
+        return {"accepted": sum(accepted.values()),
+                "rejected": sum(result.get("rejected", 0) for result in results)}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def test_concurrent_writers_lose_no_update():
+    report = run_stress(writers=4, iterations=15, compactions=5)
+    assert report["accepted"] > 0
+    assert report["accepted"] + report["rejected"] == 4 * 15
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--compactions", type=int, default=20)
+    parser.add_argument("--worker", choices=("writer", "compactor"))
+    parser.add_argument("--directory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patients")
+    args = parser.parse_args()
+
+    if args.worker == "writer":
+        print(json.dumps(_writer(args.directory, args.patients.split(","), args.iterations, args.seed)))
+    elif args.worker == "compactor":
+        print(json.dumps(_compactor(args.directory, args.iterations)))
+    else:
+        report = run_stress(args.writers, args.iterations, args.compactions)
+        print(f"✅ {args.writers} escritores: {report['accepted']} cambios aceptados, "
+              f"{report['rejected']} rechazados por conflicto; ningún cambio perdido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Huellas de los Excel en los guardados con base (record_patient_changes).
+
+Los Excel solo se vuelven a leer cuando cambia su versión, y una exportación
+que cambia los Excel sigue haciendo que se rechace un cambio con base antigua.
+"""
+import os
+import shutil
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKBOOKS = ("patient_data_od.xlsx", "patient_data_os.xlsx")
+
+
+@pytest.fixture
+def workbooks(tmp_path, monkeypatch):
+    for workbook in WORKBOOKS:
+        shutil.copy(os.path.join(ROOT, workbook), tmp_path)
+    monkeypatch.delenv('PATIENT_JOURNAL_FILE', raising=False)
+    monkeypatch.chdir(tmp_path)
+    return tuple(str(tmp_path / workbook) for workbook in WORKBOOKS)
+
+
+def test_excel_read_once_per_version(workbooks, monkeypatch):
+    import features.data_loading as data_loading
+    from features.data_loading import compact_journal, load_patient_data, save_patient_record
+    from features.patient_journal import patient_fingerprint
+
+    dataset = load_patient_data(*workbooks, lazy=False)
+    first, second = list(dataset.patients)[:2]
+    original = patient_fingerprint(dataset.patients[first])
+
+    reads = []
+    read_pair = data_loading.read_patient_excel_pair
+    monkeypatch.setattr(data_loading, "read_patient_excel_pair", lambda *files: reads.append(files) or read_pair(*files))
+    for patient_id in (first, second):
+        patient = dataset.patients[patient_id]
+        base = patient_fingerprint(patient)
+        patient.age += 1
+        save_patient_record(patient, *workbooks, base=base)
+    assert len(reads) == 1
+
+    # La exportación cambia los Excel: se vuelven a leer y la base anterior a la edición se rechaza
+    compact_journal(*workbooks)
+    reads.clear()
+    with pytest.raises(RuntimeError):
+        save_patient_record(dataset.patients[first], *workbooks, base=original)
+    assert len(reads) == 1
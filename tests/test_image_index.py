@@ -0,0 +1,42 @@
+"""
+Búsqueda de imágenes de fondo de ojo con IDs que son prefijo de otros.
+
+La búsqueda por patrón RET{id}...{OD|OS}.jpg no debe confundir el paciente 1
+con el 10 ni el 100 con el 1000.
+"""
+import os
+
+import pytest
+
+from core.image_loader import find_fundus_image
+from core.models import Eye
+
+
+@pytest.fixture
+def images_dir(tmp_path):
+    for filename in ("RET1OD.jpg", "RET10OD.jpg", "RET10OS.jpg", "RET100OS.jpg", "RET1000OS.jpg",
+                     "RET100_bisOD.jpg"):
+        (tmp_path / filename).touch()
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("patient_id, eye_type, expected", [
+    ("#1", Eye.RIGHT, "RET1OD.jpg"),
+    ("#1", Eye.LEFT, None),
+    ("#10", Eye.RIGHT, "RET10OD.jpg"),
+    ("#10", Eye.LEFT, "RET10OS.jpg"),
+    ("#100", Eye.LEFT, "RET100OS.jpg"),
+    ("#100", Eye.RIGHT, "RET100_bisOD.jpg"),
+    ("#1000", Eye.RIGHT, None),
+])
+def test_find_does_not_match_longer_ids(images_dir, patient_id, eye_type, expected):
+    image_path = find_fundus_image(patient_id, eye_type, images_dir)
+    assert (os.path.basename(image_path) if image_path else None) == expected
+
+
+def test_find_without_exact_image(tmp_path):
+    # Sin imagen propia, los pacientes 1 y 100 no deben quedarse con las del 10 y el 1000
+    for filename in ("RET10OD.jpg", "RET1000OS.jpg"):
+        (tmp_path / filename).touch()
+    assert find_fundus_image("#1", Eye.RIGHT, str(tmp_path)) is None
+    assert find_fundus_image("#100", Eye.LEFT, str(tmp_path)) is None
@@ -0,0 +1,189 @@
+"""
+Pruebas de paridad del motor de carga (features.data_loading) con los Excel del repositorio.
+
+Comparan el cargador anterior de la interfaz (reproducido aquí fila a fila,
+como era antes de unificar los cargadores) con el motor actual, y entre sí
+las entradas que usan el motor: interfaz (carga completa y diferida), menú e
+importación a SQLite. En todas deben salir los mismos pacientes y las mismas
+estadísticas. Una edad o un género que faltan ya no se sustituyen por 0 o
+MALE, como hacía el menú: la carga falla.
+"""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from core.models import (
+    PapilaDataset, Patient, EyeData, RefractiveError, Eye, Gender, DiagnosisStatus, CrystallineStatus
+)
+from core.statistics import statistics_mismatches
+from features.patient_journal import patient_to_rows
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKBOOKS = ("patient_data_od.xlsx", "patient_data_os.xlsx")
+
+
+@pytest.fixture
+def workbooks(tmp_path, monkeypatch):
+    """Copia de los Excel del repositorio, con su diario y sus cachés en un directorio temporal."""
+    for workbook in WORKBOOKS:
+        shutil.copy(os.path.join(ROOT, workbook), tmp_path)
+    monkeypatch.delenv('PATIENT_JOURNAL_FILE', raising=False)
+    monkeypatch.chdir(tmp_path)
+    return tuple(str(tmp_path / workbook) for workbook in WORKBOOKS)
+
+
+def _optional_float(row, field):
+    return float(row[field]) if not pd.isna(row[field]) else None
+
+
+def _reference_eye(row, eye_type: Eye) -> EyeData:
+    """Conversión de una fila en EyeData del cargador anterior (_create_eye_data_from_row)."""
+    refractive_error = None
+    if not pd.isna(row['sphere']):
+        refractive_error = RefractiveError(sphere=float(row['sphere']), cylinder=_optional_float(row, 'cylinder'),
+                                           axis=_optional_float(row, 'axis'))
+    return EyeData(
+        eye_type=eye_type,
+        diagnosis=DiagnosisStatus(int(row['diagnosis'])),
+        refractive_error=refractive_error,
+        crystalline_status=CrystallineStatus(int(row['crystalline_status']))
+        if not pd.isna(row['crystalline_status']) else None,
+        pneumatic_iop=_optional_float(row, 'pneumatic_iop'),
+        perkins_iop=_optional_float(row, 'perkins_iop'),
+        pachymetry=_optional_float(row, 'pachymetry'),
+        axial_length=_optional_float(row, 'axial_length'),
+        mean_defect=_optional_float(row, 'mean_defect')
+    )
+
+
+def reference_load(od_excel_file: str, os_excel_file: str) -> PapilaDataset:
+    """Cargador anterior de la interfaz: un filtrado de los DataFrames por cada ID."""
+    dtypes = {'patient_id': str, 'age': int, 'gender': int, 'diagnosis': int}
+    od_df = pd.read_excel(od_excel_file, header=0, dtype=dtypes)
+    os_df = pd.read_excel(os_excel_file, header=0, dtype=dtypes)
+
+    dataset = PapilaDataset()
+    for patient_id in set(od_df['patient_id'].tolist() + os_df['patient_id'].tolist()):
+        od_data = od_df[od_df['patient_id'] == patient_id]
+        os_data = os_df[os_df['patient_id'] == patient_id]
+        patient_row = od_data.iloc[0] if not od_data.empty else os_data.iloc[0]
+        patient = Patient(str(patient_id), int(patient_row['age']), Gender(int(patient_row['gender'])))
+        if not od_data.empty and not pd.isna(od_data.iloc[0]['diagnosis']):
+            patient.set_eye_data(_reference_eye(od_data.iloc[0], Eye.RIGHT))
+        if not os_data.empty and not pd.isna(os_data.iloc[0]['diagnosis']):
+            patient.set_eye_data(_reference_eye(os_data.iloc[0], Eye.LEFT))
+        dataset.add_patient(patient)
+    return dataset
+
+
+def patient_states(dataset) -> dict:
+    """Filas de Excel e imágenes de cada paciente, para comparar datasets de cualquier tipo."""
+    return {
+        patient_id: (patient_to_rows(patient),
+                     tuple(eye.fundus_image if eye is not None else None
+                           for eye in (patient.right_eye, patient.left_eye)))
+        for patient_id, patient in dataset.patients.items()
+    }
+
+
+def assert_same_statistics(expected: dict, actual: dict) -> None:
+    assert statistics_mismatches(expected, actual) == []
+
+
+def test_engine_matches_reference_loader(workbooks):
+    from features.data_loading import load_patient_data
+
+    reference = reference_load(*workbooks)
+    dataset = load_patient_data(*workbooks, lazy=False)
+
+    assert len(dataset.patients) == len(reference.patients) > 0
+    assert patient_states(dataset) == patient_states(reference)
+    assert_same_statistics(reference.get_statistics(), dataset.get_statistics())
+    assert dataset.verify_statistics() == []
+    assert reference.verify_statistics() == []
+
+
+def test_lazy_loading_matches_eager(workbooks):
+    from features.data_loading import load_patient_data
+
+    eager = load_patient_data(*workbooks, lazy=False)
+    lazy = load_patient_data(*workbooks, lazy=True)
+
+    assert list(lazy.patients) == list(eager.patients)
+    assert patient_states(lazy) == patient_states(eager)
+    assert_same_statistics(eager.get_statistics(), lazy.get_statistics())
+
+
+def test_menu_matches_interface(workbooks, monkeypatch):
+    import menu
+    from features.data_loading import load_patient_data
+
+    monkeypatch.setattr(menu, "patient_storage", "excel")
+    gestor = menu.GestorPacientes(*workbooks)
+    interface = load_patient_data(*workbooks, lazy=False)
+
+    assert list(gestor.dataset.patients) == list(interface.patients)
+    assert patient_states(gestor.dataset) == patient_states(interface)
+    assert_same_statistics(interface.get_statistics(), gestor.dataset.get_statistics())
+    assert gestor.dataset.verify_statistics() == []
+
+
+def test_sqlite_import_matches_interface(workbooks, tmp_path):
+    from features.data_loading import load_patient_data, load_patient_database
+
+    database = load_patient_database(str(tmp_path / "patients.sqlite"), *workbooks)
+    try:
+        interface = load_patient_data(*workbooks, lazy=False)
+        assert patient_states(database) == patient_states(interface)
+        assert_same_statistics(interface.get_statistics(), database.get_statistics())
+    finally:
+        database.close()
+
+
+def test_journal_changes_reach_every_loader(workbooks):
+    from features.data_loading import delete_patient_record, load_patient_data, save_patient_record
+
+    interface = load_patient_data(*workbooks, lazy=False)
+    first, second = list(interface.patients)[:2]
+    edited = interface.patients[first]
+    edited.age += 1
+    save_patient_record(edited, workbooks[0])
+    delete_patient_record(second, workbooks[0])
+
+    eager = load_patient_data(*workbooks, lazy=False)
+    lazy = load_patient_data(*workbooks, lazy=True)
+    assert eager.patients[first].age == edited.age
+    assert second not in eager.patients and second not in lazy.patients
+    assert patient_states(lazy) == patient_states(eager)
+    assert_same_statistics(eager.get_statistics(), lazy.get_statistics())
+    assert eager.verify_statistics() == []
+
+
+@pytest.mark.parametrize("field", ["age", "gender"])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_missing_demographics_fail(workbooks, field, lazy):
+    from features.data_loading import ExcelPairSource, FrameSource, build_patient_dataset
+
+    od_df, os_df = (df.copy() for df in ExcelPairSource(*workbooks).read_frames())
+    patient_id = od_df['patient_id'].iloc[0]
+    for df in (od_df, os_df):
+        df[field] = df[field].astype(float)
+        df.loc[df['patient_id'] == patient_id, field] = float('nan')
+
+    with pytest.raises(ValueError, match=field):
+        build_patient_dataset(FrameSource(od_df, os_df), lazy=lazy)
+
+
+def test_menu_rejects_missing_age(workbooks, monkeypatch):
+    import menu
+
+    od_excel_file = workbooks[0]
+    df = pd.read_excel(od_excel_file)
+    df.loc[0, 'age'] = None
+    df.to_excel(od_excel_file, index=False)
+
+    monkeypatch.setattr(menu, "patient_storage", "excel")
+    with pytest.raises(ValueError, match="age"):
+        menu.GestorPacientes(*workbooks)
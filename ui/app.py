@@ -1,34 +1,52 @@
+import logging
 import os
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
 
 from core.models import Eye
 # Importaciones internas
-from features.data_loading import load_patient_data
+from features.data_loading import load_patients
+from features.hot_reload import RELOAD_INTERVAL_MS, ExcelSourceWatcher, SourceChanges, apply_source_changes
+from features.patient_journal import patient_fingerprint
 from features.patient_management import add_patient, update_patient, delete_patient
+from ui.background_saver import BackgroundSaver
+from ui.image_prefetch import ImagePrefetcher
 from ui.patient_form import create_patient_form
 from ui.tabs.eye_tab import setup_eye_tab
 from ui.tabs.general_tab import setup_general_tab
 from ui.tabs.stats_tab import setup_stats_tab
 from utils.image_utils import open_external_image
 
+logger = logging.getLogger("app")
+
 # Obtener la ruta de imágenes de las variables de entorno
 FUNDUS_IMAGES_DIR = os.environ.get('FUNDUS_IMAGES_DIR', 'FundusImages')
 
+# Intervalo (ms) con el que se recoge el resultado de una recarga en curso
+RELOAD_POLL_MS = 100
+
 
 class PatientViewer:
     def __init__(self, root):
         self.images_dir = os.environ.get('FUNDUS_IMAGES_DIR', 'FundusImages')
         self.od_excel_file = os.environ.get('OD_EXCEL_FILE', 'patient_data_od.xlsx')
         self.os_excel_file = os.environ.get('OS_EXCEL_FILE', 'patient_data_os.xlsx')
+        self.storage = os.environ.get('PATIENT_STORAGE', 'excel')
         self.root = root
         self.root.title("Visualizador de Datos de Pacientes")
 
         # Configurar tamaño y posición
         self._configure_window()
 
-        # Cargar los datos usando las variables de entorno
-        self.dataset = load_patient_data(self.od_excel_file, self.os_excel_file)
+        # Vigilar los archivos para mostrar los cambios de otros procesos (se crea antes de
+        # cargar para no perder los cambios hechos durante la carga; la base SQLite se consulta al momento)
+        self.watcher = ExcelSourceWatcher(self.od_excel_file, self.os_excel_file) \
+            if self.storage == 'excel' else None
+
+        # Cargar los datos usando las variables de entorno (Excel o base SQLite)
+        self.dataset = load_patients(self.od_excel_file, self.os_excel_file, self.storage)
 
         # Ya no necesitamos cargar explícitamente las rutas de imágenes
         # self.od_images = load_image_paths(self.od_excel_file, self.images_dir)
@@ -43,6 +61,20 @@ class PatientViewer:
         self.od_photo = None
         self.os_photo = None
 
+        # Preparación en segundo plano de las imágenes de los pacientes vecinos
+        self.prefetcher = ImagePrefetcher(self.root, self.images_dir)
+
+        # Escritura en segundo plano de los cambios en el diario (la base SQLite guarda cada cambio al momento)
+        self.saver = BackgroundSaver(self.root, self._write_changes, self._on_save_error, self._on_save_conflict) \
+            if self.storage == 'excel' else None
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # Momento del último clic de navegación (para medir la latencia hasta el pintado)
+        self._click_time = None
+
+        # Contador de peticiones de imágenes, para descartar resultados de pacientes anteriores
+        self._image_request = 0
+
         # Crear la interfaz
         self._create_widgets()
 
@@ -55,6 +87,14 @@ class PatientViewer:
         else:
             self.clear_display()
 
+        # Las lecturas de la recarga se hacen en un hilo; los cambios se aplican en el de Tk
+        self._reload_executor = None
+        self._reload_future = None
+        if self.watcher is not None:
+            self._reload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hot-reload")
+            self._reload_future = self._reload_executor.submit(self.watcher.prepare)
+            self.root.after(RELOAD_INTERVAL_MS, self._check_sources)
+
     def _configure_window(self):
         window_width = 780
         window_height = 780  # Reducción de altura
@@ -72,6 +112,73 @@ class PatientViewer:
         style.configure("TButton", padding=(4, 2))  # Botones más compactos
         style.configure("TLabel", padding=(2, 1))  # Etiquetas más compactas
 
+    def _on_close(self):
+        """Escribe los cambios pendientes, detiene la precarga de imágenes y cierra la ventana"""
+        if self.saver is not None:
+            if not self.saver.flush():
+                pending = self.saver.pending()
+                if not messagebox.askyesno(
+                        "Cambios sin guardar",
+                        f"No se pudieron guardar {pending} cambios. ¿Desea cerrar de todas formas y perderlos?"):
+                    return
+            conflicts = self.saver.take_conflicts()
+            if conflicts:
+                messagebox.showwarning("Cambios rechazados", self._conflict_message(conflicts))
+            self.saver.close(timeout=0)
+        if self._reload_executor is not None:
+            self._reload_executor.shutdown(wait=False)
+        self.prefetcher.shutdown()
+        self.root.destroy()
+
+    def _check_sources(self):
+        """Busca cambios de otros procesos en los archivos de datos y aplica los que encuentre"""
+        future = self._reload_future
+        if future is not None and future.done():
+            self._reload_future = None
+            try:
+                changes = future.result()
+            except Exception as e:
+                print(f"❌ Error al recargar los datos: {str(e)}")
+                changes = None
+            if isinstance(changes, SourceChanges):
+                self._apply_source_changes(changes)
+
+        if self._reload_future is None and self.watcher.changed():
+            self._reload_future = self._reload_executor.submit(self.watcher.diff)
+        self.root.after(RELOAD_POLL_MS if self._reload_future is not None else RELOAD_INTERVAL_MS,
+                        self._check_sources)
+
+    def _apply_source_changes(self, changes):
+        """Aplica al dataset los pacientes que cambiaron y refresca la vista si hace falta"""
+        # Los cambios de esta ventana aún sin escribir tienen prioridad
+        skip = self.saver.pending_ids() if self.saver is not None else ()
+        report = apply_source_changes(self.dataset, changes, skip)
+        self.watcher.accept(changes)
+
+        changed = report["added"] + report["updated"] + report["removed"]
+        if not changed:
+            return
+
+        for patient_id in report["updated"] + report["removed"]:
+            self.prefetcher.forget(patient_id)
+
+        # Seguir mostrando el mismo paciente si sigue existiendo
+        current_id = self.patient_ids[self.current_index] if self.patient_ids else None
+        self.patient_ids = sorted(self.dataset.patients.keys())
+        if current_id in self.dataset.patients:
+            self.current_index = self.patient_ids.index(current_id)
+        else:
+            self.current_index = min(max(self.current_index, 0), len(self.patient_ids) - 1)
+
+        if self.patient_ids:
+            self.display_patient_data()
+        else:
+            self.clear_display()
+        setup_stats_tab(self.stats_tab, self.dataset)
+
+        print(f"🔄 Datos actualizados desde los archivos: {len(report['added'])} nuevos, "
+              f"{len(report['updated'])} modificados, {len(report['removed'])} eliminados")
+
     def bring_to_front(self):
         """Trae la ventana al frente cuando se restaura"""
         self.root.attributes('-topmost', True)
@@ -203,6 +310,9 @@ class PatientViewer:
         self.delete_btn = ttk.Button(manage_frame, text="Eliminar", command=self.delete_patient, width=8)
         self.delete_btn.pack(side=tk.LEFT, padx=1)
 
+        self.export_btn = ttk.Button(manage_frame, text="Exportar", command=self.export_excel, width=8)
+        self.export_btn.pack(side=tk.LEFT, padx=1)
+
     def display_patient_data(self):
         """Muestra los datos del paciente actual"""
         if not self.patient_ids:
@@ -237,64 +347,90 @@ class PatientViewer:
         self.edit_btn.config(state=tk.NORMAL)
         self.delete_btn.config(state=tk.NORMAL)
 
+        # Preparar en segundo plano las imágenes de los pacientes vecinos
+        self.prefetcher.schedule(self.patient_ids, self.current_index)
+
+    def _report_paint_latency(self, click_time):
+        """Registra (nivel DEBUG) el tiempo entre el clic de navegación y el pintado de las imágenes"""
+        logger.debug(f"Latencia clic-pintado: {(time.perf_counter() - click_time) * 1000:.1f} ms")
+
+    def _eye_widgets(self, eye_type):
+        """Devuelve el label y el botón de la imagen de un ojo"""
+        if eye_type == Eye.RIGHT:
+            return self.od_img_label, self.od_img_btn
+        return self.os_img_label, self.os_img_btn
+
+    def _set_eye_image(self, eye_type, img, photo):
+        """Guarda la imagen mostrada de un ojo (las referencias evitan que Tk la libere)"""
+        if eye_type == Eye.RIGHT:
+            self.od_image, self.od_photo = img, photo
+        else:
+            self.os_image, self.os_photo = img, photo
+
     def update_images(self, patient_id):
         """
-        Actualiza las imágenes de fondo de ojo para el paciente actual
-        usando el nuevo módulo de utilidades de imágenes.
-        """
-        # Importar el nuevo módulo de utilidades de imágenes
-        from utils.image_utils import find_image_for_patient, load_and_display_image
+        Actualiza las imágenes de fondo de ojo para el paciente actual sin bloquear la interfaz.
 
-        # Limpiar imágenes previas
-        self.od_img_label.config(image='')
-        self.os_img_label.config(image='')
-        self.od_photo = None
-        self.os_photo = None
+        Las imágenes ya preparadas en segundo plano se muestran al momento; las demás
+        muestran un marcador y se cargan en hilos (ambos ojos a la vez). Cada
+        resultado se aplica solo si sigue siendo de la última petición, de modo que
+        al navegar rápido nunca aparece la imagen de otro paciente.
+        """
+        # Identificador de esta petición: los resultados de peticiones anteriores se descartan
+        self._image_request += 1
+        request = self._image_request
+        click_time, self._click_time = self._click_time, None
 
         # Obtener el paciente actual
         patient = self.dataset.patients[patient_id]
-
-        # Log para depuración
         print(f"DEBUG - Actualizando imágenes para paciente: {patient_id}")
-        print(f"DEBUG - Directorio de imágenes: {self.images_dir}")
-
-        # Buscar y cargar imagen OD
-        od_path = find_image_for_patient(patient_id, Eye.RIGHT, self.images_dir)
-        if od_path:
-            print(f"DEBUG - Imagen OD encontrada: {od_path}")
-            self.od_image, self.od_photo = load_and_display_image(od_path, self.od_img_label, self.images_dir)
-            self.od_img_btn.config(state=tk.NORMAL)
-        else:
-            print(f"DEBUG - No se encontró imagen OD para paciente {patient_id}")
-            self.od_img_label.config(text="Imagen no disponible")
-            self.od_img_btn.config(state=tk.DISABLED)
-
-            # Intentar usar la ruta almacenada en el objeto paciente como respaldo
-            if patient.right_eye and patient.right_eye.fundus_image:
-                od_path = patient.right_eye.fundus_image
-                print(f"DEBUG - Intentando con ruta desde objeto paciente: {od_path}")
-                if os.path.exists(od_path):
-                    self.od_image, self.od_photo = load_and_display_image(od_path, self.od_img_label, self.images_dir)
-                    self.od_img_btn.config(state=tk.NORMAL)
-
-        # Buscar y cargar imagen OS
-        os_path = find_image_for_patient(patient_id, Eye.LEFT, self.images_dir)
-        if os_path:
-            print(f"DEBUG - Imagen OS encontrada: {os_path}")
-            self.os_image, self.os_photo = load_and_display_image(os_path, self.os_img_label, self.images_dir)
-            self.os_img_btn.config(state=tk.NORMAL)
+
+        waiting = []
+        for eye_type, eye_data in ((Eye.RIGHT, patient.right_eye), (Eye.LEFT, patient.left_eye)):
+            label, button = self._eye_widgets(eye_type)
+
+            prepared = self.prefetcher.get(patient_id, eye_type)
+            if prepared is not None:
+                _, img, photo = prepared
+                label.config(image=photo, text="")
+                button.config(state=tk.NORMAL)
+                self._set_eye_image(eye_type, img, photo)
+                continue
+
+            # Marcador mientras se carga la imagen
+            label.config(image='', text="Cargando...")
+            button.config(state=tk.DISABLED)
+            self._set_eye_image(eye_type, None, None)
+            waiting.append(eye_type)
+
+            fallback_path = eye_data.fundus_image if eye_data else None
+            self.prefetcher.load(patient_id, eye_type, fallback_path,
+                                 lambda path, img, photo, eye_type=eye_type:
+                                 self._apply_loaded_image(request, eye_type, path, img, photo, waiting, click_time))
+
+        if not waiting and click_time is not None:
+            self.root.after_idle(self._report_paint_latency, click_time)
+
+    def _apply_loaded_image(self, request, eye_type, image_path, img, photo, waiting, click_time):
+        """Muestra una imagen cargada en segundo plano si sigue siendo del paciente actual"""
+        if request != self._image_request:
+            return
+
+        label, button = self._eye_widgets(eye_type)
+        if image_path is None:
+            label.config(image='', text="Imagen no disponible")
+            button.config(state=tk.DISABLED)
+        elif photo is None:
+            label.config(image='', text="Error")
+            button.config(state=tk.DISABLED)
         else:
-            print(f"DEBUG - No se encontró imagen OS para paciente {patient_id}")
-            self.os_img_label.config(text="Imagen no disponible")
-            self.os_img_btn.config(state=tk.DISABLED)
-
-            # Intentar usar la ruta almacenada en el objeto paciente como respaldo
-            if patient.left_eye and patient.left_eye.fundus_image:
-                os_path = patient.left_eye.fundus_image
-                print(f"DEBUG - Intentando con ruta desde objeto paciente: {os_path}")
-                if os.path.exists(os_path):
-                    self.os_image, self.os_photo = load_and_display_image(os_path, self.os_img_label, self.images_dir)
-                    self.os_img_btn.config(state=tk.NORMAL)
+            label.config(image=photo, text="")
+            button.config(state=tk.NORMAL)
+            self._set_eye_image(eye_type, img, photo)
+
+        waiting.remove(eye_type)
+        if not waiting and click_time is not None:
+            self.root.after_idle(self._report_paint_latency, click_time)
 
     def open_image(self, eye_side):
         """Abre la imagen en el visor predeterminado del sistema"""
@@ -325,12 +461,14 @@ class PatientViewer:
     def prev_patient(self):
         """Navega al paciente anterior"""
         if self.current_index > 0:
+            self._click_time = time.perf_counter()
             self.current_index -= 1
             self.display_patient_data()
 
     def next_patient(self):
         """Navega al siguiente paciente"""
         if self.current_index < len(self.patient_ids) - 1:
+            self._click_time = time.perf_counter()
             self.current_index += 1
             self.display_patient_data()
 
@@ -348,9 +486,8 @@ class PatientViewer:
                 # Actualizar dataset
                 self.dataset.add_patient(new_patient)
 
-                # Actualizar Excel
-                from features.data_loading import update_excel_files
-                update_excel_files(new_patient, False)
+                # Registrar el cambio (los Excel se actualizan al exportar)
+                self._record_save(new_patient, patient_fingerprint(None))
 
                 # Actualizar interfaz
                 self.patient_ids = sorted(self.dataset.patients.keys())
@@ -376,6 +513,8 @@ class PatientViewer:
 
         patient_id = self.patient_ids[self.current_index]
         patient = self.dataset.patients[patient_id]
+        # Datos en que se basa la edición (update_patient modifica el paciente)
+        base = patient_fingerprint(patient)
 
         form_window = tk.Toplevel(self.root)
         form_window.title("Editar Paciente")
@@ -389,11 +528,11 @@ class PatientViewer:
                 # Actualizar dataset
                 self.dataset.update_patient(updated_patient)
 
-                # Actualizar Excel
-                from features.data_loading import update_excel_files
-                update_excel_files(updated_patient, True)
+                # Registrar el cambio (los Excel se actualizan al exportar)
+                self._record_save(updated_patient, base)
 
-                # Actualizar interfaz
+                # Actualizar interfaz (la imagen puede haber cambiado con la misma ruta)
+                self.prefetcher.forget(patient_id)
                 self.display_patient_data()
 
                 # Actualizar estadísticas
@@ -419,12 +558,13 @@ class PatientViewer:
         patient_id = self.patient_ids[self.current_index]
         if messagebox.askyesno("Confirmar", f"¿Está seguro de que desea eliminar al paciente {patient_id}?"):
             try:
+                base = patient_fingerprint(self.dataset.patients[patient_id])
+
                 # Eliminar paciente
                 delete_patient(patient_id, self.dataset)
 
-                # Actualizar Excel
-                from features.data_loading import delete_from_excel
-                delete_from_excel(patient_id)
+                # Registrar la baja (los Excel se actualizan al exportar)
+                self._record_delete(patient_id, base)
 
                 # Actualizar interfaz
                 self.patient_ids = sorted(self.dataset.patients.keys())
@@ -445,6 +585,62 @@ class PatientViewer:
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo eliminar el paciente: {str(e)}")
 
+    def _record_save(self, patient, base):
+        """Anota un alta o edición para el diario (la base SQLite ya la guardó el dataset)"""
+        if self.saver is not None:
+            self.saver.save(patient, base)
+
+    def _record_delete(self, patient_id, base):
+        """Anota una baja para el diario (la base SQLite ya la guardó el dataset)"""
+        if self.saver is not None:
+            self.saver.delete(patient_id, base)
+
+    def _write_changes(self, changes, bases):
+        """Escribe en el diario los cambios acumulados y devuelve los rechazados por conflicto (hilo de escritura)"""
+        from features.data_loading import record_patient_changes
+        return record_patient_changes(changes, self.od_excel_file, self.os_excel_file, bases)
+
+    def _on_save_error(self, error):
+        """Muestra un error de la escritura en segundo plano"""
+        messagebox.showerror("Error", f"No se pudieron guardar los cambios: {str(error)}\n"
+                                      f"Se volverá a intentar con el próximo cambio o al cerrar la ventana.")
+
+    @staticmethod
+    def _conflict_message(patient_ids):
+        return (f"Otro usuario modificó {len(patient_ids)} pacientes mientras se editaban aquí "
+                f"({', '.join(sorted(patient_ids)[:10])}). Sus cambios en esta ventana no se guardaron.")
+
+    def _on_save_conflict(self, patient_ids):
+        """Avisa de los cambios rechazados y vuelve a leer esos pacientes de los archivos"""
+        messagebox.showwarning("Cambios rechazados",
+                               self._conflict_message(patient_ids) + "\nSe muestran los datos guardados.")
+        self.watcher.forget(patient_ids)
+
+    def export_excel(self):
+        """Vuelca a los archivos Excel los cambios registrados desde la última exportación"""
+        try:
+            if self.storage == 'sqlite':
+                from features.data_loading import export_database_to_excel
+                exported = export_database_to_excel(self.dataset, self.od_excel_file, self.os_excel_file)
+                messagebox.showinfo("Éxito", f"{exported} pacientes exportados a los archivos Excel")
+                return
+
+            # Los cambios aún en memoria deben llegar al diario antes de volcarlo
+            if not self.saver.flush():
+                messagebox.showerror("Error", "No se pudieron guardar los cambios pendientes; no se exportó nada")
+                return
+
+            from features.data_loading import compact_journal
+            exported = compact_journal(self.od_excel_file, self.os_excel_file)
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudieron exportar los datos: {str(e)}")
+            return
+
+        if exported:
+            messagebox.showinfo("Éxito", f"{exported} cambios exportados a los archivos Excel")
+        else:
+            messagebox.showinfo("Información", "Los archivos Excel ya están al día")
+
     def clear_display(self):
         """Limpia la pantalla cuando no hay pacientes"""
         self.patient_label.config(text="No hay pacientes")
@@ -460,7 +656,8 @@ class PatientViewer:
         update_eye_data(None, self.os_diagnosis_label, self.os_crystalline_label,
                         self.os_ref_labels, self.os_meas_labels)
 
-        # Limpiar imágenes
+        # Limpiar imágenes (y descartar las cargas en curso)
+        self._image_request += 1
         self.od_img_label.config(image='', text="Imagen no disponible")
         self.os_img_label.config(image='', text="Imagen no disponible")
         self.od_img_btn.config(state=tk.DISABLED)
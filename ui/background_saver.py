@@ -0,0 +1,257 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.models import Patient
+from features.patient_journal import patient_to_rows
+
+logger = logging.getLogger("background_saver")
+
+# Tiempo (ms) sin cambios nuevos antes de escribir los cambios pendientes
+SAVE_DEBOUNCE_MS = int(os.environ.get('SAVE_DEBOUNCE_MS', 500))
+
+# Tiempo máximo (ms) que un cambio puede esperar aunque sigan llegando otros
+SAVE_MAX_DELAY_MS = int(os.environ.get('SAVE_MAX_DELAY_MS', 5000))
+
+# Intervalo (ms) con el que el hilo de la interfaz recoge los errores de escritura
+POLL_INTERVAL_MS = 100
+
+# Cambio pendiente de un paciente: (fila OD, fila OS), o None si se eliminó
+Change = Optional[Tuple[Optional[dict], Optional[dict]]]
+
+
+class BackgroundSaver:
+    """
+    Guarda fuera del hilo de Tk las altas, ediciones y bajas de pacientes.
+
+    Los cambios se anotan en un conjunto de pacientes pendientes (el último
+    cambio de cada paciente sustituye al anterior) y un hilo los escribe juntos
+    cuando pasan SAVE_DEBOUNCE_MS sin cambios nuevos, o como mucho
+    SAVE_MAX_DELAY_MS después del primero. Las filas se calculan al anotar el
+    cambio, en el hilo de Tk, así que el hilo de escritura no lee pacientes que
+    la interfaz puede estar modificando.
+
+    Si una escritura falla, sus cambios vuelven a quedar pendientes y el error
+    se entrega a on_error en el hilo de Tk; se reintentan con el siguiente
+    cambio o con flush (por ejemplo, al cerrar la ventana).
+
+    Cada cambio lleva la huella del paciente en que se basó (la del primer
+    cambio pendiente si se acumulan varios). write recibe los cambios y sus
+    bases y devuelve los IDs rechazados porque otro escritor cambió antes al
+    paciente; esos cambios se descartan y los IDs se entregan a on_conflict en
+    el hilo de Tk.
+    """
+
+    def __init__(self, root, write: Callable[[Dict[str, Change], Dict[str, str]], List[str]],
+                 on_error: Callable[[Exception], None], on_conflict: Callable[[List[str]], None],
+                 debounce_ms: int = SAVE_DEBOUNCE_MS, max_delay_ms: int = SAVE_MAX_DELAY_MS):
+        self.root = root
+        self._write = write
+        self._on_error = on_error
+        self._on_conflict = on_conflict
+        self._debounce = debounce_ms / 1000
+        self._max_delay = max_delay_ms / 1000
+        self._condition = threading.Condition()
+        self._dirty: Dict[str, Change] = {}
+        self._bases: Dict[str, str] = {}
+        self._first_change = 0.0
+        self._last_change = 0.0
+        self._in_flight: Dict[str, Change] = {}
+        self._flush_requested = False
+        # Tras un fallo no se reintenta hasta el siguiente cambio o flush
+        self._held = False
+        self._failures = 0
+        self._closing = False
+        self._errors: "queue.Queue[Exception]" = queue.Queue()
+        self._conflicts: "queue.Queue[List[str]]" = queue.Queue()
+        self._polling = False
+        self._thread = threading.Thread(target=self._run, name="background-saver", daemon=True)
+        self._thread.start()
+
+    def save(self, patient: Patient, base: str) -> None:
+        """
+        Anota el alta o la edición de un paciente.
+
+        Args:
+            patient: Paciente con los datos actuales
+            base: Huella del paciente antes de editarlo (patient_fingerprint(None) para un alta)
+        """
+        self._mark(patient.patient_id, patient_to_rows(patient), base)
+
+    def delete(self, patient_id: str, base: str) -> None:
+        """
+        Anota la baja de un paciente.
+
+        Args:
+            patient_id: ID del paciente eliminado
+            base: Huella del paciente antes de eliminarlo
+        """
+        self._mark(patient_id, None, base)
+
+    def _mark(self, patient_id: str, change: Change, base: str) -> None:
+        with self._condition:
+            now = time.monotonic()
+            if not self._dirty:
+                self._first_change = now
+            self._last_change = now
+            self._dirty.pop(patient_id, None)
+            self._dirty[patient_id] = change
+            # Varios cambios sin escribir se basan en lo que había antes del primero
+            self._bases.setdefault(patient_id, base)
+            self._held = False
+            self._condition.notify_all()
+        self._start_polling()
+
+    def pending(self) -> int:
+        """Número de pacientes con cambios aún no escritos (incluidos los que se están escribiendo)."""
+        with self._condition:
+            return len(self._dirty) + len(self._in_flight)
+
+    def pending_ids(self) -> set:
+        """IDs de los pacientes con cambios aún no escritos."""
+        with self._condition:
+            return set(self._dirty) | set(self._in_flight)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Escribe ya los cambios pendientes y espera a que terminen.
+
+        Args:
+            timeout: Segundos máximos de espera (None para esperar sin límite)
+
+        Returns:
+            True si no queda ningún cambio sin escribir; si es False, los errores
+            de escritura ya no se entregan a on_error
+        """
+        with self._condition:
+            failures = self._failures
+            self._flush_requested = True
+            self._held = False
+            self._condition.notify_all()
+            self._condition.wait_for(
+                lambda: (not self._dirty and not self._in_flight) or self._failures != failures, timeout)
+            saved = not self._dirty and not self._in_flight
+            # La petición termina con la espera, aunque no hubiera nada que escribir:
+            # si quedara activa, la siguiente ráfaga se escribiría sin debounce
+            self._flush_requested = False
+        # El resultado sustituye a los errores aún no mostrados de esos cambios
+        if not saved:
+            self._drain_errors()
+        return saved
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Escribe los cambios pendientes y detiene el hilo de escritura.
+
+        Args:
+            timeout: Segundos máximos de espera de la escritura
+
+        Returns:
+            True si no quedó ningún cambio sin escribir
+        """
+        saved = self.flush(timeout)
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        return saved
+
+    def _next_batch(self) -> Optional[Dict[str, Change]]:
+        """Espera a que toque escribir y toma los cambios pendientes (None al cerrar)."""
+        with self._condition:
+            while (not self._dirty or self._held) and not self._closing:
+                self._condition.wait()
+            # Esperar a que dejen de llegar cambios, salvo que se pida escribir ya
+            while not self._flush_requested and not self._closing:
+                now = time.monotonic()
+                deadline = min(self._last_change + self._debounce, self._first_change + self._max_delay)
+                if now >= deadline:
+                    break
+                self._condition.wait(deadline - now)
+            if self._closing:
+                return None
+            batch, self._dirty = self._dirty, {}
+            self._flush_requested = False
+            self._in_flight = batch
+            return batch
+
+    def _take_bases(self, batch: Dict[str, Change]) -> Dict[str, str]:
+        """Saca las bases de los cambios de un lote (con el candado tomado)."""
+        return {patient_id: self._bases.pop(patient_id) for patient_id in batch if patient_id in self._bases}
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            with self._condition:
+                bases = self._take_bases(batch)
+            error = None
+            conflicts = []
+            try:
+                conflicts = self._write(batch, bases)
+            except Exception as e:
+                logger.error(f"Error al guardar {len(batch)} cambios: {str(e)}")
+                error = e
+            with self._condition:
+                self._in_flight = {}
+                if conflicts:
+                    logger.warning(f"Cambios rechazados por conflicto: {', '.join(conflicts)}")
+                    self._conflicts.put(conflicts)
+                if error is not None:
+                    # Los cambios posteriores de los mismos pacientes tienen prioridad, pero
+                    # se siguen basando en lo que había antes de este lote, que no se escribió
+                    for patient_id, change in batch.items():
+                        self._dirty.setdefault(patient_id, change)
+                    self._bases.update(bases)
+                    self._first_change = self._last_change = time.monotonic()
+                    self._held = True
+                    self._failures += 1
+                    self._errors.put(error)
+                self._condition.notify_all()
+
+    def _start_polling(self) -> None:
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def _drain_errors(self) -> list:
+        errors = []
+        while True:
+            try:
+                errors.append(self._errors.get_nowait())
+            except queue.Empty:
+                return errors
+
+    def take_conflicts(self) -> List[str]:
+        """
+        Devuelve los IDs rechazados por conflicto que aún no se entregaron a on_conflict.
+
+        Sirve para avisar de ellos al cerrar la ventana, cuando ya no se recogen con root.after.
+        """
+        conflicts = []
+        while True:
+            try:
+                conflicts.extend(self._conflicts.get_nowait())
+            except queue.Empty:
+                return conflicts
+
+    def _poll(self) -> None:
+        """Entrega los errores de escritura a on_error y los conflictos a on_conflict (hilo de Tk)."""
+        for error in self._drain_errors():
+            self._on_error(error)
+        conflicts = self.take_conflicts()
+        if conflicts:
+            self._on_conflict(conflicts)
+
+        with self._condition:
+            # Los errores se encolan con el candado tomado: no se pierde ninguno entre las dos comprobaciones
+            busy = ((self._dirty and not self._held) or self._in_flight or not self._errors.empty()
+                    or not self._conflicts.empty())
+        if busy:
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+        else:
+            self._polling = False
@@ -0,0 +1,227 @@
+import logging
+import os
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from PIL import Image, ImageTk
+
+from core.models import Eye
+from utils.image_utils import find_image_for_patient
+from utils.thumbnail_cache import get_thumbnail_cache
+
+logger = logging.getLogger("image_prefetch")
+
+# Número de pacientes vecinos (hacia cada lado) cuyas imágenes se preparan
+PREFETCH_DISTANCE = int(os.environ.get('PREFETCH_DISTANCE', 3))
+
+# Hilos que decodifican miniaturas en segundo plano
+PREFETCH_WORKERS = 2
+
+# Hilos reservados para las imágenes del paciente mostrado (una por ojo)
+CURRENT_WORKERS = 2
+
+# Intervalo (ms) con el que el hilo de la interfaz recoge los resultados
+POLL_INTERVAL_MS = 10
+
+
+class ImagePrefetcher:
+    """
+    Carga fuera del hilo de Tk las miniaturas del paciente mostrado (load) y
+    prepara las de los pacientes vecinos (schedule).
+
+    Los hilos buscan la imagen y la decodifican (a través de la caché de
+    miniaturas); los resultados se dejan en una cola que el hilo de Tk vacía con
+    root.after, donde solo se crea el ImageTk.PhotoImage. El paciente mostrado
+    tiene su propio pool, para no esperar detrás de la precarga. Al saltar a
+    otro paciente se cancelan las tareas que ya no son vecinas.
+    """
+
+    def __init__(self, root, images_dir: str, distance: int = PREFETCH_DISTANCE,
+                 workers: int = PREFETCH_WORKERS):
+        self.root = root
+        self.images_dir = images_dir
+        self.distance = distance
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._current_executor = ThreadPoolExecutor(max_workers=CURRENT_WORKERS, thread_name_prefix="image-load")
+        self._results: "queue.Queue[tuple]" = queue.Queue()
+        self._pending: Dict[Tuple[str, Eye], Future] = {}
+        self._loading: Dict[Eye, Future] = {}
+        self._wanted: Set[str] = set()
+        self._photos: "OrderedDict[Tuple[str, Eye], Tuple[str, Image.Image, ImageTk.PhotoImage]]" = OrderedDict()
+        self._max_photos = 2 * (2 * distance + 1)
+        self._polling = False
+
+    def _neighbours(self, patient_ids: Sequence[str], current_index: int) -> List[str]:
+        """IDs vecinos ordenados por cercanía: +1, -1, +2, -2, ..."""
+        neighbours = []
+        for step in range(1, self.distance + 1):
+            for index in (current_index + step, current_index - step):
+                if 0 <= index < len(patient_ids):
+                    neighbours.append(patient_ids[index])
+        return neighbours
+
+    def schedule(self, patient_ids: Sequence[str], current_index: int) -> None:
+        """
+        Encola la preparación de las imágenes de los vecinos del paciente actual.
+
+        Args:
+            patient_ids: IDs en el orden de navegación
+            current_index: Posición del paciente mostrado
+        """
+        neighbours = self._neighbours(patient_ids, current_index)
+        self._wanted = set(neighbours)
+
+        # Cancelar lo que ya no es vecino (las tareas en curso terminan, pero se descartan)
+        for key, future in list(self._pending.items()):
+            if key[0] not in self._wanted:
+                future.cancel()
+                del self._pending[key]
+
+        for patient_id in neighbours:
+            for eye_type in (Eye.RIGHT, Eye.LEFT):
+                key = (patient_id, eye_type)
+                if key not in self._pending and key not in self._photos:
+                    self._pending[key] = self._executor.submit(self._prepare, patient_id, eye_type)
+
+        self._start_polling()
+
+    def load(self, patient_id: str, eye_type: Eye, fallback_path: Optional[str],
+             on_ready: Callable[[Optional[str], Optional[Image.Image], Optional[ImageTk.PhotoImage]], None]) -> None:
+        """
+        Carga en segundo plano la imagen de un ojo del paciente mostrado.
+
+        on_ready se llama en el hilo de Tk con (ruta, imagen, PhotoImage); la ruta
+        es None si no hay imagen y la imagen es None si no se pudo decodificar.
+        Una carga anterior del mismo ojo que aún no empezó se cancela.
+
+        Args:
+            patient_id: ID del paciente
+            eye_type: Ojo de la imagen
+            fallback_path: Ruta guardada en el paciente, usada si no se encuentra en el directorio
+            on_ready: Función que recibe el resultado
+        """
+        previous = self._loading.pop(eye_type, None)
+        if previous is not None:
+            previous.cancel()
+        self._loading[eye_type] = self._current_executor.submit(
+            self._load, patient_id, eye_type, fallback_path, on_ready)
+        self._start_polling()
+
+    def _load(self, patient_id: str, eye_type: Eye, fallback_path: Optional[str], on_ready: Callable) -> None:
+        """Busca y decodifica la imagen del paciente mostrado (hilo del pool)."""
+        image_path, img = None, None
+        try:
+            image_path = find_image_for_patient(patient_id, eye_type, self.images_dir)
+            if image_path is None and fallback_path and os.path.exists(fallback_path):
+                image_path = fallback_path
+            if image_path is not None:
+                img = get_thumbnail_cache().get_thumbnail(image_path)
+        except Exception as e:
+            logger.error(f"Error al cargar la imagen de {patient_id} ({eye_type.name}): {str(e)}")
+        self._results.put((patient_id, eye_type, image_path, img, on_ready))
+
+    def _start_polling(self) -> None:
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def _prepare(self, patient_id: str, eye_type: Eye) -> None:
+        """
+        Busca y decodifica una imagen (se ejecuta en un hilo del pool).
+
+        Siempre deja un resultado en la cola, aunque sea vacío, para que el hilo
+        de Tk sepa que la tarea terminó.
+        """
+        image_path, img = None, None
+        if patient_id in self._wanted:
+            try:
+                image_path = find_image_for_patient(patient_id, eye_type, self.images_dir)
+                if image_path is not None:
+                    img = get_thumbnail_cache().get_thumbnail(image_path)
+            except Exception as e:
+                logger.warning(f"No se pudo preparar la imagen de {patient_id} ({eye_type.name}): {str(e)}")
+        self._results.put((patient_id, eye_type, image_path, img, None))
+
+    def _poll(self) -> None:
+        """Crea los PhotoImage de las miniaturas terminadas (hilo de Tk)."""
+        # Una tarea terminada ya dejó su resultado en la cola antes de marcarse como hecha
+        finished = [key for key, future in self._pending.items() if future.done()]
+        loaded = [eye_type for eye_type, future in self._loading.items() if future.done()]
+
+        while True:
+            try:
+                patient_id, eye_type, image_path, img, on_ready = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if on_ready is not None:
+                photo = None
+                if img is not None:
+                    try:
+                        photo = ImageTk.PhotoImage(img)
+                        self.remember(patient_id, eye_type, image_path, img, photo)
+                    except Exception as e:
+                        logger.error(f"Error creando PhotoImage: {str(e)}")
+                on_ready(image_path, img, photo)
+            elif img is not None and patient_id in self._wanted:
+                self.remember(patient_id, eye_type, image_path, img, ImageTk.PhotoImage(img))
+
+        for key in finished:
+            self._pending.pop(key, None)
+        for eye_type in loaded:
+            del self._loading[eye_type]
+
+        if self._pending or self._loading:
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def remember(self, patient_id: str, eye_type: Eye, image_path: str, img: Image.Image,
+                 photo: ImageTk.PhotoImage) -> None:
+        """
+        Guarda una imagen ya preparada (también las del paciente mostrado, para volver a él).
+
+        Args:
+            patient_id: ID del paciente
+            eye_type: Ojo de la imagen
+            image_path: Ruta de la imagen
+            img: Miniatura
+            photo: PhotoImage de la miniatura
+        """
+        self._photos[(patient_id, eye_type)] = (image_path, img, photo)
+        self._photos.move_to_end((patient_id, eye_type))
+        while len(self._photos) > self._max_photos:
+            self._photos.popitem(last=False)
+
+    def get(self, patient_id: str, eye_type: Eye) -> Optional[Tuple[str, Image.Image, ImageTk.PhotoImage]]:
+        """
+        Devuelve la imagen ya preparada de un ojo de un paciente, si la hay.
+
+        Args:
+            patient_id: ID del paciente
+            eye_type: Ojo de la imagen
+
+        Returns:
+            Tupla (ruta, imagen, PhotoImage) o None
+        """
+        prepared = self._photos.get((patient_id, eye_type))
+        if prepared is not None:
+            self._photos.move_to_end((patient_id, eye_type))
+        return prepared
+
+    def forget(self, patient_id: str) -> None:
+        """
+        Descarta las imágenes preparadas de un paciente (por ejemplo, tras editarlo).
+
+        Args:
+            patient_id: ID del paciente
+        """
+        for eye_type in (Eye.RIGHT, Eye.LEFT):
+            self._photos.pop((patient_id, eye_type), None)
+
+    def shutdown(self) -> None:
+        """Cancela las tareas pendientes y detiene los hilos."""
+        self._wanted = set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._current_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Segundos máximos de espera por un bloqueo que tiene otro proceso
+LOCK_TIMEOUT = float(os.environ.get('FILE_LOCK_TIMEOUT', 60))
+
+# Intervalo (s) entre intentos de tomar el bloqueo
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    Bloqueo exclusivo y consultivo sobre un archivo, entre procesos y entre hilos.
+
+    Solo excluye a quien también toma el bloqueo (flock en POSIX, msvcrt.locking
+    en Windows). Es reentrante en el mismo hilo, así que una función que lo tiene
+    puede llamar a otra que también lo pide. El sistema lo libera si el proceso
+    muere, así que nunca queda un bloqueo huérfano.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        """
+        Toma el bloqueo, esperando a que lo suelte otro proceso o hilo.
+
+        Args:
+            timeout: Segundos máximos de espera (por defecto, LOCK_TIMEOUT)
+
+        Raises:
+            TimeoutError: Si el bloqueo no se consiguió a tiempo
+        """
+        timeout = LOCK_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=timeout):
+            raise TimeoutError(f"No se pudo bloquear {self.path} en {timeout:g} s")
+        if self._depth:
+            self._depth += 1
+            return
+
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                self._thread_lock.release()
+                raise TimeoutError(f"No se pudo bloquear {self.path} en {timeout:g} s (lo tiene otro proceso)")
+            time.sleep(LOCK_POLL_INTERVAL)
+        self._fd = fd
+        self._depth = 1
+
+    def release(self) -> None:
+        """Suelta el bloqueo (el último release del hilo lo libera para los demás)."""
+        self._depth -= 1
+        if not self._depth:
+            fd, self._fd = self._fd, None
+            try:
+                _unlock(fd)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+
+_locks: Dict[str, FileLock] = {}
+_locks_lock = threading.Lock()
+
+
+def get_file_lock(path: str) -> FileLock:
+    """
+    Devuelve el bloqueo compartido de un archivo dentro del proceso.
+
+    Todos los hilos deben usar el mismo objeto para que sea reentrante.
+
+    Args:
+        path: Ruta del archivo de bloqueo (se crea si no existe)
+
+    Returns:
+        FileLock del archivo
+    """
+    key = os.path.abspath(path)
+    with _locks_lock:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = FileLock(key)
+        return lock
@@ -0,0 +1,291 @@
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("image_index")
+
+# Segundos mínimos entre dos comprobaciones del mtime del directorio
+REFRESH_INTERVAL = 1.0
+
+# Resolución del mtime en sistemas de archivos de red o FAT: si el directorio se
+# modificó hace menos que esto, un cambio posterior podría no alterar su mtime
+MTIME_GRANULARITY_NS = 2_000_000_000
+
+# Por encima de este número de cambios se reconstruye el índice ordenado completo
+REBUILD_THRESHOLD = 64
+
+IMAGE_EXTENSIONS = ('.JPG', '.JPEG', '.PNG')
+
+# Nombre de una imagen de fondo de ojo según generate_image_name: RET{id}{OD|OS}.jpg
+# (sin distinguir mayúsculas, como la búsqueda por patrón de find_image_for_patient)
+FUNDUS_IMAGE_PATTERN = re.compile(r"^RET(?P<patient_id>.+?)(?P<eye>OD|OS)\.jpg$", re.IGNORECASE)
+
+
+def _correlative_number(filename: str) -> Optional[int]:
+    """
+    Extrae el número correlativo de un nombre como RET012OD.jpg.
+
+    Args:
+        filename: Nombre del archivo
+
+    Returns:
+        Número entre 'RET' y la 'O' de OD/OS, o None si el nombre no lo tiene
+    """
+    upper = filename.upper()
+    if not upper.startswith('RET') or not upper.endswith(IMAGE_EXTENSIONS):
+        return None
+    o_index = upper.find('O')
+    if o_index > 3:
+        num_part = filename[3:o_index]
+        if num_part.isdigit():
+            return int(num_part)
+    return None
+
+
+def fundus_image_filenames(clean_id: str, suffix: str) -> List[str]:
+    """
+    Nombres estándar de la imagen de un paciente y ojo, en orden de preferencia.
+
+    Args:
+        clean_id: ID del paciente sin '#'
+        suffix: "OD" u "OS"
+
+    Returns:
+        RET{id}{sufijo}.jpg y, si el ID es numérico, la variante sin ceros a la izquierda
+    """
+    filenames = [f"RET{clean_id}{suffix}.jpg"]
+    if clean_id.isdigit():
+        filenames.append(f"RET{int(clean_id)}{suffix}.jpg")
+    return filenames
+
+
+class ImageIndex:
+    """
+    Índice en memoria de los archivos de un directorio de imágenes de fondo de ojo.
+
+    Se construye con un solo os.scandir y se actualiza cuando cambia el mtime del
+    directorio (como mucho una comprobación cada REFRESH_INTERVAL segundos),
+    aplicando solo las altas y bajas. save_patient_image lo actualiza
+    directamente, sin esperar a la siguiente comprobación.
+    """
+
+    def __init__(self, images_dir: str):
+        self.images_dir = images_dir
+        self.scans = 0
+        self._lock = threading.RLock()
+        self._names: Set[str] = set()
+        self._sorted_upper: List[Tuple[str, str]] = []
+        self._numbers: Counter = Counter()
+        self._dir_mtime: Optional[int] = None
+        self._checked_at: Optional[float] = None
+        self._stable = False
+        # Primera lectura terminada y lectura en curso (ver ready)
+        self._scanned = False
+        self._scanning = False
+
+    @property
+    def exists(self) -> bool:
+        """Indica si el directorio existía en la última comprobación."""
+        self.refresh()
+        return self._dir_mtime is not None
+
+    @property
+    def ready(self) -> bool:
+        """
+        Indica si el directorio ya se leyó y no hay otra lectura en curso.
+
+        No toma el bloqueo: sirve para saber, desde el hilo de la interfaz, si
+        find(..., refresh=False) responderá sin esperar a un os.scandir.
+        """
+        return self._scanned and not self._scanning
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Vuelve a leer el directorio si su mtime cambió desde la última lectura.
+
+        Args:
+            force: Si es True, lee el directorio sin mirar el mtime ni el intervalo
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < REFRESH_INTERVAL:
+                return
+            self._checked_at = now
+
+            try:
+                mtime = os.stat(self.images_dir).st_mtime_ns
+            except OSError:
+                mtime = None
+            if not force and self._stable and mtime == self._dir_mtime:
+                return
+
+            names: Set[str] = set()
+            self._scanning = True
+            try:
+                if mtime is not None:
+                    try:
+                        with os.scandir(self.images_dir) as entries:
+                            names = {entry.name for entry in entries}
+                    except OSError as e:
+                        logger.error(f"Error al leer el directorio {self.images_dir}: {str(e)}")
+                        mtime = None
+                self.scans += 1
+
+                self._apply(names - self._names, self._names - names)
+                self._dir_mtime = mtime
+                self._stable = mtime is not None and time.time_ns() - mtime > MTIME_GRANULARITY_NS
+                self._scanned = True
+            finally:
+                self._scanning = False
+
+    def _apply(self, added: Set[str], removed: Set[str]) -> None:
+        """Aplica las altas y bajas de archivos a las estructuras del índice."""
+        if not added and not removed:
+            return
+        if len(added) + len(removed) > REBUILD_THRESHOLD:
+            self._names = (self._names - removed) | added
+            self._sorted_upper = sorted((name.upper(), name) for name in self._names)
+            self._numbers = Counter(number for number in map(_correlative_number, self._names) if number is not None)
+            logger.debug(f"Índice de imágenes reconstruido: {len(self._names)} archivos en {self.images_dir}")
+            return
+        for name in removed:
+            self._remove_name(name)
+        for name in added:
+            self._add_name(name)
+
+    def _add_name(self, name: str) -> None:
+        if name in self._names:
+            return
+        self._names.add(name)
+        insort(self._sorted_upper, (name.upper(), name))
+        number = _correlative_number(name)
+        if number is not None:
+            self._numbers[number] += 1
+
+    def _remove_name(self, name: str) -> None:
+        if name not in self._names:
+            return
+        self._names.discard(name)
+        del self._sorted_upper[bisect_left(self._sorted_upper, (name.upper(), name))]
+        number = _correlative_number(name)
+        if number is not None:
+            self._numbers[number] -= 1
+            if not self._numbers[number]:
+                del self._numbers[number]
+
+    def add(self, filename: str) -> None:
+        """
+        Registra un archivo creado en el directorio.
+
+        Args:
+            filename: Nombre del archivo (sin directorio)
+        """
+        with self._lock:
+            self.refresh()
+            self._add_name(filename)
+
+    def discard(self, filename: str) -> None:
+        """
+        Quita del índice un archivo eliminado del directorio.
+
+        Args:
+            filename: Nombre del archivo (sin directorio)
+        """
+        with self._lock:
+            self.refresh()
+            self._remove_name(filename)
+
+    def contains(self, filename: str) -> bool:
+        """
+        Indica si existe un archivo con ese nombre exacto.
+
+        Args:
+            filename: Nombre del archivo (sin directorio)
+
+        Returns:
+            True si el archivo está en el directorio
+        """
+        self.refresh()
+        return filename in self._names
+
+    def find(self, clean_id: str, suffix: str, refresh: bool = True) -> Optional[str]:
+        """
+        Busca la imagen de un paciente y ojo: nombre estándar e ID sin ceros a
+        la izquierda, primero exactos y luego sin distinguir mayúsculas, y por
+        último cualquier archivo RET{id}...{sufijo}.jpg sin distinguir
+        mayúsculas en el que el ID no siga con otro dígito. Son las reglas de core.image_loader.find_fundus_image, que
+        usan tanto la carga de los pacientes como el visor.
+
+        Args:
+            clean_id: ID del paciente sin '#'
+            suffix: "OD" u "OS"
+            refresh: Si es False, busca en el índice tal como está, sin comprobar el directorio
+
+        Returns:
+            Nombre del archivo encontrado o None
+        """
+        with self._lock:
+            if refresh:
+                self.refresh()
+
+            filenames = fundus_image_filenames(clean_id, suffix)
+            for filename in filenames:
+                if filename in self._names:
+                    return filename
+            for filename in filenames:
+                upper = filename.upper()
+                position = bisect_left(self._sorted_upper, (upper, ""))
+                if position < len(self._sorted_upper) and self._sorted_upper[position][0] == upper:
+                    return self._sorted_upper[position][1]
+
+            # Búsqueda por patrón: solo se recorren los nombres que empiezan por el prefijo.
+            # Tras el ID no puede seguir otro dígito: RET1 no debe encontrar RET10OD.jpg
+            prefix = f"RET{clean_id}".upper()
+            pattern_suffix = f"{suffix}.jpg".upper()
+            for position in range(bisect_left(self._sorted_upper, (prefix, "")), len(self._sorted_upper)):
+                upper, name = self._sorted_upper[position]
+                if not upper.startswith(prefix):
+                    break
+                if upper[len(prefix):len(prefix) + 1].isdigit():
+                    continue
+                if len(upper) >= len(prefix) + len(pattern_suffix) and upper.endswith(pattern_suffix):
+                    return name
+            return None
+
+    def next_correlative_number(self) -> int:
+        """
+        Devuelve el próximo número correlativo libre para imágenes RET###OD/OS.
+
+        Returns:
+            Mayor número existente más uno, o 1 si no hay imágenes numeradas
+        """
+        with self._lock:
+            self.refresh()
+            return max(self._numbers) + 1 if self._numbers else 1
+
+
+_indexes: Dict[str, ImageIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_image_index(images_dir: str) -> ImageIndex:
+    """
+    Devuelve el índice compartido de un directorio de imágenes.
+
+    Args:
+        images_dir: Directorio de imágenes de fondo de ojo
+
+    Returns:
+        Índice del directorio (se crea en la primera llamada)
+    """
+    key = os.path.abspath(images_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ImageIndex(key)
+        return index
@@ -8,6 +8,8 @@ from typing import Optional, Union, Tuple
 from PIL import Image, ImageTk
 
 from core.models import Eye
+from utils.image_index import get_image_index
+from utils.thumbnail_cache import get_thumbnail_cache
 
 # Configurar sistema de logging
 logging.basicConfig(
@@ -95,40 +97,14 @@ def get_next_correlative_number(images_dir: str) -> int:
     """
     try:
         # Verificar si el directorio existe
-        if not os.path.exists(images_dir):
+        index = get_image_index(images_dir)
+        if not index.exists:
             ensure_directory_exists(images_dir)
+            index.refresh(force=True)
             return 1
 
-        # Obtener todos los archivos de imagen existentes
-        image_files = [f for f in os.listdir(images_dir)
-                       if f.upper().startswith('RET') and
-                       f.upper().endswith(('.JPG', '.JPEG', '.PNG'))]
-
-        # Si no hay imágenes, comenzar desde 1
-        if not image_files:
-            return 1
-
-        # Extraer números de las imágenes existentes
-        existing_numbers = []
-        for filename in image_files:
-            try:
-                # Buscar el índice de 'O' para separar el número del sufijo (OD/OS)
-                o_index = filename.upper().find('O')
-                if o_index > 3:  # Asegurarse que hay al menos "RET" + algún número
-                    # Extraer el número entre 'RET' y 'O'
-                    num_part = filename[3:o_index]
-                    if num_part.isdigit():
-                        existing_numbers.append(int(num_part))
-            except (ValueError, IndexError) as e:
-                logger.warning(f"Error al extraer número de '{filename}': {str(e)}")
-                continue
-
-        # Si no se extrajeron números, comenzar desde 1
-        if not existing_numbers:
-            return 1
-
-        # Devolver el siguiente número no utilizado
-        return max(existing_numbers) + 1
+        # El índice mantiene los números de las imágenes RET###OD/OS existentes
+        return index.next_correlative_number()
 
     except Exception as e:
         logger.error(f"Error al obtener número correlativo: {str(e)}")
@@ -224,42 +200,17 @@ def find_image_for_patient(patient_id: str, eye_type: Eye, images_dir: str) -> O
     """
     try:
         # Asegurar que el directorio existe
-        if not os.path.exists(images_dir):
+        index = get_image_index(images_dir)
+        if not index.exists:
             logger.warning(f"El directorio de imágenes no existe: {images_dir}")
             return None
 
-        # Limpiar ID y determinar sufijo
-        clean_id = str(patient_id).replace('#', '').strip()
-        suffix = "OD" if eye_type == Eye.RIGHT else "OS"
-
-        # Lista de posibles nombres de archivo a buscar
-        possible_filenames = [
-            f"RET{clean_id}{suffix}.jpg",  # Formato estándar
-        ]
-
-        # Intentar también sin ceros a la izquierda si es un número
-        if clean_id.isdigit():
-            numeric_id = int(clean_id)
-            possible_filenames.append(f"RET{numeric_id}{suffix}.jpg")
-
-        # Buscar los archivos
-        for filename in possible_filenames:
-            filepath = os.path.join(images_dir, filename)
-            if os.path.exists(filepath):
-                logger.info(f"Imagen encontrada: {filepath}")
-                return normalize_path(filepath)
-
-        # Buscar por patrón en el directorio completo
-        pattern_prefix = f"RET{clean_id}"
-        pattern_suffix = suffix + ".jpg"
-
-        for file in os.listdir(images_dir):
-            file_upper = file.upper()
-            if (file_upper.startswith(pattern_prefix.upper()) and
-                    file_upper.endswith(pattern_suffix.upper())):
-                filepath = os.path.join(images_dir, file)
-                logger.info(f"Imagen encontrada con búsqueda de patrón: {filepath}")
-                return normalize_path(filepath)
+        # Misma búsqueda que al cargar los pacientes (nombre estándar, sin ceros y por patrón)
+        from core.image_loader import find_fundus_image
+        filepath = find_fundus_image(patient_id, eye_type, images_dir)
+        if filepath is not None:
+            logger.info(f"Imagen encontrada: {filepath}")
+            return normalize_path(filepath)
 
         logger.warning(f"No se encontró imagen para paciente {patient_id}, ojo {eye_type.name}")
         return None
@@ -297,8 +248,9 @@ def save_patient_image(source_path: str, patient_id: str, eye_type: Eye,
         dest_filename = generate_image_name(patient_id, eye_type)
         dest_path = os.path.join(images_dir, dest_filename)
 
-        # Copiar la imagen
+        # Copiar la imagen y registrarla en el índice del directorio
         if copy_image(source_path, dest_path, overwrite=True):
+            get_image_index(images_dir).add(dest_filename)
             return normalize_path(dest_path)
 
         return None
@@ -338,12 +290,10 @@ def load_and_display_image(image_path: str, label_widget: tk.Label, images_dir:
                 label_widget.config(text=f"No disponible")
                 return None, None
 
-        # Cargar y redimensionar la imagen - TAMAÑO REDUCIDO PARA UI COMPACTA
+        # Obtener la miniatura (caché en memoria, luego en disco) - TAMAÑO REDUCIDO PARA UI COMPACTA
         try:
-            img = Image.open(norm_path)
-            logger.debug(f"Imagen abierta. Tamaño original: {img.size}")
-            img.thumbnail((200, 200))  # Tamaño reducido para UI compacta
-            logger.debug(f"Imagen redimensionada. Nuevo tamaño: {img.size}")
+            img = get_thumbnail_cache().get_thumbnail(norm_path)
+            logger.debug(f"Miniatura obtenida. Tamaño: {img.size}")
         except Exception as img_error:
             logger.error(f"Error abriendo imagen: {str(img_error)}")
             label_widget.config(text="Error")
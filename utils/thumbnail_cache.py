@@ -0,0 +1,245 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger("thumbnail_cache")
+
+# Tamaño máximo de las miniaturas mostradas en la interfaz
+THUMBNAIL_SIZE = (200, 200)
+
+# Calidad del reescalado de las miniaturas: (reducing_gap, filtro de remuestreo).
+# reducing_gap indica cuánto mayor que la miniatura debe ser la imagen que
+# entrega libjpeg al decodificar con escalado DCT (Image.draft, 1/2, 1/4 o 1/8);
+# None decodifica la imagen completa.
+THUMBNAIL_QUALITY_PRESETS = {
+    "fast": (1.0, Image.Resampling.BILINEAR),
+    "balanced": (2.0, Image.Resampling.BICUBIC),  # Valores por defecto de Image.thumbnail
+    "high": (None, Image.Resampling.LANCZOS),
+}
+THUMBNAIL_QUALITY = os.environ.get('THUMBNAIL_QUALITY', 'fast')
+
+# Límite de memoria de las miniaturas decodificadas (bytes de píxeles)
+MEMORY_LIMIT_BYTES = int(os.environ.get('THUMBNAIL_MEMORY_LIMIT', 64 * 1024 * 1024))
+
+# Directorio de las miniaturas guardadas en disco (fuera del directorio de imágenes,
+# que puede estar en un almacenamiento de red de solo lectura)
+THUMBNAIL_CACHE_DIR = os.environ.get(
+    'THUMBNAIL_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'papila', 'thumbnails'))
+
+
+def decode_thumbnail(image_path: str, size: Tuple[int, int] = THUMBNAIL_SIZE,
+                     quality: str = THUMBNAIL_QUALITY) -> Image.Image:
+    """
+    Decodifica una imagen directamente al tamaño de miniatura.
+
+    En los JPEG se usa el escalado DCT de libjpeg (Image.draft), que decodifica a
+    1/2, 1/4 o 1/8 de la resolución sin llegar a reservar la imagen completa; en
+    otros formatos se reduce primero por un factor entero (Image.reduce). Después
+    se remuestrea al tamaño final con el filtro de la calidad elegida.
+
+    Args:
+        image_path: Ruta de la imagen original
+        size: Tamaño máximo de la miniatura
+        quality: Clave de THUMBNAIL_QUALITY_PRESETS
+
+    Returns:
+        Miniatura de como máximo size píxeles
+    """
+    if quality not in THUMBNAIL_QUALITY_PRESETS:
+        raise ValueError(f"Calidad de miniatura desconocida: {quality} (use {', '.join(THUMBNAIL_QUALITY_PRESETS)})")
+    reducing_gap, resample = THUMBNAIL_QUALITY_PRESETS[quality]
+
+    # Image.thumbnail llama a Image.draft con size * reducing_gap antes de cargar
+    # la imagen y usa la caja que devuelve para corregir el recorte del escalado DCT
+    with Image.open(image_path) as img:
+        img.thumbnail(size, resample=resample, reducing_gap=reducing_gap)
+        return img
+
+
+def _image_bytes(img: Image.Image) -> int:
+    """Calcula los bytes que ocupan los píxeles de una imagen decodificada."""
+    return img.width * img.height * len(img.getbands())
+
+
+class ThumbnailCache:
+    """
+    Caché de miniaturas en dos niveles.
+
+    1. Memoria: LRU de imágenes ya decodificadas, limitado por bytes de píxeles.
+    2. Disco: un PNG (compresión rápida) por miniatura en cache_dir, identificado por la ruta de la
+       imagen original, su mtime y su tamaño (si la imagen cambia, la clave cambia).
+
+    Solo si fallan los dos niveles se decodifica la imagen original completa.
+    """
+
+    def __init__(self, memory_limit: int = MEMORY_LIMIT_BYTES, cache_dir: Optional[str] = THUMBNAIL_CACHE_DIR,
+                 size: Tuple[int, int] = THUMBNAIL_SIZE, quality: str = THUMBNAIL_QUALITY):
+        """
+        Args:
+            memory_limit: Bytes máximos de las miniaturas en memoria
+            cache_dir: Directorio de las miniaturas en disco (None para no usar disco)
+            size: Tamaño máximo de las miniaturas
+            quality: Calidad del reescalado (clave de THUMBNAIL_QUALITY_PRESETS)
+        """
+        if quality not in THUMBNAIL_QUALITY_PRESETS:
+            raise ValueError(f"Calidad de miniatura desconocida: {quality}")
+        self.memory_limit = memory_limit
+        self.cache_dir = cache_dir
+        self.size = size
+        self.quality = quality
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0, "memory_misses": 0, "disk_hits": 0, "disk_misses": 0, "evictions": 0
+        }
+        self._memory: "OrderedDict[tuple, Image.Image]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _key(self, image_path: str) -> tuple:
+        """Clave de una imagen: ruta absoluta, mtime, tamaño del archivo, tamaño y calidad de la miniatura."""
+        stat = os.stat(image_path)
+        return os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, self.size, self.quality
+
+    def _disk_path(self, key: tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.png")
+
+    def _remember(self, key: tuple, img: Image.Image) -> None:
+        """Guarda una miniatura en memoria y descarta las menos usadas si se supera el límite."""
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = img
+            self._memory_bytes += _image_bytes(img)
+            while self._memory_bytes > self.memory_limit and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= _image_bytes(evicted)
+                self.stats["evictions"] += 1
+
+    def _load_from_disk(self, key: tuple) -> Optional[Image.Image]:
+        if self.cache_dir is None:
+            return None
+        try:
+            with Image.open(self._disk_path(key)) as img:
+                img.load()
+                return img
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Miniatura en disco ilegible, se regenerará: {str(e)}")
+            return None
+
+    def _save_to_disk(self, key: tuple, img: Image.Image) -> None:
+        if self.cache_dir is None:
+            return
+        disk_path = self._disk_path(key)
+        temp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            img.save(temp_path, format="PNG", compress_level=1)
+            os.replace(temp_path, disk_path)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la miniatura en disco: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def get_thumbnail(self, image_path: str) -> Image.Image:
+        """
+        Devuelve la miniatura de una imagen, buscando primero en memoria y luego en disco.
+
+        La imagen devuelta se comparte con la caché y no debe modificarse.
+
+        Args:
+            image_path: Ruta de la imagen original
+
+        Returns:
+            Miniatura de como máximo self.size píxeles
+
+        Raises:
+            OSError: Si la imagen no existe o no se puede decodificar
+        """
+        key = self._key(image_path)
+
+        with self._lock:
+            img = self._memory.get(key)
+            if img is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return img
+            self.stats["memory_misses"] += 1
+
+        img = self._load_from_disk(key)
+        with self._lock:
+            self.stats["disk_hits" if img is not None else "disk_misses"] += 1
+        if img is None:
+            img = decode_thumbnail(image_path, self.size, self.quality)
+            self._save_to_disk(key, img)
+
+        self._remember(key, img)
+        return img
+
+    def is_fresh(self, image_path: str) -> bool:
+        """
+        Indica si la miniatura en disco de una imagen existe y corresponde a su versión actual.
+
+        Args:
+            image_path: Ruta de la imagen original
+
+        Returns:
+            True si no hace falta regenerarla
+        """
+        return self.cache_dir is not None and os.path.exists(self._disk_path(self._key(image_path)))
+
+    def pregenerate(self, image_path: str) -> bool:
+        """
+        Genera la miniatura en disco de una imagen sin guardarla en memoria.
+
+        Args:
+            image_path: Ruta de la imagen original
+
+        Returns:
+            True si se generó, False si ya estaba al día
+
+        Raises:
+            OSError: Si la imagen no existe o no se puede decodificar
+        """
+        key = self._key(image_path)
+        if os.path.exists(self._disk_path(key)):
+            return False
+        self._save_to_disk(key, decode_thumbnail(image_path, self.size, self.quality))
+        return True
+
+    def clear_memory(self) -> None:
+        """Vacía el nivel de memoria (las miniaturas en disco se conservan)."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Devuelve los contadores de aciertos y fallos de cada nivel.
+
+        Returns:
+            Diccionario con los contadores, el número de miniaturas y los bytes en memoria
+        """
+        with self._lock:
+            return dict(self.stats, memory_entries=len(self._memory), memory_bytes=self._memory_bytes)
+
+
+_thumbnail_cache: Optional[ThumbnailCache] = None
+_thumbnail_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Devuelve la caché de miniaturas compartida por la aplicación."""
+    global _thumbnail_cache
+    # La usan a la vez el hilo de Tk y los de precarga: sin el bloqueo, dos
+    # primeras llamadas simultáneas crearían dos cachés distintas
+    with _thumbnail_cache_lock:
+        if _thumbnail_cache is None:
+            _thumbnail_cache = ThumbnailCache()
+        return _thumbnail_cache